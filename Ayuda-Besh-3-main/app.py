@@ -7,7 +7,9 @@ load_dotenv(env_path)
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from config import Config
-from lib.mongodb import init_db
+from lib.mongodb import init_db, get_database
+from lib.outbox import start_outbox_dispatcher
+from lib.hashing import HashingOverloaded, overloaded_response
 
 # Import blueprints (order matters for URL prefix conflicts)
 from routes.frontend import frontend_bp  # No prefix - must be first
@@ -36,6 +38,10 @@ def create_app(config_class=Config):
         # Raise the error to prevent app from starting without database
         raise
     
+    # Background sender for queued email/SMS (disable to run `manage.py run-outbox` separately)
+    if app.config.get('OUTBOX_DISPATCHER'):
+        start_outbox_dispatcher(get_database())
+    
     # Register blueprints in order (frontend first to avoid prefix conflicts)
     app.register_blueprint(frontend_bp)  # No URL prefix - handles /, /login, /dashboard
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -78,6 +84,11 @@ def create_app(config_class=Config):
         from flask import render_template_string
         return render_template_string('<h1>500 - Internal Server Error</h1>'), 500
     
+    @app.errorhandler(HashingOverloaded)
+    def hashing_overloaded(error):
+        """Shed load with a 503 when the password hashing pool is saturated"""
+        return overloaded_response(error)
+    
     @app.errorhandler(Exception)
     def handle_exception(e):
         """Handle all unhandled exceptions"""
@@ -101,5 +112,6 @@ if __name__ == '__main__':
     app.run(
         debug=os.getenv('FLASK_DEBUG', 'False').lower() == 'true',
         host=os.getenv('FLASK_HOST', '127.0.0.1'),
-        port=int(os.getenv('FLASK_PORT', 5000))
+        port=int(os.getenv('FLASK_PORT', 5000)),
+        threaded=True  # Notification streams hold a thread each
     )
\ No newline at end of file
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Availability checks against compiled schedules vs parsing the document per check
+
+Generates --providers schedules, each a week with breaks plus --dates
+specific-date overrides, and --checks random datetimes in March 2026. Times:
+  legacy     the decision logic of /availability/check before compilation:
+             scan specific_dates, then strptime every HH:MM it compares
+  compiled   CompiledAvailability.check on schedules compiled up front
+  compile    CompiledAvailability.compile of every schedule, as on a cache miss
+  day grid   a 30-minute slot grid of one day, 48 legacy checks vs day_grid()
+             (which also builds the response dicts the legacy side skips)
+Both check paths are asserted to agree before anything is timed.
+
+Usage:
+    python -m benchmarks.bench_availability [--providers N] [--checks N] [--dates N]
+        Pure Python: no server needed.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from lib.availability import DAYS, CompiledAvailability
+from benchmarks.common import print_table
+
+def legacy_check(availability, requested_dt):
+    """(available, reason) as /availability/check computed it before compilation"""
+    requested_date = requested_dt.date()
+    for date_entry in availability.get('specific_dates', []):
+        if date_entry.get('date') and date_entry['date'].date() == requested_date:
+            if not date_entry.get('available', True):
+                return False, date_entry.get('reason', 'Provider marked this date as unavailable')
+            if 'start' in date_entry and 'end' in date_entry:
+                requested_time = requested_dt.time()
+                start_time = datetime.strptime(date_entry['start'], '%H:%M').time()
+                end_time = datetime.strptime(date_entry['end'], '%H:%M').time()
+                if requested_time < start_time or requested_time >= end_time:
+                    return False, f'Outside working hours ({date_entry["start"]} - {date_entry["end"]})'
+            requested_time = requested_dt.time()
+            for break_period in date_entry.get('breaks', []):
+                break_start = datetime.strptime(break_period['start'], '%H:%M').time()
+                break_end = datetime.strptime(break_period['end'], '%H:%M').time()
+                if break_start <= requested_time < break_end:
+                    return False, 'During break time'
+            return True, None
+
+    day_name = requested_dt.strftime('%A').lower()
+    schedule = availability.get('schedule', {})
+    if day_name not in schedule:
+        return False, 'Day not in schedule'
+    day_schedule = schedule[day_name]
+    if not day_schedule.get('available', False):
+        return False, f'Provider not available on {day_name}'
+    requested_time = requested_dt.time()
+    start_time = datetime.strptime(day_schedule['start'], '%H:%M').time()
+    end_time = datetime.strptime(day_schedule['end'], '%H:%M').time()
+    if requested_time < start_time or requested_time >= end_time:
+        return False, f'Outside working hours ({day_schedule["start"]} - {day_schedule["end"]})'
+    for break_period in day_schedule.get('breaks', []):
+        break_start = datetime.strptime(break_period['start'], '%H:%M').time()
+        break_end = datetime.strptime(break_period['end'], '%H:%M').time()
+        if break_start <= requested_time < break_end:
+            return False, 'During break time'
+    return True, None
+
+def availability_document(dates):
+    start = random.choice(['07:00', '08:00', '09:00'])
+    end = random.choice(['17:00', '18:00', '20:00'])
+    schedule = {
+        day: {'available': random.random() < 0.8, 'start': start, 'end': end,
+              'breaks': [{'start': '12:00', 'end': '13:00'}, {'start': '15:00', 'end': '15:15'}]}
+        for day in DAYS
+    }
+    specific_dates = []
+    for offset in random.sample(range(365), dates):
+        day = datetime(2026, 1, 1) + timedelta(days=offset)
+        if random.random() < 0.5:
+            specific_dates.append({'date': day, 'available': False, 'reason': 'Holiday'})
+        else:
+            specific_dates.append({'date': day, 'available': True, 'start': '10:00', 'end': '15:00',
+                                   'breaks': [{'start': '12:00', 'end': '12:30'}]})
+    return {'schedule': schedule, 'specific_dates': specific_dates}
+
+def per_call_us(fn, items):
+    started = time.perf_counter()
+    for item in items:
+        fn(*item)
+    return (time.perf_counter() - started) / len(items) * 1_000_000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--providers', type=int, default=1000)
+    parser.add_argument('--checks', type=int, default=200_000)
+    parser.add_argument('--dates', type=int, default=20, help='specific-date overrides per provider')
+    args = parser.parse_args()
+
+    random.seed(25)
+    documents = [availability_document(args.dates) for _ in range(args.providers)]
+    compiled = [CompiledAvailability.compile(document) for document in documents]
+    checks = [
+        (random.randrange(args.providers), datetime(2026, 3, 1) + timedelta(minutes=random.randrange(31 * 24 * 60)))
+        for _ in range(args.checks)
+    ]
+    for index, when in checks[:10_000]:
+        assert legacy_check(documents[index], when) == compiled[index].check(when), (index, when)
+
+    legacy = per_call_us(lambda index, when: legacy_check(documents[index], when), checks)
+    fast = per_call_us(lambda index, when: compiled[index].check(when), checks)
+    compile_us = per_call_us(CompiledAvailability.compile, [(document,) for document in documents])
+
+    days = [(index, when.replace(hour=0, minute=0)) for index, when in checks[:args.checks // 48]]
+    slots = [timedelta(minutes=30 * slot) for slot in range(48)]
+    legacy_grid = per_call_us(lambda index, day: [legacy_check(documents[index], day + slot) for slot in slots], days)
+    fast_grid = per_call_us(lambda index, day: compiled[index].day_grid(day.date()), days)
+
+    print(f'{args.providers} providers with {args.dates} date overrides, {args.checks:,} checks, microseconds per call')
+    print_table(('operation', 'legacy us', 'compiled us', 'speedup'), [
+        ('check', f'{legacy:.2f}', f'{fast:.2f}', f'{legacy / fast:.1f}x'),
+        ('day grid (48 slots)', f'{legacy_grid:.1f}', f'{fast_grid:.1f}', f'{legacy_grid / fast_grid:.1f}x'),
+        ('compile', '-', f'{compile_us:.1f}', '-')
+    ])
+    print(f'compile pays for itself after {compile_us / max(legacy - fast, 1e-9):.0f} checks of one provider')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Throughput of rendering transactional emails from the compiled templates
+
+Renders --count messages of every template with render_email (one call per
+recipient) and with render_bulk (one call per batch), and the password
+reset message with the f-string builder that the templates replaced.
+
+Usage:
+    python -m benchmarks.bench_email_render [--count N] [--batch B]
+        Pure Python: no server needed.
+"""
+
+import argparse
+import time
+from lib.email_templates import render_bulk, render_email
+from benchmarks.common import print_table
+
+CONTEXTS = {
+    'password_reset': lambda number: {
+        'user_name': f'User {number}', 'verification_code': f'{number % 1000000:06d}', 'expires_minutes': 15
+    },
+    'booking_accepted': lambda number: {
+        'customer_name': f'Customer {number}', 'provider_name': 'Sparkle Co',
+        'service_name': 'Domestic Cleaning', 'booking_time': '2026-03-02 09:00'
+    },
+    'account_disabled': lambda number: {
+        'user_name': f'User {number}', 'reason': 'Repeated no-shows', 'disabled_until': '2026-04-01'
+    },
+    'review_received': lambda number: {
+        'provider_name': 'Sparkle Co', 'customer_name': f'Customer {number}', 'rating': number % 5 + 1,
+        'review_text': 'Spotless, <b>on time</b> & friendly'
+    },
+}
+
+def legacy_verification_email_content(verification_code: str, user_name: str = None) -> dict:
+    """The password reset email as built before the templates (per-call f-strings)"""
+    user_greeting = f"Hello {user_name}," if user_name else "Hello,"
+    
+    text_content = f"""
+{user_greeting}
+
+You requested to reset your password for your AyudaBesh account.
+
+Your verification code is: {verification_code}
+
+This code will expire in 15 minutes.
+
+If you did not request this password reset, please ignore this email.
+
+Best regards,
+AyudaBesh Team
+    """
+    
+    html_content = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: #0070f3; color: white; padding: 20px; text-align: center; border-radius: 8px 8px 0 0; }}
+        .content {{ background: #f8f9fa; padding: 30px; border-radius: 0 0 8px 8px; }}
+        .code-box {{ background: white; border: 2px solid #0070f3; padding: 20px; text-align: center; margin: 20px 0; border-radius: 8px; }}
+        .code {{ font-size: 32px; font-weight: bold; color: #0070f3; letter-spacing: 5px; }}
+        .footer {{ margin-top: 20px; padding-top: 20px; border-top: 1px solid #ddd; font-size: 12px; color: #666; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>AyudaBesh</h1>
+        </div>
+        <div class="content">
+            <p>{user_greeting}</p>
+            <p>You requested to reset your password for your AyudaBesh account.</p>
+            
+            <div class="code-box">
+                <p style="margin: 0 0 10px 0; color: #666;">Your verification code is:</p>
+                <div class="code">{verification_code}</div>
+            </div>
+            
+            <p>This code will expire in <strong>15 minutes</strong>.</p>
+            
+            <p>If you did not request this password reset, please ignore this email.</p>
+            
+            <div class="footer">
+                <p>Best regards,<br>AyudaBesh Team</p>
+            </div>
+        </div>
+    </div>
+</body>
+</html>
+    """
+    
+    return {
+        'subject': 'AyudaBesh - Password Reset Verification Code',
+        'text': text_content,
+        'html': html_content
+    }
+
+def messages_per_second(render, count):
+    started = time.perf_counter()
+    render(count)
+    return count / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--batch', type=int, default=500, help='recipients per render_bulk call')
+    args = parser.parse_args()
+
+    rows = []
+    for name, context in CONTEXTS.items():
+        # The first render compiles the templates; it is not part of the timing
+        render_email(name, **context(0))
+
+        def one_by_one(count, name=name, context=context):
+            for number in range(count):
+                render_email(name, **context(number))
+
+        def in_batches(count, name=name, context=context):
+            for first in range(0, count, args.batch):
+                render_bulk(name, [context(number) for number in range(first, min(first + args.batch, count))])
+
+        rows.append((name, 'render_email', f'{messages_per_second(one_by_one, args.count):,.0f}'))
+        rows.append((name, 'render_bulk', f'{messages_per_second(in_batches, args.count):,.0f}'))
+
+    def legacy(count):
+        for number in range(count):
+            context = CONTEXTS['password_reset'](number)
+            legacy_verification_email_content(context['verification_code'], context['user_name'])
+    rows.append(('password_reset', 'f-strings (before)', f'{messages_per_second(legacy, args.count):,.0f}'))
+
+    print(f'{args.count:,} messages per row (subject, text and HTML each)')
+    print_table(('template', 'renderer', 'messages/s'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Peak RSS while streaming a large CSV/NDJSON booking export
+
+Streams the rows through the same generator and Flask response used by the
+admin report exports and records the process peak RSS as the row count grows.
+A streamed export holds one chunk at a time, so the run fails if the peak
+grows by more than --max-growth-mb over the RSS before the first chunk.
+
+Usage:
+    python -m benchmarks.bench_export_memory [--rows N] [--format csv|ndjson]
+        Rows come from an in-process generator: no server needed.
+    BENCH_MONGODB_URI=... python -m benchmarks.bench_export_memory --mongodb
+        Rows are seeded into MongoDB and streamed by GET /api/admin/reports/daily-bookings.
+"""
+
+import argparse
+import resource
+import sys
+from datetime import datetime, timedelta
+import mongomock
+from flask import Flask
+from bson.objectid import ObjectId
+import app as app_module
+import lib.mongodb
+from lib.auth import generate_token
+from lib.export import export_response
+from routes.admin import _export_booking_rows
+from benchmarks.common import bench_database, insert_in_batches, print_table
+
+DAY = datetime(2026, 3, 2)
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def booking_documents(count, customer_id, provider_id):
+    for number in range(count):
+        yield {
+            '_id': ObjectId(), 'customer_id': customer_id, 'provider_id': provider_id,
+            'status': 'completed', 'service_type': 'cleaning', 'price': 100, 'final_price': 120,
+            'created_at': DAY + timedelta(microseconds=number)
+        }
+
+def seed_users(db):
+    customer_id = db.users.insert_one({'role': 'customer', 'fullName': 'Ana Cruz', 'email': 'ana@example.com'}).inserted_id
+    provider_id = db.users.insert_one({'role': 'provider', 'username': 'sparkle', 'fullName': 'Sparkle Co'}).inserted_id
+    return customer_id, provider_id
+
+def generator_chunks(rows, fmt):
+    """Chunks of the export response for rows generated in-process"""
+    db = mongomock.MongoClient().ayudabesh
+    customer_id, provider_id = seed_users(db)
+    Flask(__name__).test_request_context().push()
+    response = export_response(
+        _export_booking_rows(db, booking_documents(rows, customer_id, provider_id)),
+        ['booking_id', 'created_at', 'status', 'service_type', 'customer_name', 'provider_name', 'amount'],
+        fmt, 'bench'
+    )
+    return iter(response.response)
+
+def mongodb_chunks(rows, fmt):
+    """Chunks of GET /api/admin/reports/daily-bookings streamed from a seeded database"""
+    db = bench_database()
+    customer_id, provider_id = seed_users(db)
+    insert_in_batches(db.bookings, booking_documents(rows, customer_id, provider_id))
+    lib.mongodb.ensure_indexes(db)
+    lib.mongodb.db = db
+    app_module.init_db = lambda flask_app: None
+    client = app_module.create_app().test_client()
+    response = client.get(
+        f'/api/admin/reports/daily-bookings?date={DAY:%Y-%m-%d}&format={fmt}',
+        headers={'Authorization': f'Bearer {generate_token(str(ObjectId()), "admin")}'},
+        buffered=False
+    )
+    return iter(response.response)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--mongodb', action='store_true', help='Stream from MongoDB through the report endpoint')
+    parser.add_argument('--max-growth-mb', type=float, default=16)
+    args = parser.parse_args()
+
+    chunks = (mongodb_chunks if args.mongodb else generator_chunks)(args.rows, args.format)
+    baseline = peak_rss_mb()
+    checkpoints = {args.rows * share // 10 for share in (1, 2, 5, 10)}
+    # The CSV header line is not a row
+    rows_sent, bytes_sent, results = -1 if args.format == 'csv' else 0, 0, []
+    newline = b'\n' if args.mongodb else '\n'
+    for chunk in chunks:
+        rows_sent += chunk.count(newline)
+        bytes_sent += len(chunk)
+        while checkpoints and rows_sent >= min(checkpoints):
+            checkpoints.remove(min(checkpoints))
+            results.append([rows_sent, f'{bytes_sent / 1048576:.1f}', f'{peak_rss_mb():.1f}'])
+
+    print(f"{args.format} export of {args.rows} rows ({'MongoDB' if args.mongodb else 'generator'})")
+    print_table(['rows sent', 'MB sent', 'peak RSS MB'], results)
+    growth = float(results[-1][2]) - baseline
+    print(f"Peak RSS grew {growth:.1f} MB while streaming (limit {args.max_growth_mb} MB)")
+    if growth > args.max_growth_mb:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
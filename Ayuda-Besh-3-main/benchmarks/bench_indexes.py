@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Hot query shapes with and without the lib.mongodb index registry
+
+Seeds users and bookings (1M by default), times each query with only the _id
+index, then runs ensure_indexes and times it again.
+
+Usage:
+    BENCH_MONGODB_URI=mongodb://localhost:27017 python -m benchmarks.bench_indexes [--bookings N]
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from lib.mongodb import ensure_indexes
+from benchmarks.common import bench_database, docs_examined, insert_in_batches, median_ms, print_table
+
+START = datetime(2025, 1, 1)
+
+def seed(db, users_count, bookings_count):
+    user_ids = [ObjectId() for _ in range(users_count)]
+    insert_in_batches(db.users, (
+        {'_id': user_id, 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'phone': f'+63{i:010d}', 'role': 'provider' if i % 10 == 0 else 'customer', 'createdAt': START + timedelta(minutes=i)}
+        for i, user_id in enumerate(user_ids)
+    ))
+    provider_ids = user_ids[::10]
+    rng = random.Random(1)
+    insert_in_batches(db.bookings, (
+        {'provider_id': rng.choice(provider_ids), 'customer_id': rng.choice(user_ids),
+         'booking_time': START + timedelta(hours=rng.randrange(24 * 365)),
+         'status': rng.choice(['pending', 'accepted', 'completed', 'cancelled']),
+         'created_at': START + timedelta(seconds=i)}
+        for i in range(bookings_count)
+    ))
+    insert_in_batches(db.notifications, (
+        {'user_id': rng.choice(user_ids), 'read': rng.random() < 0.8, 'created_at': START + timedelta(seconds=i)}
+        for i in range(bookings_count // 2)
+    ))
+    insert_in_batches(db.reviews, (
+        {'provider_id': rng.choice(provider_ids), 'booking_id': ObjectId(), 'rating': rng.randint(1, 5),
+         'created_at': START + timedelta(seconds=i)}
+        for i in range(bookings_count // 10)
+    ))
+    insert_in_batches(db.availability, ({'provider_id': provider_id, 'schedule': {}} for provider_id in provider_ids))
+    return user_ids, provider_ids
+
+def hot_queries(db, user_ids, provider_ids):
+    """(label, find cursor factory) per route query shape from the request"""
+    user_id, provider_id = user_ids[len(user_ids) // 2], provider_ids[len(provider_ids) // 2]
+    return [
+        ('login', lambda: db.users.find({'username': f'user{len(user_ids) // 2}', 'role': 'customer'}).limit(1)),
+        ('booking conflict', lambda: db.bookings.find({
+            'provider_id': provider_id, 'booking_time': START + timedelta(hours=100),
+            'status': {'$in': ['pending', 'accepted']}
+        }).limit(1)),
+        ('notifications', lambda: db.notifications.find({'user_id': user_id}).sort('created_at', -1).limit(100)),
+        ('provider reviews', lambda: db.reviews.find({'provider_id': provider_id}).sort('created_at', -1).limit(10)),
+        ('availability', lambda: db.availability.find({'provider_id': provider_id}).limit(1)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    args = parser.parse_args()
+
+    db = bench_database()
+    user_ids, provider_ids = seed(db, args.users, args.bookings)
+    queries = hot_queries(db, user_ids, provider_ids)
+
+    before = [(median_ms(lambda: list(query())), docs_examined(query())) for _, query in queries]
+    ensure_indexes(db)
+    after = [(median_ms(lambda: list(query())), docs_examined(query())) for _, query in queries]
+
+    print(f"{args.bookings} bookings, {args.users} users")
+    print_table(['query', 'before ms', 'docs', 'after ms', 'docs'], [
+        [label, f'{before_ms:.2f}', before_docs, f'{after_ms:.2f}', after_docs]
+        for (label, _), (before_ms, before_docs), (after_ms, after_docs) in zip(queries, before, after)
+    ])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Login throughput and cheap-endpoint latency at several concurrency levels
+
+Each level runs that many client threads posting /api/auth/login in a loop
+for --seconds, while one more thread polls GET /api/services to show how
+much a login burst slows requests that do no hashing. Both hashing modes
+are measured: "inline" hashes in the request thread (PASSWORD_HASH_WORKERS=0,
+as before the hashing pool) and "pool" uses the bounded process pool with
+load shedding, so some logins get a 503 and wait out its Retry-After
+instead of queueing.
+
+Usage:
+    python -m benchmarks.bench_login_throughput [--levels 1,4,16,64] [--seconds S] [--rounds R]
+        Uses an in-memory database: no server needed.
+    BENCH_MONGODB_URI=... python -m benchmarks.bench_login_throughput --mongodb
+        Users are stored in MongoDB instead.
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import threading
+import time
+import mongomock
+import app as app_module
+import lib.hashing
+import lib.mongodb
+from benchmarks.common import bench_database, print_table
+
+PASSWORD = 'correct horse battery staple'
+
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def run_level(app, concurrency, seconds):
+    deadline = time.perf_counter() + seconds
+    logins, shed, login_ms, cheap_ms = [0], [0], [], []
+    lock = threading.Lock()
+
+    def log_in():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = client.post('/api/auth/login', json={'username': 'bench', 'password': PASSWORD, 'role': 'customer'})
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                if response.status_code == 200:
+                    logins[0] += 1
+                    login_ms.append(elapsed)
+                elif response.status_code == 503:
+                    shed[0] += 1
+                else:
+                    raise RuntimeError(f'login failed: {response.status_code} {response.get_data(as_text=True)}')
+            if response.status_code == 503:
+                time.sleep(min(float(response.headers['Retry-After']), max(deadline - time.perf_counter(), 0)))
+
+    def poll_cheap():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            client.get('/api/services')
+            cheap_ms.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=log_in) for _ in range(concurrency)] + [threading.Thread(target=poll_cheap)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return (
+        f'{logins[0] / elapsed:.1f}', f'{percentile(login_ms, 0.5):.0f}', f'{percentile(login_ms, 0.95):.0f}',
+        shed[0], f'{statistics.median(cheap_ms):.1f}', f'{percentile(cheap_ms, 0.95):.1f}'
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--levels', default='1,4,16,64')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--rounds', type=int, default=lib.hashing.BCRYPT_ROUNDS, help='bcrypt cost')
+    parser.add_argument('--workers', type=int, default=lib.hashing.POOL_WORKERS or 4, help='hashing pool size')
+    parser.add_argument('--mongodb', action='store_true')
+    args = parser.parse_args()
+
+    db = bench_database() if args.mongodb else mongomock.MongoClient().ayudabesh
+    lib.mongodb.ensure_indexes(db)
+    lib.mongodb.db = db
+    app_module.init_db = lambda flask_app: None
+    app = app_module.create_app()
+    lib.hashing.HASH_ALGORITHM = 'bcrypt'
+    lib.hashing.BCRYPT_ROUNDS = args.rounds
+    lib.hashing.POOL_WORKERS = 0
+    db.services.insert_one({'name': 'Domestic Cleaning', 'category': 'cleaning', 'description': 'Home cleaning services'})
+    db.users.insert_one({'username': 'bench', 'role': 'customer', 'password': lib.hashing.hash_password(PASSWORD)})
+
+    rows = []
+    for mode, workers in (('inline', 0), ('pool', args.workers)):
+        lib.hashing.POOL_WORKERS = workers
+        for concurrency in (int(level) for level in args.levels.split(',')):
+            # The login route prints a line per success
+            with contextlib.redirect_stdout(io.StringIO()):
+                rows.append((mode, concurrency) + run_level(app, concurrency, args.seconds))
+
+    print(f'bcrypt cost {args.rounds}, {args.workers} pool workers, {args.seconds:g}s per level')
+    print_table(('mode', 'clients', 'logins/s', 'p50 ms', 'p95 ms', '503s', 'cheap p50 ms', 'cheap p95 ms'), rows)
+
+if __name__ == '__main__':
+    main()
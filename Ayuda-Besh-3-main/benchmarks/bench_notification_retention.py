@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Notification storage before and after the retention policies
+
+Seeds a year of notifications for --users users, most of them read before
+read_at was recorded, then reports collStats for notifications and
+notifications_archive at each step:
+  1. seeded
+  2. after `backfill-notification-read-at` and the next TTL monitor pass
+     (the server runs it every 60 s; the run waits up to --wait seconds)
+  3. after `archive-notifications` moves the rest older than 180 days
+
+Storage size only shrinks when WiredTiger reuses or compacts the freed
+space, so data size and document counts are the figures to compare.
+
+Usage:
+    BENCH_MONGODB_URI=... python -m benchmarks.bench_notification_retention [--users N] [--per-user N]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+import lib.mongodb
+from lib.retention import NOTIFICATION_ARCHIVE_AFTER_DAYS, NOTIFICATION_READ_TTL_DAYS, archive_notifications, backfill_read_at, storage_report
+from benchmarks.common import bench_database, insert_in_batches, print_table
+
+COLLECTIONS = ['notifications', 'notifications_archive']
+
+def notification_documents(users, per_user, now):
+    random.seed(18)
+    for _ in range(users):
+        user_id = ObjectId()
+        for _ in range(per_user):
+            created_at = now - timedelta(seconds=random.randrange(365 * 86400))
+            read = random.random() < 0.8
+            yield {
+                'user_id': user_id, 'title': 'Booking update', 'message': 'Your booking was accepted by the provider.',
+                'type': 'booking', 'booking_id': ObjectId(), 'link': '/customer/bookings',
+                'read': read, 'created_at': created_at
+            }
+
+def report_rows(step, db):
+    rows = []
+    for name, stats in storage_report(db, COLLECTIONS).items():
+        rows.append((step, name, stats['count'], f"{stats['size'] / 1048576:.1f}",
+                     f"{stats['storage_size'] / 1048576:.1f}", f"{stats['index_size'] / 1048576:.1f}"))
+    return rows
+
+def wait_for_ttl_pass(db, timeout):
+    """Wait until the TTL monitor has stopped deleting, up to timeout seconds"""
+    deadline = time.monotonic() + timeout
+    last = db.notifications.estimated_document_count()
+    while time.monotonic() < deadline:
+        time.sleep(15)
+        count = db.notifications.estimated_document_count()
+        expired = {'read': True, 'read_at': {'$lt': datetime.utcnow() - timedelta(days=NOTIFICATION_READ_TTL_DAYS)}}
+        if count == last and db.notifications.count_documents(expired) == 0:
+            return
+        last = count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--per-user', type=int, default=100)
+    parser.add_argument('--wait', type=float, default=300, help='seconds to wait for the TTL monitor')
+    args = parser.parse_args()
+
+    db = bench_database()
+    lib.mongodb.ensure_indexes(db)
+    insert_in_batches(db.notifications, notification_documents(args.users, args.per_user, datetime.utcnow()))
+    rows = report_rows('seeded', db)
+
+    started = time.perf_counter()
+    updated = backfill_read_at(db)
+    backfill_seconds = time.perf_counter() - started
+    wait_for_ttl_pass(db, args.wait)
+    rows += report_rows('read_at + TTL', db)
+
+    started = time.perf_counter()
+    moved = archive_notifications(db, NOTIFICATION_ARCHIVE_AFTER_DAYS)
+    archive_seconds = time.perf_counter() - started
+    rows += report_rows('archived', db)
+
+    print(f'{args.users * args.per_user:,} notifications; backfilled {updated:,} in {backfill_seconds:.1f}s, '
+          f'archived {moved:,} in {archive_seconds:.1f}s')
+    print_table(('step', 'collection', 'docs', 'data MB', 'storage MB', 'index MB'), rows)
+
+if __name__ == '__main__':
+    main()
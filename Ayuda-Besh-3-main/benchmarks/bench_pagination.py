@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Deep-page latency of keyset cursors vs skip/limit on a 5M-document collection
+
+Seeds --docs bookings for one provider, so a provider's booking list is
+5M entries deep, and times fetching page N of 20 both ways:
+  skip     find(query).sort(created_at, _id).skip(N * 20).limit(20)
+  keyset   lib.pagination.fetch_page with the cursor of page N - 1
+The cursor for each depth is taken once up front (not timed). Both use the
+provider_created_at index; keyset pages should stay flat while skip grows
+with N, as does the number of index keys it examines.
+
+Usage:
+    BENCH_MONGODB_URI=... python -m benchmarks.bench_pagination [--docs N] [--pages 1,100,...]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+import lib.mongodb
+from lib.pagination import encode_cursor, fetch_page
+from benchmarks.common import bench_database, insert_in_batches, median_ms, print_table
+
+PAGE_SIZE = 20
+SORT = [('created_at', -1), ('_id', -1)]
+
+def booking_documents(count, provider_id):
+    start = datetime(2020, 1, 1)
+    for number in range(count):
+        yield {
+            'provider_id': provider_id, 'customer_id': ObjectId(), 'status': 'completed',
+            'service_type': 'cleaning', 'price': 100,
+            # Pairs share a timestamp, so cursors fall on ties too
+            'created_at': start + timedelta(seconds=number // 2)
+        }
+
+def keys_examined(collection, query, skip):
+    explain = collection.find(query).sort(SORT).skip(skip).limit(PAGE_SIZE).explain()
+    return explain['executionStats']['totalKeysExamined']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=5_000_000)
+    parser.add_argument('--pages', default='1,100,1000,10000,100000,249999')
+    args = parser.parse_args()
+
+    db = bench_database()
+    provider_id = ObjectId()
+    insert_in_batches(db.bookings, booking_documents(args.docs, provider_id))
+    lib.mongodb.ensure_indexes(db)
+    query = {'provider_id': provider_id}
+
+    rows = []
+    for page in (int(value) for value in args.pages.split(',')):
+        skip = (page - 1) * PAGE_SIZE
+        if skip >= args.docs:
+            continue
+        cursor = None
+        if skip:
+            last = next(db.bookings.find(query, {'created_at': 1}).sort(SORT).skip(skip - 1).limit(1))
+            cursor = encode_cursor(last['created_at'], last['_id'])
+        skip_ms = median_ms(lambda: list(db.bookings.find(query).sort(SORT).skip(skip).limit(PAGE_SIZE)), repeat=5)
+        keyset_ms = median_ms(lambda: fetch_page(db.bookings, query, PAGE_SIZE, cursor), repeat=5)
+        rows.append((page, f'{skip_ms:.2f}', keys_examined(db.bookings, query, skip), f'{keyset_ms:.2f}'))
+
+    print(f'{args.docs:,} bookings, {PAGE_SIZE} per page, median of 5')
+    print_table(('page', 'skip ms', 'skip keys examined', 'keyset ms'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of token_required with and without the verified-token cache
+
+Calls a trivial view wrapped in token_required inside one request context,
+so the time is the decorator overhead: header parsing plus verify_token.
+"Uncached" swaps in verify_token as it was before verified payloads were
+cached (a full jwt.decode per call); "cached" is the current verify_token
+presented the same token again, as a session does.
+
+Usage:
+    python -m benchmarks.bench_token_verify [--calls N]
+        Pure Python: no server needed.
+"""
+
+import argparse
+import time
+import jwt
+from bson.objectid import ObjectId
+from flask import Flask
+import lib.decorators
+from lib.auth import SECRET_KEY, generate_token, token_cache_stats, verify_token
+from lib.decorators import token_required
+from benchmarks.common import print_table
+
+def verify_token_uncached(token: str) -> dict:
+    """verify_token before the cache"""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        return None
+
+def per_call_us(fn, calls):
+    """Mean microseconds per fn() call over `calls` calls, after a warm-up"""
+    for _ in range(min(calls, 1000)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100_000)
+    args = parser.parse_args()
+
+    token = generate_token(str(ObjectId()), 'customer')
+    view = token_required(lambda: None)
+    Flask(__name__).test_request_context('/api/bench', headers={'Authorization': f'Bearer {token}'}).push()
+
+    rows = []
+    for name, before_fn, after_fn in (
+        ('verify_token', lambda: verify_token_uncached(token), lambda: verify_token(token)),
+        ('token_required', view, view)
+    ):
+        lib.decorators.verify_token = verify_token_uncached
+        before = per_call_us(before_fn, args.calls)
+        lib.decorators.verify_token = verify_token
+        after = per_call_us(after_fn, args.calls)
+        rows.append((name, f'{before:.2f}', f'{after:.2f}', f'{before / after:.1f}x'))
+
+    print(f'{args.calls} calls per measurement, microseconds per call')
+    print_table(('path', 'uncached us', 'cached us', 'speedup'), rows)
+    print(f"cache stats: {token_cache_stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Admin user search: the original in-memory filter vs the search_keys index
+
+Seeds --users users (a --legacy share of them stored without search_keys,
+as before the rebuild) and times the work behind GET /api/admin/users for
+a few searches:
+  legacy   the original implementation: every user of the role sorted by
+           createdAt, a Python substring filter and three role counts
+  indexed  what the endpoint does now with ?limit=20: one page of
+           search_filter matches, its count and the role-counter document
+
+Usage:
+    BENCH_MONGODB_URI=... python -m benchmarks.bench_user_search [--users N] [--legacy 0.01]
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+import lib.mongodb
+from lib.pagination import fetch_page
+from lib.user_directory import get_role_counts, rebuild_user_directory, search_filter, with_search_keys
+from benchmarks.common import bench_database, insert_in_batches, median_ms, print_table
+
+FIRST_NAMES = ['Juan', 'Maria', 'José', 'Ana', 'Pedro', 'Liza', 'Ramon', 'Carmela', 'Miguel', 'Rosa']
+LAST_NAMES = ['Dela Cruz', 'Santos', 'Reyes', 'Garcia', 'Mendoza', 'Bautista', 'Aquino', 'Villanueva']
+SEARCHES = [(None, 'maria'), ('provider', 'reyes'), ('customer', 'user12345'), (None, 'nobody')]
+
+def user_documents(count, legacy_share):
+    random.seed(20)
+    start = datetime(2024, 1, 1)
+    for number in range(count):
+        user = {
+            'username': f'user{number}',
+            'fullName': f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}',
+            'email': f'user{number}@example.com',
+            'phone': f'+63 9{number:09d}',
+            'role': 'provider' if number % 5 == 0 else 'customer',
+            'password': 'x' * 60,
+            'createdAt': start + timedelta(seconds=number)
+        }
+        yield user if random.random() < legacy_share else with_search_keys(user)
+
+def legacy_search(db, role, text):
+    """GET /api/admin/users before search_keys"""
+    query = {'role': role} if role else {}
+    users = list(db.users.find(query, {'password': 0}).sort('createdAt', -1))
+    text = text.lower()
+    users = [
+        user for user in users
+        if text in user.get('username', '').lower()
+        or text in user.get('fullName', '').lower()
+        or text in user.get('email', '').lower()
+    ]
+    totals = [db.users.count_documents({'role': role}) for role in ('customer', 'provider', 'admin')]
+    return users, totals
+
+def indexed_search(db, role, text):
+    """GET /api/admin/users?search=...&limit=20 now"""
+    query = {'role': role} if role else {}
+    query.update(search_filter(text))
+    users, _ = fetch_page(db.users, query, 20, field='createdAt', projection={'password': 0})
+    return users, db.users.count_documents(query), get_role_counts(db)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=500_000)
+    parser.add_argument('--legacy', type=float, default=0.01, help='share of users stored without search_keys')
+    args = parser.parse_args()
+
+    db = bench_database()
+    insert_in_batches(db.users, user_documents(args.users, args.legacy))
+    lib.mongodb.ensure_indexes(db)
+    get_role_counts(db)
+
+    def measure(label):
+        rows = []
+        for role, text in SEARCHES:
+            legacy_ms = median_ms(lambda: legacy_search(db, role, text), repeat=3)
+            indexed_ms = median_ms(lambda: indexed_search(db, role, text), repeat=10)
+            rows.append((label, role or 'all', text, f'{legacy_ms:.1f}', f'{indexed_ms:.1f}'))
+        return rows
+
+    rows = measure(f'{args.legacy:.0%} without keys')
+    rebuild_user_directory(db)
+    rows += measure('after rebuild')
+
+    print(f'{args.users:,} users')
+    print_table(('state', 'role', 'search', 'legacy ms', 'indexed ms'), rows)
+
+if __name__ == '__main__':
+    main()
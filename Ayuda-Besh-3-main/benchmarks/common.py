@@ -0,0 +1,52 @@
+# benchmarks/common.py
+#
+# Shared helpers for the opt-in benchmarks (see benchmarks/README.md).
+# Benchmarks that need MongoDB connect to BENCH_MONGODB_URI and work in a
+# scratch database that is dropped first: never point them at real data.
+
+import os
+import statistics
+import time
+from pymongo import MongoClient
+
+BENCH_DATABASE = 'ayudabesh_bench'
+
+def bench_database():
+    """Empty scratch database on BENCH_MONGODB_URI (default: a local server)"""
+    uri = os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017')
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    client.drop_database(BENCH_DATABASE)
+    return client[BENCH_DATABASE]
+
+def insert_in_batches(collection, documents, batch_size=10000):
+    """Insert an iterable of documents without holding it in memory; returns the count"""
+    batch, count = [], 0
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        count += len(batch)
+    return count
+
+def median_ms(fn, repeat=20):
+    """Median wall time of fn() in milliseconds, after one warm-up call"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def docs_examined(cursor):
+    """totalDocsExamined of a find cursor's winning plan"""
+    return cursor.explain()['executionStats']['totalDocsExamined']
+
+def print_table(header, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(value).rjust(width) for value, width in zip(row, widths)))
@@ -17,4 +17,26 @@ import os
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret')
     JWT_SECRET = os.getenv('JWT_SECRET', 'dev-jwt-secret')
-    DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
\ No newline at end of file
+    DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+
+    # MongoDB connection pool (empty values fall back to the driver defaults)
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS') or 0) or None
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '20000'))
+    MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS') or 0) or None
+    # e.g. "zstd,snappy,zlib" - zstd needs the zstandard package, snappy needs python-snappy
+    MONGODB_COMPRESSORS = os.getenv('MONGODB_COMPRESSORS', '')
+    MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', 'primary')
+
+    # Farthest provider (km) a nearby search returns; also caps larger service radii
+    PROVIDER_SEARCH_MAX_KM = float(os.getenv('PROVIDER_SEARCH_MAX_KM', '100'))
+
+    # Seconds the admin dashboard statistics are cached per worker
+    ADMIN_STATS_CACHE_TTL = int(os.getenv('ADMIN_STATS_CACHE_TTL', '30'))
+    # Upper bound in seconds on how long a worker serves a cached service catalog
+    SERVICE_CATALOG_CACHE_TTL = int(os.getenv('SERVICE_CATALOG_CACHE_TTL', '300'))
+
+    # Run the email/SMS outbox dispatcher inside each app process
+    OUTBOX_DISPATCHER = os.getenv('OUTBOX_DISPATCHER', 'True').lower() == 'true'
@@ -6,6 +6,7 @@ This script generates the properly hashed password and complete document structu
 
 from werkzeug.security import generate_password_hash
 from datetime import datetime
+from lib.user_directory import with_search_keys
 
 # Admin details
 admin_data = {
@@ -30,6 +31,8 @@ admin_document = {
     "role": admin_data["role"],
     "createdAt": datetime.utcnow()
 }
+# Same search keys as accounts created by the app, so admin search finds it
+with_search_keys(admin_document)
 
 import json
 
@@ -46,7 +49,8 @@ compass_doc = {
     "phone": admin_document.get("phone", "+63 912 345 6789"),
     "password": admin_document["password"],
     "role": admin_document["role"],
-    "createdAt": admin_document["createdAt"]
+    "createdAt": admin_document["createdAt"],
+    "search_keys": admin_document["search_keys"]
 }
 
 print(json.dumps(compass_doc, indent=2, default=str))
@@ -61,8 +65,11 @@ print(f'  email: "{admin_document["email"]}",')
 print(f'  phone: "{admin_document.get("phone", "+63 912 345 6789")}",')
 print(f'  password: "{admin_document["password"]}",')
 print(f'  role: "{admin_document["role"]}",')
-print(f'  createdAt: new Date()')
+print(f'  createdAt: new Date(),')
+print(f'  search_keys: {json.dumps(admin_document["search_keys"])}')
 print(f'}});')
+print("\nThen run `python manage.py rebuild-user-directory` so the admin user totals include it,")
+print("or use create_admin_direct.py, which inserts the account and counts it.")
 print("\n" + "=" * 60)
 print("LOGIN CREDENTIALS")
 print("=" * 60)
@@ -14,6 +14,7 @@ load_dotenv(env_path)
 
 from lib.mongodb import get_database
 from lib.auth import hash_password
+from lib.user_directory import insert_user
 from datetime import datetime
 
 def create_admin_account():
@@ -70,7 +71,7 @@ def create_admin_account():
         }
         
         # Insert into database
-        result = users_collection.insert_one(admin_document)
+        result = insert_user(db, admin_document)
         
         print("=" * 60)
         print("✅ Admin account created successfully!")
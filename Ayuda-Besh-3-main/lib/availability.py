@@ -0,0 +1,233 @@
+# lib/availability.py
+
+import os
+import re
+import time
+from bisect import bisect_right
+from datetime import date, datetime
+from lib.cache import TTLCache
+
+# Compiled provider availability.
+#
+# An `availability` document (weekly `schedule` of HH:MM strings plus
+# `specific_dates` overrides) is compiled once into minutes-since-midnight
+# interval sets: one DayRule per weekday and a date-keyed map of overrides.
+# A check is then a dict lookup and a bisect, with no string parsing.
+#
+# Compiled schedules are cached per worker and provider together with the
+# `version` and `updated_at` of the availability document they came from;
+# every write through manage_availability increments the one and sets the
+# other (updated_at alone can repeat within a millisecond). A cached schedule
+# is used without a query for AVAILABILITY_REVALIDATE_SECONDS; after that one
+# query per batch re-reads the documents and only providers whose version
+# changed are recompiled. The writing worker drops its own entry at once;
+# other workers see a change within the revalidation interval.
+#
+# manage_availability rejects times that do not parse. A stored schedule that
+# still fails to compile marks only that provider unavailable.
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MINUTES_PER_DAY = 24 * 60
+AVAILABILITY_REVALIDATE_SECONDS = float(os.getenv('AVAILABILITY_REVALIDATE_SECONDS', '5'))
+
+# provider_id -> ((version, updated_at), CompiledAvailability, revalidate_after)
+_compiled_cache = TTLCache(maxsize=5000, ttl=300)
+
+TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+
+def parse_minutes(value: str) -> int:
+    """'HH:MM' (00:00 to 24:00) -> minutes since midnight"""
+    match = TIME_PATTERN.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        raise ValueError(f'Invalid time: {value!r} (expected HH:MM)')
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes >= 60 or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(f'Invalid time: {value!r} (expected HH:MM)')
+    return hours * 60 + minutes
+
+def format_minutes(minutes: int) -> str:
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+class DayRule:
+    """Open intervals of one day and the reasons reported outside them"""
+
+    __slots__ = ('is_open', 'start', 'end', 'starts', 'ends', 'closed_reason', 'hours_reason')
+
+    def __init__(self, is_open: bool, start: int = 0, end: int = MINUTES_PER_DAY, breaks=(),
+                 closed_reason: str = None, hours_reason: str = None):
+        self.is_open = is_open
+        self.start = start
+        self.end = end
+        self.closed_reason = closed_reason
+        self.hours_reason = hours_reason
+        # Working hours minus breaks, as sorted disjoint [start, end) intervals
+        intervals = [(start, end)] if is_open else []
+        for break_start, break_end in sorted(breaks):
+            remaining = []
+            for interval_start, interval_end in intervals:
+                if break_end <= interval_start or break_start >= interval_end:
+                    remaining.append((interval_start, interval_end))
+                    continue
+                if interval_start < break_start:
+                    remaining.append((interval_start, break_start))
+                if break_end < interval_end:
+                    remaining.append((break_end, interval_end))
+            intervals = remaining
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+
+    def check(self, minute: int):
+        """(available, reason) at a minute of the day"""
+        if not self.is_open:
+            return False, self.closed_reason
+        if minute < self.start or minute >= self.end:
+            return False, self.hours_reason
+        index = bisect_right(self.starts, minute) - 1
+        if index >= 0 and minute < self.ends[index]:
+            return True, None
+        return False, 'During break time'
+
+    def open_intervals(self) -> list:
+        return [[format_minutes(start), format_minutes(end)] for start, end in zip(self.starts, self.ends)]
+
+def _span(label: str, entry: dict) -> tuple:
+    """(start, end) minutes of an entry with HH:MM start and end, start before end"""
+    if not isinstance(entry, dict) or 'start' not in entry or 'end' not in entry:
+        raise ValueError(f'Missing start/end time for {label}')
+    start, end = parse_minutes(entry['start']), parse_minutes(entry['end'])
+    if start >= end:
+        raise ValueError(f'Start time must be before end time for {label}')
+    return start, end
+
+def _breaks(entry: dict, label: str) -> list:
+    return [_span(f'{label} break', b) for b in entry.get('breaks') or []]
+
+def _weekly_rule(day: str, day_schedule: dict) -> DayRule:
+    if day_schedule is None:
+        return DayRule(False, closed_reason='Day not in schedule')
+    if not day_schedule.get('available', False):
+        return DayRule(False, closed_reason=f'Provider not available on {day}')
+    return DayRule(
+        True, *_span(day, day_schedule), _breaks(day_schedule, day),
+        hours_reason=f'Outside working hours ({day_schedule["start"]} - {day_schedule["end"]})'
+    )
+
+def _override_rule(entry: dict, label: str = 'date') -> DayRule:
+    if not entry.get('available', True):
+        return DayRule(False, closed_reason=entry.get('reason', 'Provider marked this date as unavailable'))
+    if 'start' in entry and 'end' in entry:
+        return DayRule(
+            True, *_span(label, entry), _breaks(entry, label),
+            hours_reason=f'Outside working hours ({entry["start"]} - {entry["end"]})'
+        )
+    return DayRule(True, breaks=_breaks(entry, label))
+
+class CompiledAvailability:
+    """A provider's weekly rules and date overrides, ready for repeated checks"""
+
+    __slots__ = ('weekly', 'overrides')
+
+    def __init__(self, weekly: list, overrides: dict):
+        self.weekly = weekly
+        self.overrides = overrides
+
+    @classmethod
+    def compile(cls, availability: dict):
+        schedule = availability.get('schedule') or {}
+        weekly = [_weekly_rule(day, schedule.get(day)) for day in DAYS]
+        overrides = {}
+        for entry in availability.get('specific_dates') or []:
+            entry_date = entry.get('date')
+            if hasattr(entry_date, 'date'):
+                # The first entry for a date wins, as it always has
+                overrides.setdefault(entry_date.date(), _override_rule(entry, entry_date.date().isoformat()))
+        return cls(weekly, overrides)
+
+    def rule_for(self, day: date) -> DayRule:
+        return self.overrides.get(day) or self.weekly[day.weekday()]
+
+    def check(self, when: datetime):
+        """(available, reason) at a datetime, in the provider's local wall-clock time"""
+        return self.rule_for(when.date()).check(when.hour * 60 + when.minute)
+
+    def day_grid(self, day: date, step_minutes: int = 30) -> dict:
+        """Availability of every step_minutes slot of a day"""
+        rule = self.rule_for(day)
+        grid = {
+            'available': rule.is_open,
+            'open_intervals': rule.open_intervals(),
+            'slots': [
+                {'time': format_minutes(minute), 'available': rule.check(minute)[0]}
+                for minute in range(0, MINUTES_PER_DAY, step_minutes)
+            ]
+        }
+        if not rule.is_open:
+            grid['reason'] = rule.closed_reason
+        return grid
+
+# Providers without an availability document: weekdays 9 AM - 6 PM
+DEFAULT_AVAILABILITY = CompiledAvailability(
+    [
+        DayRule(True, 9 * 60, 18 * 60, hours_reason='Outside working hours (9 AM - 6 PM)')
+        for _ in DAYS[:5]
+    ] + [
+        DayRule(False, closed_reason='Provider not available on weekends')
+        for _ in DAYS[5:]
+    ],
+    {}
+)
+
+# Providers whose stored schedule does not compile
+INVALID_AVAILABILITY = CompiledAvailability([DayRule(False, closed_reason='Invalid schedule') for _ in DAYS], {})
+
+def validate_availability(availability: dict):
+    """Raise ValueError naming the first entry that would not compile"""
+    try:
+        CompiledAvailability.compile(availability)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f'Invalid schedule: {e}') from e
+
+def _compile_or_invalid(provider_id, doc: dict) -> CompiledAvailability:
+    try:
+        return CompiledAvailability.compile(doc)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        print(f"Invalid availability for provider {provider_id}: {e}")
+        return INVALID_AVAILABILITY
+
+def invalidate_compiled_availability(provider_id):
+    """Drop this worker's compiled schedule of a provider after writing its availability"""
+    _compiled_cache.delete(provider_id)
+
+def get_compiled_availability(db, provider_ids) -> dict:
+    """{provider_id: CompiledAvailability}, re-reading stale or uncached providers with one query"""
+    now = time.monotonic()
+    compiled = {}
+    stale = {}
+    for provider_id in set(provider_ids):
+        entry = _compiled_cache.get(provider_id)
+        if entry is not None and entry[2] > now:
+            compiled[provider_id] = entry[1]
+        else:
+            stale[provider_id] = entry
+    if stale:
+        found = {
+            doc['provider_id']: doc
+            for doc in db.availability.find(
+                {'provider_id': {'$in': list(stale)}},
+                {'provider_id': 1, 'schedule': 1, 'specific_dates': 1, 'version': 1, 'updated_at': 1}
+            )
+        }
+        revalidate_after = now + AVAILABILITY_REVALIDATE_SECONDS
+        for provider_id, entry in stale.items():
+            doc = found.get(provider_id)
+            version = (doc.get('version'), doc.get('updated_at')) if doc else None
+            if entry is not None and entry[0] == version:
+                schedule = entry[1]  # Unchanged since it was compiled
+            else:
+                schedule = _compile_or_invalid(provider_id, doc) if doc else DEFAULT_AVAILABILITY
+            compiled[provider_id] = schedule
+            _compiled_cache.set(provider_id, (version, schedule, revalidate_after))
+    return compiled
+
+def availability_cache_stats() -> dict:
+    return _compiled_cache.stats()
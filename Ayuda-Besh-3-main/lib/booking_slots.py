@@ -0,0 +1,113 @@
+# lib/booking_slots.py
+
+import os
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Double-booking prevention.
+#
+# A provider's time is divided into BOOKING_SLOT_MINUTES cells. An active
+# (pending or accepted) booking holds one `booking_slots` document per cell
+# its [booking_time, booking_time + duration) range touches, and the unique
+# partial index on (provider_id, slot_start) lets only one active booking
+# hold a cell. Two overlapping bookings always share a cell, so the server
+# rejects the second one however closely the requests race; no separate
+# find-then-insert check is needed.
+#
+# Slots are claimed before the booking is written and released (active:
+# false, removed later by a TTL index) when it leaves the active statuses.
+# `python manage.py reconcile-booking-slots` repairs what a crash between
+# those writes can leave behind.
+
+SLOT_MINUTES = int(os.getenv('BOOKING_SLOT_MINUTES', '30'))
+DEFAULT_DURATION_MINUTES = int(os.getenv('BOOKING_DEFAULT_DURATION_MINUTES', '60'))
+MAX_DURATION_MINUTES = 12 * 60
+ACTIVE_STATUSES = ('pending', 'accepted')
+# Slots claimed this recently may belong to a booking that is still being written
+RECONCILE_GRACE_SECONDS = 300
+
+class SlotUnavailable(Exception):
+    """Another active booking already holds part of the requested time"""
+
+def _utc(value: datetime) -> datetime:
+    # MongoDB stores naive UTC; aware datetimes from the API are converted
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def booking_duration(booking: dict) -> int:
+    return int(booking.get('duration_minutes') or DEFAULT_DURATION_MINUTES)
+
+def slot_starts(start: datetime, duration_minutes: int) -> list:
+    """Start of every slot cell overlapped by [start, start + duration)"""
+    start = _utc(start)
+    end = start + timedelta(minutes=duration_minutes)
+    cell = timedelta(minutes=SLOT_MINUTES)
+    midnight = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    current = midnight + cell * ((start - midnight) // cell)
+    cells = []
+    while current < end:
+        cells.append(current)
+        current += cell
+    return cells
+
+def reserve_slots(db, booking: dict):
+    """Claim the slot cells of a booking; raises SlotUnavailable on any overlap.
+
+    Idempotent for the same booking, so it can be re-run (accepting a booking
+    created before slots existed, reconciliation). A partial claim is undone
+    before raising.
+    """
+    provider_id = booking['provider_id']
+    now = datetime.utcnow()
+    claims = [
+        UpdateOne(
+            {'provider_id': provider_id, 'slot_start': slot_start, 'active': True, 'booking_id': booking['_id']},
+            {'$setOnInsert': {'created_at': now}},
+            upsert=True
+        )
+        for slot_start in slot_starts(booking['booking_time'], booking_duration(booking))
+    ]
+    try:
+        db.booking_slots.bulk_write(claims, ordered=True)
+    except (BulkWriteError, DuplicateKeyError) as e:
+        errors = e.details.get('writeErrors', []) if isinstance(e, BulkWriteError) else [{'code': e.code}]
+        if not errors or any(error.get('code') != 11000 for error in errors):
+            raise
+        release_slots(db, booking['_id'])
+        raise SlotUnavailable()
+
+def release_slots(db, booking_id) -> int:
+    """Free the cells of a booking that is no longer pending or accepted"""
+    return db.booking_slots.update_many(
+        {'booking_id': booking_id, 'active': True},
+        {'$set': {'active': False, 'released_at': datetime.utcnow()}}
+    ).modified_count
+
+def reconcile_booking_slots(db) -> dict:
+    """Reserve slots of active bookings that hold none and free slots of inactive or missing bookings"""
+    summary = {'reserved': 0, 'released': 0, 'conflicts': []}
+    held = set(db.booking_slots.distinct('booking_id', {'active': True}))
+    settled = set(db.booking_slots.distinct('booking_id', {
+        'active': True,
+        'created_at': {'$lt': datetime.utcnow() - timedelta(seconds=RECONCILE_GRACE_SECONDS)}
+    }))
+    for booking in db.bookings.find(
+        {'status': {'$in': list(ACTIVE_STATUSES)}},
+        {'provider_id': 1, 'booking_time': 1, 'duration_minutes': 1}
+    ).sort('created_at', 1):
+        if booking['_id'] in held:
+            settled.discard(booking['_id'])
+            continue
+        if not isinstance(booking.get('booking_time'), datetime):
+            continue
+        try:
+            reserve_slots(db, booking)
+            summary['reserved'] += 1
+        except SlotUnavailable:
+            summary['conflicts'].append(str(booking['_id']))
+    # Whatever is left is held by a booking that is not active (or no longer exists)
+    for booking_id in settled:
+        summary['released'] += release_slots(db, booking_id)
+    return summary
@@ -0,0 +1,193 @@
+# lib/booking_stats.py
+
+from datetime import datetime
+
+# Materialized per-day booking rollups, one row per (day, provider_id, service_type):
+#   counts.<status>   bookings created that day, by their current status
+#   total             bookings created that day
+#   created_revenue   amount of those bookings that are now completed
+#   completed_count   bookings completed that day
+#   completed_revenue amount of bookings completed that day
+# Rows are kept current by the booking routes and can be rebuilt with
+# `python manage.py backfill-booking-stats`. Until that has run once over
+# existing data the rows only hold bookings written since deploy, so readers
+# check booking_stats_seeded() and fall back to the raw bookings before then.
+
+BOOKING_STATUSES = ('pending', 'accepted', 'completed', 'rejected', 'cancelled')
+ROW_KEY = ('day', 'provider_id', 'service_type')
+REBUILD_COLLECTION = 'booking_daily_stats_rebuild'
+SEEDED_MARKER_ID = 'booking_daily_stats'
+
+# Aggregation expression equivalent of booking_amount()
+BOOKING_AMOUNT = {'$cond': [
+    {'$ne': [{'$ifNull': ['$final_price', 0]}, 0]},
+    '$final_price',
+    {'$ifNull': ['$price', 0]}
+]}
+
+def booking_amount(booking: dict) -> float:
+    """Amount used for revenue: final_price when set, else the quoted price"""
+    return booking.get('final_price') or booking.get('price', 0) or 0
+
+def _day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _row_key(booking: dict, day: datetime) -> dict:
+    return {
+        'day': _day(day),
+        'provider_id': booking['provider_id'],
+        'service_type': booking.get('service_type', '')
+    }
+
+def _inc(db, key: dict, increments: dict):
+    db.booking_daily_stats.update_one(
+        key,
+        {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+def booking_stats_seeded(db) -> bool:
+    """Whether the rollups cover every booking, i.e. a rebuild has completed
+
+    A database without bookings is covered from the start, so it is marked
+    seeded on first check.
+    """
+    if db.counters.find_one({'_id': SEEDED_MARKER_ID, 'seeded': True}, {'_id': 1}):
+        return True
+    if db.bookings.find_one({}, {'_id': 1}) is None:
+        db.counters.update_one({'_id': SEEDED_MARKER_ID}, {'$set': {'seeded': True}}, upsert=True)
+        return True
+    return False
+
+def record_booking_created(db, booking: dict):
+    """Count a newly inserted booking in its creation-day row"""
+    try:
+        status = booking.get('status', 'pending')
+        _inc(db, _row_key(booking, booking['created_at']), {f'counts.{status}': 1, 'total': 1})
+    except Exception as e:
+        print(f"Error updating booking stats: {e}")
+
+def record_status_change(db, booking: dict, old_status: str, new_status: str, changed_at: datetime = None):
+    """Move a booking between status counters, adding revenue when it completes"""
+    try:
+        increments = {f'counts.{old_status}': -1, f'counts.{new_status}': 1}
+        if new_status == 'completed':
+            amount = booking_amount(booking)
+            increments['created_revenue'] = amount
+            _inc(db, _row_key(booking, changed_at or datetime.utcnow()), {
+                'completed_count': 1,
+                'completed_revenue': amount
+            })
+        _inc(db, _row_key(booking, booking['created_at']), increments)
+    except Exception as e:
+        print(f"Error updating booking stats: {e}")
+
+def rebuild_booking_stats(db) -> int:
+    """Recompute every rollup row from the bookings collection; returns the row count
+
+    The rows are built in a scratch collection and then swapped in row by row,
+    so reports keep reading complete rows while it runs. Afterwards only rows
+    that neither the rebuild nor a booking write touched are deleted; a
+    concurrent $inc can still be overwritten by the swap, and the next
+    rebuild corrects it.
+    """
+    started_at = datetime.utcnow()
+    scratch = db[REBUILD_COLLECTION]
+    scratch.drop()
+    scratch.create_index([(field, 1) for field in ROW_KEY], unique=True)
+    merge = {
+        'into': REBUILD_COLLECTION,
+        'on': list(ROW_KEY),
+        'whenMatched': 'merge',
+        'whenNotMatched': 'insert'
+    }
+
+    # Creation-day counters
+    db.bookings.aggregate([
+        {'$match': {'created_at': {'$type': 'date'}}},
+        {'$group': dict(
+            {
+                '_id': {
+                    'day': {'$dateTrunc': {'date': '$created_at', 'unit': 'day'}},
+                    'provider_id': '$provider_id',
+                    'service_type': {'$ifNull': ['$service_type', '']}
+                },
+                'total': {'$sum': 1},
+                'created_revenue': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, BOOKING_AMOUNT, 0]}}
+            },
+            **{status: {'$sum': {'$cond': [{'$eq': ['$status', status]}, 1, 0]}} for status in BOOKING_STATUSES}
+        )},
+        {'$project': {
+            '_id': 0,
+            'day': '$_id.day',
+            'provider_id': '$_id.provider_id',
+            'service_type': '$_id.service_type',
+            'total': 1,
+            'created_revenue': 1,
+            'counts': {status: f'${status}' for status in BOOKING_STATUSES},
+            'updated_at': {'$literal': started_at}
+        }},
+        {'$merge': merge}
+    ])
+
+    # Completion-day revenue
+    db.bookings.aggregate([
+        {'$match': {'status': 'completed', 'completed_at': {'$type': 'date'}}},
+        {'$group': {
+            '_id': {
+                'day': {'$dateTrunc': {'date': '$completed_at', 'unit': 'day'}},
+                'provider_id': '$provider_id',
+                'service_type': {'$ifNull': ['$service_type', '']}
+            },
+            'completed_count': {'$sum': 1},
+            'completed_revenue': {'$sum': BOOKING_AMOUNT}
+        }},
+        {'$project': {
+            '_id': 0,
+            'day': '$_id.day',
+            'provider_id': '$_id.provider_id',
+            'service_type': '$_id.service_type',
+            'completed_count': 1,
+            'completed_revenue': 1,
+            'updated_at': {'$literal': started_at}
+        }},
+        {'$merge': merge}
+    ])
+
+    # Swap the rebuilt rows in, then drop rows for keys that no longer have bookings
+    scratch.aggregate([
+        {'$project': {'_id': 0}},
+        {'$merge': {
+            'into': 'booking_daily_stats',
+            'on': list(ROW_KEY),
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ])
+    db.booking_daily_stats.delete_many({'updated_at': {'$lt': started_at}})
+    scratch.drop()
+    db.counters.update_one(
+        {'_id': SEEDED_MARKER_ID},
+        {'$set': {'seeded': True, 'rebuilt_at': started_at}},
+        upsert=True
+    )
+    return db.booking_daily_stats.count_documents({})
+
+def booking_stats_group(group_by: str = None) -> dict:
+    """$group stage summing rollup rows by a row field (or overall when None)"""
+    return {'$group': dict(
+        {
+            '_id': f'${group_by}' if group_by else None,
+            'total': {'$sum': '$total'},
+            'created_revenue': {'$sum': '$created_revenue'},
+            'completed_count': {'$sum': '$completed_count'},
+            'completed_revenue': {'$sum': '$completed_revenue'}
+        },
+        **{status: {'$sum': f'$counts.{status}'} for status in BOOKING_STATUSES}
+    )}
+
+def summarize_booking_stats(db, match: dict = None, group_by: str = None) -> list:
+    """Sum rollup rows matching `match`, grouped by a row field (or overall when None)"""
+    pipeline = [{'$match': match}] if match else []
+    pipeline.append(booking_stats_group(group_by))
+    return list(db.booking_daily_stats.aggregate(pipeline))
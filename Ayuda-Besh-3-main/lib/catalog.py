@@ -0,0 +1,98 @@
+# lib/catalog.py
+
+import os
+import time
+from pymongo.errors import DuplicateKeyError
+from lib.cache import TTLCache
+
+# The flattened provider/service catalog behind /api/available-services is
+# built once per catalog version and cached per worker. Routes that change
+# what the catalog shows (provider profiles, verification, disabling, ratings)
+# call bump_catalog_version() after their write; the version lives in MongoDB
+# so every worker sees it. The TTL only bounds staleness from other writers.
+# Ratings change often and only move a provider's average, so their bumps are
+# coalesced: at most one per CATALOG_RATING_BUMP_SECONDS across all workers.
+# A rating that lands inside the window shows up with the next bump or when
+# the cached catalog expires, whichever comes first.
+CATALOG_COUNTER_ID = 'service_catalog'
+RATING_BUMP_SECONDS = float(os.environ.get('CATALOG_RATING_BUMP_SECONDS', '60'))
+
+_catalog_cache = TTLCache(maxsize=4, ttl=300)
+
+PROVIDER_PROJECTION = {
+    'services_offered': 1, 'location': 1, 'description': 1, 'hourly_rate': 1,
+    'username': 1, 'fullName': 1, 'rating': 1
+}
+
+def get_catalog_version(db) -> int:
+    counter = db.counters.find_one({'_id': CATALOG_COUNTER_ID}, {'version': 1})
+    return counter.get('version', 0) if counter else 0
+
+def bump_catalog_version(db, coalesce_seconds: float = None) -> bool:
+    """Invalidate the cached catalog in every worker; returns whether it did.
+
+    With coalesce_seconds, skip the bump if another one happened within that
+    many seconds.
+    """
+    now = time.time()
+    query = {'_id': CATALOG_COUNTER_ID}
+    if coalesce_seconds:
+        query['bumped_at'] = {'$not': {'$gt': now - coalesce_seconds}}
+    try:
+        db.counters.update_one(query, {'$inc': {'version': 1}, '$set': {'bumped_at': now}}, upsert=True)
+    except DuplicateKeyError:
+        # The counter exists and was bumped inside the window
+        return False
+    except Exception as e:
+        print(f"Error bumping catalog version: {e}")
+    _catalog_cache.clear()
+    return True
+
+def build_service_catalog(db) -> list:
+    """One entry per verified, enabled provider and offered service"""
+    service_categories = {
+        service.get('category', ''): service
+        for service in db.services.find({}, {'category': 1, 'name': 1, 'description': 1})
+    }
+    entries = []
+    for provider in db.users.find(
+        {'role': 'provider', 'is_verified': True, 'account_disabled': {'$ne': True}},
+        PROVIDER_PROJECTION
+    ):
+        base = {
+            'provider_id': str(provider['_id']),
+            'company_name': provider.get('username', 'Unknown Company'),
+            'owner_name': provider.get('fullName', 'Unknown Owner'),
+            'location': provider.get('location', 'Not specified'),
+            'hourly_rate': provider.get('hourly_rate', 500),
+            'rating': provider.get('rating', 0)
+        }
+        description = provider.get('description', '')
+        services_offered = provider.get('services_offered') or []
+        if not services_offered:
+            # Providers without services specified are shown as "General Services"
+            entries.append(dict(
+                base,
+                service_type='general',
+                service_name='General Services',
+                description=description or 'Professional service provider'
+            ))
+            continue
+        for service_type in services_offered:
+            service_info = service_categories.get(service_type, {})
+            entries.append(dict(
+                base,
+                service_type=service_type,
+                service_name=service_info.get('name', service_type.replace('_', ' ').title()),
+                description=description or service_info.get('description', 'Professional service provider')
+            ))
+    return entries
+
+def get_service_catalog(db, ttl: float = None) -> dict:
+    """Cached catalog for the current version: {'version', 'built_at', 'entries'}"""
+    version = get_catalog_version(db)
+    catalog = _catalog_cache.get(version)
+    if catalog is None:
+        catalog = {'version': version, 'built_at': time.time(), 'entries': build_service_catalog(db)}
+        _catalog_cache.set(version, catalog, ttl=ttl)
+    return catalog
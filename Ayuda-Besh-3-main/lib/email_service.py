@@ -0,0 +1,118 @@
+# lib/email_service.py
+
+import os
+import time
+import smtplib
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.utils import formataddr
+
+# Message content and transports. Requests never send directly: they queue
+# messages in the outbox (lib/outbox.py), whose dispatcher uses the
+# connections below.
+
+def smtp_settings() -> dict:
+    smtp_username = os.getenv('SMTP_USERNAME', '')
+    return {
+        'server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.getenv('SMTP_PORT', '587')),
+        'username': smtp_username,
+        'password': os.getenv('SMTP_PASSWORD', ''),
+        'from_email': os.getenv('SMTP_FROM_EMAIL', smtp_username),
+        'from_name': os.getenv('SMTP_FROM_NAME', 'AyudaBesh'),
+        'starttls': os.getenv('SMTP_STARTTLS', 'True').lower() == 'true'
+    }
+
+def email_configured() -> bool:
+    settings = smtp_settings()
+    return bool(settings['username'] and settings['password'])
+
+def sms_configured() -> bool:
+    return all(os.getenv(name) for name in ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_PHONE_NUMBER'))
+
+def verification_sms_content(verification_code: str) -> str:
+    return f'Your AyudaBesh verification code is: {verification_code}. Valid for 15 minutes.'
+
+def build_email_message(to_email: str, subject: str, text: str, html: str = None, settings: dict = None) -> MIMEMultipart:
+    settings = settings or smtp_settings()
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = formataddr((settings['from_name'], settings['from_email']))
+    msg['To'] = to_email
+    msg.attach(MIMEText(text, 'plain'))
+    if html:
+        msg.attach(MIMEText(html, 'html'))
+    return msg
+
+class SMTPConnection:
+    """A reusable SMTP session: connects lazily, reconnects when the server drops it"""
+
+    def __init__(self, settings: dict = None, idle_timeout: float = 60):
+        self.settings = settings or smtp_settings()
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.settings['server'], self.settings['port'], timeout=30)
+        if self.settings['starttls']:
+            server.starttls()
+        if self.settings['username']:
+            server.login(self.settings['username'], self.settings['password'])
+        self._server = server
+
+    def _alive(self) -> bool:
+        if self._server is None:
+            return False
+        if time.monotonic() - self._last_used < self.idle_timeout:
+            return True
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, msg):
+        """Send one message, reconnecting once if the session went stale"""
+        for attempt in (1, 2):
+            if not self._alive():
+                self.close()
+                self._connect()
+            try:
+                self._server.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+_sms_client = None
+
+def get_sms_client():
+    """Twilio client shared by all SMS sends (raises ImportError if twilio is missing)"""
+    global _sms_client
+    if _sms_client is None:
+        from twilio.rest import Client
+        _sms_client = Client(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
+    return _sms_client
+
+def send_sms(phone_number: str, body: str):
+    get_sms_client().messages.create(
+        body=body,
+        from_=os.getenv('TWILIO_PHONE_NUMBER'),
+        to=phone_number
+    )
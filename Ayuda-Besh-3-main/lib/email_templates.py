@@ -0,0 +1,60 @@
+# lib/email_templates.py
+
+import os
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+# Transactional email templates live in templates/email/<name>.txt and
+# <name>.html (both extending base.*). Each is compiled once per process and
+# reused, so sending only renders the variable parts.
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'email')
+
+# Subject line per message; rendered with the same context as the bodies
+EMAIL_SUBJECTS = {
+    'password_reset': 'AyudaBesh - Password Reset Verification Code',
+    'booking_accepted': 'AyudaBesh - Your {{ service_name }} booking was accepted',
+    'account_disabled': 'AyudaBesh - Your account has been disabled',
+    'review_received': 'AyudaBesh - New {{ rating }}-star review from {{ customer_name }}',
+}
+
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(enabled_extensions=('html',), default_for_string=False),
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+    auto_reload=False,  # Templates are read once; restart to pick up edits
+    cache_size=-1
+)
+
+_compiled = {}
+
+def get_email_templates(name: str) -> tuple:
+    """(subject, text, html) compiled templates for a message name"""
+    templates = _compiled.get(name)
+    if templates is None:
+        if name not in EMAIL_SUBJECTS:
+            raise ValueError(f'Unknown email template: {name}')
+        templates = (
+            _env.from_string(EMAIL_SUBJECTS[name]),
+            _env.get_template(f'{name}.txt'),
+            _env.get_template(f'{name}.html')
+        )
+        _compiled[name] = templates
+    return templates
+
+def render_email(name: str, **context) -> dict:
+    """Render {'subject', 'text', 'html'} for one recipient"""
+    subject, text, html = get_email_templates(name)
+    return {
+        'subject': subject.render(context),
+        'text': text.render(context),
+        'html': html.render(context)
+    }
+
+def render_bulk(name: str, contexts) -> list:
+    """Render the same message for many recipients, resolving the templates once"""
+    subject, text, html = get_email_templates(name)
+    return [
+        {'subject': subject.render(context), 'text': text.render(context), 'html': html.render(context)}
+        for context in contexts
+    ]
@@ -0,0 +1,69 @@
+# lib/export.py
+
+import csv
+import io
+import json
+from datetime import datetime
+from bson.objectid import ObjectId
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# Rows are buffered into chunks of roughly this size before being sent
+CHUNK_SIZE = 64 * 1024
+
+def iter_batches(iterable, size: int = 500):
+    """Yield lists of up to `size` items, so lookups can be batched per chunk of a cursor"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+def _csv_chunks(rows, fieldnames):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({key: _serialize(value) for key, value in row.items()})
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_chunks(rows, fieldnames):
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps({key: _serialize(row.get(key)) for key in fieldnames}) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts)
+
+def export_response(rows, fieldnames, fmt: str, filename: str) -> Response:
+    """Stream an iterable of row dicts as CSV or NDJSON without materializing it"""
+    if fmt == 'csv':
+        chunks, mimetype = _csv_chunks(rows, fieldnames), 'text/csv'
+    else:
+        chunks, mimetype = _ndjson_chunks(rows, fieldnames), 'application/x-ndjson'
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'}
+    )
@@ -0,0 +1,150 @@
+# lib/hashing.py
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+from flask import jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing runs on a dedicated process pool so a burst of logins and
+# signups cannot pin the request workers. When more than
+# PASSWORD_HASH_MAX_PENDING jobs are queued, or a job waits longer than
+# PASSWORD_HASH_TIMEOUT seconds, callers get HashingOverloaded (served as a
+# 503 with Retry-After). PASSWORD_HASH_WORKERS=0 hashes inline instead.
+#
+# PASSWORD_HASH_ALGORITHM is 'bcrypt' (cost: BCRYPT_ROUNDS) or 'pbkdf2'
+# (cost: PBKDF2_ITERATIONS). Existing hashes in any supported format keep
+# verifying; password_needs_rehash() tells login to upgrade them.
+HASH_ALGORITHMS = ('bcrypt', 'pbkdf2')
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+HASH_ALGORITHM = os.getenv('PASSWORD_HASH_ALGORITHM', 'bcrypt').lower()
+if HASH_ALGORITHM not in HASH_ALGORITHMS:
+    raise ValueError(f"PASSWORD_HASH_ALGORITHM must be one of: {', '.join(HASH_ALGORITHMS)}")
+BCRYPT_ROUNDS = _env_int('BCRYPT_ROUNDS', 12)
+PBKDF2_ITERATIONS = _env_int('PBKDF2_ITERATIONS', 600000)
+
+POOL_WORKERS = _env_int('PASSWORD_HASH_WORKERS', min(os.cpu_count() or 1, 4))
+MAX_PENDING = _env_int('PASSWORD_HASH_MAX_PENDING', 32)
+TIMEOUT_SECONDS = _env_int('PASSWORD_HASH_TIMEOUT', 10)
+RETRY_AFTER_SECONDS = _env_int('PASSWORD_HASH_RETRY_AFTER', 2)
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing pool is saturated; the request should be retried later"""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__('Password hashing is busy, please retry shortly')
+        self.retry_after = retry_after
+
+def overloaded_response(error: HashingOverloaded):
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def _hash(password: str, algorithm: str, cost: int) -> str:
+    if algorithm == 'bcrypt':
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=cost)).decode('ascii')
+    return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+
+def _verify(password: str, hashed_password: str) -> bool:
+    if not hashed_password:
+        return False
+    if hashed_password.startswith('$2'):
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('ascii'))
+        except ValueError:
+            return False
+    return check_password_hash(hashed_password, password)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a process that already runs driver threads is unsafe
+                _pool = ProcessPoolExecutor(
+                    max_workers=POOL_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+def _reset_after_fork():
+    # A forked worker must not share its parent's pool
+    global _pool, _pool_lock, _pending, _pending_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+    _pending = 0
+    _pending_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _job_done(future=None):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+def _run(func, *args):
+    """Run func on the hashing pool, shedding load when the queue is full"""
+    global _pending
+    if POOL_WORKERS <= 0:
+        return func(*args)
+    with _pending_lock:
+        if _pending >= MAX_PENDING:
+            raise HashingOverloaded()
+        _pending += 1
+    try:
+        future = _get_pool().submit(func, *args)
+    except Exception:
+        _job_done()
+        raise
+    # A job that times out keeps running (or stays queued) in the pool, so its
+    # slot is only freed when it really finishes
+    future.add_done_callback(_job_done)
+    try:
+        return future.result(timeout=TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        raise HashingOverloaded()
+
+def hash_password(password: str) -> str:
+    cost = BCRYPT_ROUNDS if HASH_ALGORITHM == 'bcrypt' else PBKDF2_ITERATIONS
+    return _run(_hash, password, HASH_ALGORITHM, cost)
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return _run(_verify, password, hashed_password or '')
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash does not use the configured algorithm and cost"""
+    if not hashed_password:
+        return False
+    if hashed_password.startswith('$2'):
+        try:
+            return HASH_ALGORITHM != 'bcrypt' or int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return True
+    if HASH_ALGORITHM != 'pbkdf2':
+        return True
+    return hashed_password.split('$', 1)[0] != f'pbkdf2:sha256:{PBKDF2_ITERATIONS}'
+
+def get_hashing_stats() -> dict:
+    return {
+        'algorithm': HASH_ALGORITHM,
+        'cost': BCRYPT_ROUNDS if HASH_ALGORITHM == 'bcrypt' else PBKDF2_ITERATIONS,
+        'workers': POOL_WORKERS,
+        'max_pending': MAX_PENDING,
+        'pending': _pending
+    }
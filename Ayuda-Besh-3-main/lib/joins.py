@@ -0,0 +1,49 @@
+# lib/joins.py
+
+from typing import NamedTuple
+from bson.objectid import ObjectId
+
+# Batch resolution of references for a page of documents. Instead of a
+# find_one per document and reference, join_refs collects the ids every
+# Ref points at, fetches each referenced collection once with $in and only
+# the projected fields, and stores the match (or None) on each document.
+
+class Ref(NamedTuple):
+    """Reference from `field` to `collection`._id, attached to each document as `as_field`"""
+    field: str
+    collection: str
+    projection: tuple
+    as_field: str
+
+def _object_id(value):
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+def fetch_by_ids(db, collection: str, ids, projection) -> dict:
+    """Fetch documents with one $in query, keyed by _id"""
+    ids = [value for value in ids if value is not None]
+    if not ids:
+        return {}
+    fields = {field: 1 for field in projection} if projection is not None else None
+    return {doc['_id']: doc for doc in db[collection].find({'_id': {'$in': ids}}, fields)}
+
+def join_refs(db, documents: list, refs) -> list:
+    """Attach the referenced document of every Ref to each document; returns documents.
+
+    Refs to the same collection share one query whose projection is the union
+    of theirs (e.g. customer_id and provider_id both resolve from users).
+    """
+    wanted = {}
+    for ref in refs:
+        ids, projection = wanted.setdefault(ref.collection, (set(), set()))
+        projection.update(ref.projection)
+        ids.update(_object_id(doc.get(ref.field)) for doc in documents)
+    fetched = {
+        collection: fetch_by_ids(db, collection, ids, projection)
+        for collection, (ids, projection) in wanted.items()
+    }
+    for doc in documents:
+        for ref in refs:
+            doc[ref.as_field] = fetched[ref.collection].get(_object_id(doc.get(ref.field)))
+    return documents
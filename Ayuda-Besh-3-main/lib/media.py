@@ -0,0 +1,157 @@
+# lib/media.py
+
+import hashlib
+import io
+import re
+from urllib.parse import parse_qs, urlsplit
+from datetime import datetime, timedelta
+import gridfs
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are skipped when Pillow is not installed
+    Image = None
+
+# Profile pictures live in the `profile_pictures` GridFS bucket, one file per
+# (user, content hash, size). users.profile_picture only stores the URL of the
+# original, versioned by the content hash so it can be cached indefinitely.
+BUCKET_NAME = 'profile_pictures'
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+MAX_PICTURE_BYTES = 5 * 1024 * 1024
+
+# Longest edge, in pixels, of the pre-generated thumbnails
+THUMBNAIL_SIZES = {'small': 64, 'medium': 256}
+# Files this recent may belong to an upload of the same user that is still
+# in flight, so replacing a picture leaves them for a later cleanup
+UPLOAD_GRACE_SECONDS = 300
+# URLs carry this many hex digits of the content hash as `v`
+VERSION_LENGTH = 16
+VERSION_PATTERN = re.compile(r'[0-9a-f]{%d}' % VERSION_LENGTH)
+
+def _bucket(db) -> gridfs.GridFSBucket:
+    return gridfs.GridFSBucket(db, bucket_name=BUCKET_NAME)
+
+def profile_picture_url(user_id, digest: str, size: str = None) -> str:
+    """Public URL of a stored profile picture"""
+    url = f'/api/users/{user_id}/profile-picture?v={digest[:VERSION_LENGTH]}'
+    return f'{url}&size={size}' if size else url
+
+def profile_picture_version(db, user_id):
+    """Content hash prefix (`v`) of the picture users.profile_picture points at, or None"""
+    user = db.users.find_one({'_id': user_id}, {'profile_picture': 1}) or {}
+    version = parse_qs(urlsplit(user.get('profile_picture') or '').query).get('v')
+    return version[0] if version and VERSION_PATTERN.fullmatch(version[0]) else None
+
+def _thumbnail(data: bytes, edge: int):
+    """Return (bytes, content_type) of a JPEG/PNG thumbnail, or None if it can't be made"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((edge, edge))
+            has_alpha = image.mode in ('RGBA', 'LA', 'P')
+            output = io.BytesIO()
+            if has_alpha:
+                image.save(output, format='PNG', optimize=True)
+                return output.getvalue(), 'image/png'
+            image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+            return output.getvalue(), 'image/jpeg'
+    except Exception as e:
+        print(f"Error creating thumbnail: {e}")
+        return None
+
+def store_profile_picture(db, user_id, data: bytes, content_type: str) -> str:
+    """Store a picture and its thumbnails and point users.profile_picture at it; returns the URL
+
+    The user's previous pictures are deleted only while the user document still
+    points at this one: with two concurrent uploads the later pointer wins and
+    its cleanup removes the other, instead of each deleting the other's files.
+    """
+    bucket = _bucket(db)
+    digest = hashlib.sha256(data).hexdigest()
+    variants = {'original': (data, content_type or 'image/jpeg')}
+    for name, edge in THUMBNAIL_SIZES.items():
+        thumbnail = _thumbnail(data, edge)
+        if thumbnail:
+            variants[name] = thumbnail
+
+    existing = {
+        f['metadata']['size']
+        for f in db[f'{BUCKET_NAME}.files'].find(
+            {'metadata.user_id': user_id, 'metadata.sha256': digest}, {'metadata.size': 1}
+        )
+    }
+    for name, (content, mime_type) in variants.items():
+        if name in existing:
+            continue
+        bucket.upload_from_stream(
+            f'{user_id}/{digest}/{name}',
+            content,
+            metadata={
+                'user_id': user_id,
+                'sha256': digest,
+                'size': name,
+                'contentType': mime_type,
+                'etag': hashlib.sha256(content).hexdigest()[:32]
+            }
+        )
+
+    url = profile_picture_url(user_id, digest)
+    db.users.update_one({'_id': user_id}, {'$set': {'profile_picture': url}})
+    if db.users.find_one({'_id': user_id, 'profile_picture': url}, {'_id': 1}):
+        delete_profile_pictures(
+            db, user_id, keep=digest,
+            uploaded_before=datetime.utcnow() - timedelta(seconds=UPLOAD_GRACE_SECONDS)
+        )
+    return url
+
+def open_profile_picture(db, user_id, size: str = 'original', version: str = None):
+    """Open the user's picture with the given content hash prefix (the URL's `v`, by
+    default the one users.profile_picture points at) in the given size, falling
+    back to the original; None when no stored file has that hash"""
+    if version is None:
+        version = profile_picture_version(db, user_id)
+    if version is None or not VERSION_PATTERN.fullmatch(version):
+        return None
+    bucket = _bucket(db)
+    files = db[f'{BUCKET_NAME}.files']
+    for name in dict.fromkeys((size, 'original')):
+        stored = files.find_one(
+            {'metadata.user_id': user_id, 'metadata.sha256': {'$regex': f'^{version}'}, 'metadata.size': name},
+            {'_id': 1},
+            sort=[('uploadDate', -1)]
+        )
+        if stored:
+            return bucket.open_download_stream(stored['_id'])
+    return None
+
+def delete_profile_pictures(db, user_id, keep: str = None, uploaded_before: datetime = None):
+    """Delete stored pictures of a user, except those with the `keep` content hash
+    (and, with `uploaded_before`, those uploaded since)"""
+    bucket = _bucket(db)
+    query = {'metadata.user_id': user_id}
+    if keep:
+        query['metadata.sha256'] = {'$ne': keep}
+    if uploaded_before:
+        query['uploadDate'] = {'$lt': uploaded_before}
+    for stored in db[f'{BUCKET_NAME}.files'].find(query, {'_id': 1}):
+        try:
+            bucket.delete(stored['_id'])
+        except gridfs.errors.NoFile:
+            pass
+
+def migrate_data_url_pictures(db) -> int:
+    """Move base64 data URLs in users.profile_picture into GridFS; returns the number moved"""
+    import base64
+    moved = 0
+    for user in db.users.find({'profile_picture': {'$regex': '^data:'}}, {'profile_picture': 1}):
+        try:
+            header, encoded = user['profile_picture'].split(',', 1)
+            content_type = header[len('data:'):].split(';', 1)[0] or 'image/jpeg'
+            store_profile_picture(db, user['_id'], base64.b64decode(encoded), content_type)
+        except Exception as e:
+            print(f"Error migrating profile picture for {user['_id']}: {e}")
+            continue
+        db.users.update_one({'_id': user['_id']}, {'$set': {'profile_picture_updated_at': datetime.utcnow()}})
+        moved += 1
+    return moved
@@ -0,0 +1,398 @@
+# lib/mongodb.py
+
+from pymongo import MongoClient, ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
+from pymongo.monitoring import ConnectionPoolListener
+from flask import Flask
+import os
+import threading
+import time
+from lib.retention import PASSWORD_RESET_TTL_SECONDS, NOTIFICATION_READ_TTL_DAYS
+
+db = None
+
+# Connection settings captured by init_db so a forked worker can rebuild its client
+_client = None
+_client_pid = None
+_client_uri = None
+_client_options = {}
+
+# MongoClient keyword -> Config attribute
+CLIENT_OPTIONS = {
+    'maxPoolSize': 'MONGODB_MAX_POOL_SIZE',
+    'minPoolSize': 'MONGODB_MIN_POOL_SIZE',
+    'waitQueueTimeoutMS': 'MONGODB_WAIT_QUEUE_TIMEOUT_MS',
+    'serverSelectionTimeoutMS': 'MONGODB_SERVER_SELECTION_TIMEOUT_MS',
+    'connectTimeoutMS': 'MONGODB_CONNECT_TIMEOUT_MS',
+    'socketTimeoutMS': 'MONGODB_SOCKET_TIMEOUT_MS',
+    'compressors': 'MONGODB_COMPRESSORS',
+    'readPreference': 'MONGODB_READ_PREFERENCE',
+}
+
+class PoolStatsListener(ConnectionPoolListener):
+    """Collects connection pool counters from CMAP events, per server address"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+        self._checkout_started = {}
+
+    def _server(self, address):
+        key = f"{address[0]}:{address[1]}"
+        if key not in self._servers:
+            self._servers[key] = {
+                'open': 0,
+                'in_use': 0,
+                'waiting': 0,
+                'max_waiting': 0,
+                'checkouts': 0,
+                'checkout_failures': 0,
+                'total_wait_ms': 0.0,
+                'max_wait_ms': 0.0,
+                'pool_cleared': 0
+            }
+        return self._servers[key]
+
+    def _finish_wait(self, stats):
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        stats['waiting'] = max(stats['waiting'] - 1, 0)
+        if started is not None:
+            wait_ms = (time.monotonic() - started) * 1000
+            stats['total_wait_ms'] += wait_ms
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)['pool_cleared'] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)['open'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats['open'] = max(stats['open'] - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats['waiting'] += 1
+            stats['max_waiting'] = max(stats['max_waiting'], stats['waiting'])
+            self._checkout_started[threading.get_ident()] = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            self._finish_wait(stats)
+            stats['checkout_failures'] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            self._finish_wait(stats)
+            stats['checkouts'] += 1
+            stats['in_use'] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._server(event.address)
+            stats['in_use'] = max(stats['in_use'] - 1, 0)
+
+    def snapshot(self):
+        with self._lock:
+            servers = {}
+            for address, stats in self._servers.items():
+                entry = dict(stats)
+                entry['avg_wait_ms'] = round(stats['total_wait_ms'] / stats['checkouts'], 3) if stats['checkouts'] else 0
+                entry['total_wait_ms'] = round(stats['total_wait_ms'], 3)
+                entry['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+                servers[address] = entry
+            return servers
+
+pool_stats = PoolStatsListener()
+
+# Declarative index registry: collection -> list of (keys, options).
+# Every index is named explicitly so init_db can reconcile it by name.
+INDEXES = {
+    'users': [
+        # Login looks up {'username', 'role'}; username is unique on its own
+        ([('username', ASCENDING)], {'name': 'username_unique', 'unique': True}),
+        ([('email', ASCENDING)], {
+            'name': 'email_unique', 'unique': True,
+            'partialFilterExpression': {'email': {'$gt': ''}}
+        }),
+        ([('phone', ASCENDING)], {
+            'name': 'phone_unique', 'unique': True,
+            'partialFilterExpression': {'phone': {'$gt': ''}}
+        }),
+        ([('role', ASCENDING), ('createdAt', DESCENDING)], {'name': 'role_createdAt'}),
+        ([('createdAt', DESCENDING), ('_id', DESCENDING)], {'name': 'createdAt'}),
+        # Admin user search: anchored prefix scans over lib.user_directory search keys
+        ([('search_keys', ASCENDING)], {'name': 'search_keys'}),
+        ([('role', ASCENDING), ('is_verified', ASCENDING)], {'name': 'role_is_verified'}),
+        # Provider search by coordinates uses $geoNear, which requires a 2dsphere index
+        ([('geo_location', GEOSPHERE)], {'name': 'geo_location_2dsphere'}),
+    ],
+    'bookings': [
+        # Double-booking check in book_service / accept_booking
+        ([('provider_id', ASCENDING), ('booking_time', ASCENDING), ('status', ASCENDING)], {
+            'name': 'provider_booking_time_status'
+        }),
+        # my-bookings pages by (created_at, _id) keyset cursors
+        ([('customer_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'customer_created_at'}),
+        ([('provider_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'provider_created_at'}),
+        ([('status', ASCENDING), ('completed_at', DESCENDING)], {'name': 'status_completed_at'}),
+        # Latest completed bookings per provider in the earnings report
+        ([('provider_id', ASCENDING), ('status', ASCENDING), ('completed_at', DESCENDING)], {
+            'name': 'provider_status_completed_at'
+        }),
+        ([('created_at', DESCENDING)], {'name': 'created_at'}),
+    ],
+    # lib.booking_slots: one active booking per provider and slot cell
+    'booking_slots': [
+        ([('provider_id', ASCENDING), ('slot_start', ASCENDING)], {
+            'name': 'provider_slot_active_unique', 'unique': True,
+            'partialFilterExpression': {'active': True}
+        }),
+        ([('booking_id', ASCENDING)], {'name': 'booking_id'}),
+        ([('released_at', ASCENDING)], {'name': 'released_at_ttl', 'expireAfterSeconds': 86400}),
+    ],
+    'booking_daily_stats': [
+        # $merge in rebuild_booking_stats requires a unique index on its "on" fields
+        ([('day', ASCENDING), ('provider_id', ASCENDING), ('service_type', ASCENDING)], {
+            'name': 'day_provider_service_unique', 'unique': True
+        }),
+        ([('provider_id', ASCENDING), ('day', ASCENDING)], {'name': 'provider_day'}),
+    ],
+    'notifications': [
+        ([('user_id', ASCENDING), ('created_at', DESCENDING)], {'name': 'user_created_at'}),
+        ([('user_id', ASCENDING), ('read', ASCENDING)], {'name': 'user_read'}),
+    ] + ([
+        # Read notifications expire NOTIFICATION_READ_TTL_DAYS after read_at
+        ([('read_at', ASCENDING)], {
+            'name': 'read_at_ttl',
+            'expireAfterSeconds': NOTIFICATION_READ_TTL_DAYS * 86400,
+            'partialFilterExpression': {'read': True}
+        }),
+    ] if NOTIFICATION_READ_TTL_DAYS > 0 else []),
+    # Monthly buckets written by lib.retention.archive_notifications ($merge "on" fields)
+    'notifications_archive': [
+        ([('user_id', ASCENDING), ('month', DESCENDING)], {'name': 'user_month_unique', 'unique': True}),
+    ],
+    'reviews': [
+        # Provider review pages (offset or keyset); supersedes provider_created_at
+        ([('provider_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'provider_created_at_id'}),
+        ([('customer_id', ASCENDING), ('created_at', DESCENDING)], {'name': 'customer_created_at'}),
+        # Also the $merge key of lib.ratings.migrate_booking_ratings
+        ([('booking_id', ASCENDING)], {'name': 'booking_unique', 'unique': True}),
+    ],
+    'availability': [
+        ([('provider_id', ASCENDING)], {'name': 'provider_unique', 'unique': True}),
+    ],
+    'password_resets': [
+        ([('user_id', ASCENDING), ('used', ASCENDING)], {'name': 'user_used'}),
+        # Reset codes are removed PASSWORD_RESET_TTL_SECONDS after they expire
+        ([('expires_at', ASCENDING)], {'name': 'expires_at_ttl', 'expireAfterSeconds': PASSWORD_RESET_TTL_SECONDS}),
+    ],
+    'disputes': [
+        ([('provider_id', ASCENDING), ('created_at', DESCENDING)], {'name': 'provider_created_at'}),
+        ([('status', ASCENDING)], {'name': 'status'}),
+        # Admin list pages by (created_at, _id) keyset cursors
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'created_at'}),
+    ],
+    'reports': [
+        ([('provider_id', ASCENDING), ('created_at', DESCENDING)], {'name': 'provider_created_at'}),
+        ([('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'created_at'}),
+    ],
+    'service_requests': [
+        ([('customerId', ASCENDING), ('createdAt', DESCENDING)], {'name': 'customer_createdAt'}),
+        ([('status', ASCENDING), ('createdAt', DESCENDING)], {'name': 'status_createdAt'}),
+    ],
+    'outbox': [
+        ([('status', ASCENDING), ('next_attempt_at', ASCENDING)], {'name': 'status_next_attempt_at'}),
+        ([('status', ASCENDING), ('lease_expires_at', ASCENDING)], {'name': 'status_lease_expires_at'}),
+    ],
+    # GridFS bucket files of lib.media
+    'profile_pictures.files': [
+        ([('metadata.user_id', ASCENDING), ('metadata.size', ASCENDING), ('uploadDate', DESCENDING)], {'name': 'user_size_uploadDate'}),
+        ([('metadata.user_id', ASCENDING), ('metadata.sha256', ASCENDING)], {'name': 'user_sha256'}),
+    ],
+}
+
+def _key_tuple(keys):
+    # Server-reported directions may come back as floats (1.0) for older indexes
+    return tuple(
+        (field, direction if isinstance(direction, str) else int(direction))
+        for field, direction in keys
+    )
+
+def _set_index_ttl(database, collection_name, name, seconds):
+    try:
+        database.command('collMod', collection_name, index={'name': name, 'expireAfterSeconds': seconds})
+        print(f"[OK] TTL of index {collection_name}.{name} set to {seconds}s")
+    except OperationFailure as e:
+        print(f"[WARNING] Could not update TTL of index {collection_name}.{name}: {e}")
+
+def ensure_indexes(database):
+    """Create every registry index that is missing.
+
+    Existing indexes are never dropped here; an index whose name or key pattern
+    clashes with a registry entry is reported and skipped so a bad legacy index
+    (or duplicate data blocking a unique index) can't stop startup. The only
+    change made in place is a TTL (expireAfterSeconds) update via collMod, so
+    retention settings take effect on restart. Returns the number of indexes created.
+    """
+    created = 0
+    for collection_name, specs in INDEXES.items():
+        collection = database[collection_name]
+        existing = collection.index_information()
+        existing_keys = {_key_tuple(info['key']): name for name, info in existing.items()}
+        for keys, options in specs:
+            name = options['name']
+            if name in existing:
+                if _key_tuple(existing[name]['key']) != _key_tuple(keys):
+                    print(f"[WARNING] Index {collection_name}.{name} exists with a different key pattern")
+                elif 'expireAfterSeconds' in options and existing[name].get('expireAfterSeconds') != options['expireAfterSeconds']:
+                    _set_index_ttl(database, collection_name, name, options['expireAfterSeconds'])
+                continue
+            if _key_tuple(keys) in existing_keys:
+                print(f"[WARNING] Index {collection_name}.{name} already exists as "
+                      f"{existing_keys[_key_tuple(keys)]}; rename or drop it to apply registry options")
+                continue
+            try:
+                collection.create_index(keys, **options)
+                created += 1
+            except OperationFailure as e:
+                print(f"[WARNING] Could not create index {collection_name}.{name}: {e}")
+    return created
+
+def index_report(database):
+    """Compare live indexes against the registry.
+
+    Returns {collection: {'missing': [...], 'extra': [...], 'unused': [...]}} where
+    unused lists indexes with zero accesses in $indexStats since the last restart.
+    """
+    report = {}
+    for collection_name, specs in INDEXES.items():
+        collection = database[collection_name]
+        existing = collection.index_information()
+        registry_names = {options['name'] for _, options in specs}
+        try:
+            unused = [
+                stats['name'] for stats in collection.aggregate([{'$indexStats': {}}])
+                if stats['name'] != '_id_' and stats['accesses']['ops'] == 0
+            ]
+        except OperationFailure:
+            unused = []
+        report[collection_name] = {
+            'missing': sorted(registry_names - set(existing)),
+            'extra': sorted(set(existing) - registry_names - {'_id_'}),
+            'unused': sorted(unused)
+        }
+    return report
+
+def _client_options_from_config(config):
+    """Build MongoClient keyword arguments from Config, skipping unset values"""
+    options = {}
+    for option, config_key in CLIENT_OPTIONS.items():
+        value = config.get(config_key)
+        if value is not None and value != '':
+            options[option] = value
+    return options
+
+def get_client():
+    """Return the MongoClient for the current process.
+
+    MongoClient is not fork-safe, so workers of a pre-fork server must not share
+    the parent's client: when the PID changes a fresh client with the same
+    settings is created in the worker.
+    """
+    global _client, _client_pid, db
+    if _client_uri is None:
+        return None
+    if _client is None or _client_pid != os.getpid():
+        _client = MongoClient(_client_uri, event_listeners=[pool_stats], **_client_options)
+        _client_pid = os.getpid()
+        db = _client['ayudabesh']
+    return _client
+
+def _reset_after_fork():
+    # The child must not reuse (or close) the parent's sockets; drop the reference
+    global _client, _client_pid, db
+    _client = None
+    _client_pid = None
+    db = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_pool_diagnostics():
+    """Pool settings and live counters for the current worker process"""
+    return {
+        'pid': os.getpid(),
+        'client_options': dict(_client_options),
+        'servers': pool_stats.snapshot()
+    }
+
+def init_db(app: Flask):
+    """Initialize MongoDB connection"""
+    global db, _client_uri, _client_options
+    
+    try:
+        uri = os.getenv('MONGODB_URI')
+        
+        if not uri:
+            raise ValueError("MONGODB_URI is not set in environment variables")
+        
+        # Ensure the URI ends with /ayudabesh
+        if not uri.endswith('/ayudabesh'):
+            if uri.endswith('/'):
+                uri = uri + 'ayudabesh'
+            else:
+                uri = uri + '/ayudabesh'
+        
+        _client_uri = uri
+        _client_options = _client_options_from_config(app.config)
+        client = get_client()
+        client.admin.command('ping')
+        print("[OK] Successfully connected to MongoDB database: ayudabesh")
+        
+        created = ensure_indexes(db)
+        if created:
+            print(f"[OK] Created {created} missing index(es)")
+        
+    except Exception as e:
+        print(f"[ERROR] Error connecting to MongoDB: {e}")
+        raise
+
+def get_database():
+    """Returns the MongoDB database instance"""
+    if _client_uri is not None and _client_pid != os.getpid():
+        get_client()
+    if db is None:
+        mongodb_uri = os.getenv('MONGODB_URI')
+        if not mongodb_uri:
+            raise RuntimeError(
+                "Database not initialized. MONGODB_URI is not set in environment variables. "
+                "Please check your .env file and ensure MONGODB_URI is configured."
+            )
+        else:
+            raise RuntimeError(
+                "Database not initialized. Database connection failed during app startup. "
+                "Please check your MongoDB connection and ensure MongoDB is running."
+            )
+    return db
\ No newline at end of file
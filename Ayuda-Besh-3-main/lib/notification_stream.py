@@ -0,0 +1,223 @@
+# lib/notification_stream.py
+
+import os
+import sys
+import json
+import queue
+import threading
+import time
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Live notification events for /api/notifications/stream.
+#
+# Each worker keeps an in-process broker of per-user subscriber queues. When
+# MongoDB supports change streams (replica sets / Atlas), one watcher thread
+# per worker feeds the broker with every notification insert and read, so
+# events created by any worker reach every stream. On a standalone server the
+# watcher can't start and the broker falls back to "local" mode, where the
+# code that writes notifications publishes to it directly (single-node
+# deployments and tests).
+#
+# Local mode only reaches streams held by the worker that did the write, so
+# without a replica set run a single worker process.
+#
+# Every open stream holds one request thread (or greenlet) for as long as the
+# client stays connected. Serve the app with a threaded or gevent worker,
+# e.g. `gunicorn -k gthread --threads 32` with
+# NOTIFICATION_STREAM_MAX_CONNECTIONS well below the thread count, or
+# `gunicorn -k gevent`. On a server that handles one request at a time a
+# stream would block the worker, so the endpoint answers 503 there and the
+# dashboards keep polling.
+#
+# Events: ('notification', serialized notification) with the notification id
+# as the SSE event id, and ('unread', {'delta': n}) for unread count changes.
+# Streams send the unread count to clients as an absolute {'count'} read
+# after the change, so a change that races the initial count is never
+# counted twice.
+
+MAX_CONNECTIONS = int(os.getenv('NOTIFICATION_STREAM_MAX_CONNECTIONS', '100'))
+HEARTBEAT_SECONDS = float(os.getenv('NOTIFICATION_STREAM_HEARTBEAT', '15'))
+QUEUE_SIZE = 256
+
+def serialize_notification(notification: dict) -> dict:
+    data = dict(notification)
+    data['_id'] = str(data['_id'])
+    data['user_id'] = str(data['user_id'])
+    if data.get('booking_id'):
+        data['booking_id'] = str(data['booking_id'])
+    for field in ('created_at', 'read_at'):
+        if hasattr(data.get(field), 'isoformat'):
+            data[field] = data[field].isoformat()
+    return data
+
+def format_sse(event: str, data: dict, event_id: str = None) -> str:
+    lines = [f'event: {event}']
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+class Subscription:
+    def __init__(self, broker, user_id: str):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A client this far behind reconnects and resumes from Last-Event-ID
+            self.overflowed = True
+
+    def get(self, timeout: float):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self) -> list:
+        """Events already queued, without waiting"""
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class NotificationBroker:
+    """Per-worker fan-out of notification events to open streams"""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.mode = 'local'
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def subscribe(self, user_id: str):
+        """Register a stream; returns None when this worker is at its connection cap"""
+        with self._lock:
+            if self._count >= self.max_connections:
+                return None
+            subscription = Subscription(self, user_id)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event: str, data: dict, event_id: str = None):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscribers:
+            subscription.put((event, data, event_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'mode': self.mode, 'connections': self._count, 'max_connections': self.max_connections}
+
+    # Change stream source
+
+    def ensure_source(self, db):
+        """Start the change stream watcher once per worker (no-op in local mode)"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(db,), name='notification-watcher', daemon=True)
+        self._watcher.start()
+
+    def _watch(self, db):
+        pipeline = [{'$match': {'$or': [
+            {'operationType': 'insert'},
+            {'operationType': 'update', 'updateDescription.updatedFields.read': {'$exists': True}}
+        ]}}]
+        resume_token = None
+        failures = 0
+        while True:
+            try:
+                with db.notifications.watch(pipeline, full_document='updateLookup', resume_after=resume_token) as stream:
+                    self.mode = 'change_stream'
+                    failures = 0
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self._publish_change(change)
+            except OperationFailure as e:
+                # Standalone servers don't support change streams
+                print(f"[WARNING] Notification change stream unavailable, using in-process events: {e}")
+                self.mode = 'local'
+                return
+            except PyMongoError as e:
+                failures += 1
+                print(f"[WARNING] Notification change stream interrupted: {e}")
+                if failures >= 5:
+                    self.mode = 'local'
+                    with self._lock:
+                        self._watcher = None
+                    return
+                time.sleep(min(2 ** failures, 30))
+
+    def _publish_change(self, change: dict):
+        notification = change.get('fullDocument')
+        if not notification:
+            return
+        if change['operationType'] == 'insert':
+            self.publish(notification['user_id'], 'notification', serialize_notification(notification), str(notification['_id']))
+            if not notification.get('read'):
+                self.publish(notification['user_id'], 'unread', {'delta': 1})
+        elif notification.get('read'):
+            self.publish(notification['user_id'], 'unread', {'delta': -1})
+
+broker = NotificationBroker()
+
+def publish_created(notifications: list):
+    """Announce newly inserted notifications when no change stream is feeding the broker"""
+    if broker.mode != 'local':
+        return
+    for notification in notifications:
+        broker.publish(notification['user_id'], 'notification', serialize_notification(notification), str(notification['_id']))
+        if not notification.get('read'):
+            broker.publish(notification['user_id'], 'unread', {'delta': 1})
+
+def publish_read(user_id, count: int):
+    """Announce notifications marked read when no change stream is feeding the broker"""
+    if broker.mode == 'local' and count:
+        broker.publish(user_id, 'unread', {'delta': -count})
+
+def _reset_after_fork():
+    # The watcher thread and open streams belong to the parent process
+    global broker
+    broker = NotificationBroker()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def concurrent_server(environ: dict) -> bool:
+    """Whether the WSGI server can keep a stream open without blocking other requests"""
+    if environ.get('wsgi.multithread'):
+        return True
+    # gevent/eventlet workers report a single thread but run each request on a greenlet
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        return True
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    return eventlet_patcher is not None and eventlet_patcher.is_monkey_patched('thread')
+
+def parse_event_id(value: str):
+    try:
+        return ObjectId(value) if value else None
+    except Exception:
+        return None
@@ -0,0 +1,133 @@
+# lib/notifications.py
+
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from lib.mongodb import get_database
+from lib.notification_stream import publish_created, publish_read
+
+# All notification writes go through this module so that the per-user
+# unread counters in `notification_counters` ({_id: user_id, unread: n,
+# seeded: bool}) stay in step with the notifications collection. Writes only
+# $inc the counters; a counter is seeded from a count the first time it is
+# read (or by `python manage.py rebuild-notification-counters`).
+
+# Times a first read retries seeding when writes keep moving the counter
+SEED_ATTEMPTS = 3
+
+def _object_id(value):
+    if value is None:
+        return None
+    return ObjectId(value) if isinstance(value, str) else value
+
+def _notification_doc(user_id, title, message, type, booking_id, link, created_at) -> dict:
+    return {
+        'user_id': _object_id(user_id),
+        'title': title,
+        'message': message,
+        'type': type,  # 'info', 'success', 'warning', 'error'
+        'read': False,
+        'created_at': created_at,
+        'booking_id': _object_id(booking_id),
+        'link': link
+    }
+
+def create_notifications(user_ids, title, message, type='info', booking_id=None, link=None, db=None) -> list:
+    """Send the same notification to many users with one insert; returns the new ids"""
+    try:
+        db = db if db is not None else get_database()
+        now = datetime.utcnow()
+        notifications = [
+            _notification_doc(user_id, title, message, type, booking_id, link, now)
+            for user_id in user_ids
+        ]
+        if not notifications:
+            return []
+        result = db.notifications.insert_many(notifications)
+        increments = {}
+        for notification in notifications:
+            increments[notification['user_id']] = increments.get(notification['user_id'], 0) + 1
+        db.notification_counters.bulk_write([
+            UpdateOne({'_id': user_id}, {'$inc': {'unread': count}}, upsert=True)
+            for user_id, count in increments.items()
+        ], ordered=False)
+        publish_created(notifications)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+    except Exception as e:
+        print(f"Error creating notification: {e}")
+        return []
+
+def create_notification(user_id, title, message, type='info', booking_id=None, link=None, db=None):
+    """Create one notification; returns its id, or None on failure"""
+    ids = create_notifications([user_id], title, message, type, booking_id, link, db=db)
+    return ids[0] if ids else None
+
+def notify_admins(title, message, type='info', booking_id=None, link=None, db=None) -> list:
+    """Fan a notification out to every admin account"""
+    db = db if db is not None else get_database()
+    admin_ids = [admin['_id'] for admin in db.users.find({'role': 'admin'}, {'_id': 1})]
+    return create_notifications(admin_ids, title, message, type, booking_id, link, db=db)
+
+def mark_read(db, user_id, notification_id) -> bool:
+    """Mark one notification read; returns False if it doesn't belong to the user"""
+    user_id = _object_id(user_id)
+    result = db.notifications.update_one(
+        {'_id': _object_id(notification_id), 'user_id': user_id, 'read': False},
+        {'$set': {'read': True, 'read_at': datetime.utcnow()}}
+    )
+    if result.modified_count:
+        db.notification_counters.update_one({'_id': user_id}, {'$inc': {'unread': -1}}, upsert=True)
+        publish_read(user_id, 1)
+        return True
+    return db.notifications.find_one({'_id': _object_id(notification_id), 'user_id': user_id}, {'_id': 1}) is not None
+
+def mark_all_read(db, user_id) -> int:
+    """Mark every unread notification of a user read; returns how many changed"""
+    user_id = _object_id(user_id)
+    result = db.notifications.update_many(
+        {'user_id': user_id, 'read': False},
+        {'$set': {'read': True, 'read_at': datetime.utcnow()}}
+    )
+    if result.modified_count:
+        db.notification_counters.update_one(
+            {'_id': user_id}, {'$inc': {'unread': -result.modified_count}}, upsert=True
+        )
+        publish_read(user_id, result.modified_count)
+    return result.modified_count
+
+def get_unread_count(db, user_id) -> int:
+    """Unread notifications of a user, from the counter document"""
+    user_id = _object_id(user_id)
+    unread = 0
+    for _ in range(SEED_ATTEMPTS):
+        counter = db.notification_counters.find_one({'_id': user_id})
+        if counter is not None and counter.get('seeded'):
+            return max(counter.get('unread', 0), 0)
+        # First read for this user: seed the counter from the collection. The
+        # seed only lands if the counter is exactly as read above, so an $inc
+        # from a concurrent write is never overwritten; we recount instead.
+        unread = db.notifications.count_documents({'user_id': user_id, 'read': False})
+        guard = {'_id': user_id, 'seeded': {'$ne': True}}
+        guard['unread'] = counter['unread'] if counter is not None and 'unread' in counter else {'$exists': False}
+        try:
+            result = db.notification_counters.update_one(
+                guard, {'$set': {'unread': unread, 'seeded': True}}, upsert=counter is None
+            )
+        except DuplicateKeyError:
+            continue  # Created concurrently
+        if result.matched_count or result.upserted_id is not None:
+            return unread
+    return unread
+
+def rebuild_unread_counters(db) -> int:
+    """Recompute every unread counter from the notifications collection; returns the row count"""
+    # Users without unread notifications get no row and are seeded (to 0) on first read
+    db.notification_counters.delete_many({})
+    db.notifications.aggregate([
+        {'$match': {'read': False}},
+        {'$group': {'_id': '$user_id', 'unread': {'$sum': 1}}},
+        {'$set': {'seeded': True}},
+        {'$merge': {'into': 'notification_counters', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+    ])
+    return db.notification_counters.count_documents({})
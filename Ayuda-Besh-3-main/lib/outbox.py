@@ -0,0 +1,212 @@
+# lib/outbox.py
+
+import os
+import threading
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from lib.email_service import SMTPConnection, build_email_message, send_sms, email_configured
+from lib.email_templates import render_email, render_bulk
+
+# Durable queue of outbound email/SMS. Requests only insert into the
+# `outbox` collection; OutboxDispatcher claims due messages in batches,
+# sends emails over one persistent SMTP session and retries failures with
+# exponential backoff until OUTBOX_MAX_ATTEMPTS, after which a message is
+# marked 'failed'. Claims are atomic, so any number of dispatchers (one per
+# worker, or `python manage.py run-outbox`) can share the queue.
+#
+# Message states: pending -> sending -> sent | pending (retry) | failed
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '20'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '5'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '6'))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '30'))
+# A claimed message whose dispatcher died is retried after this lease
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+
+# Set by enqueue so a dispatcher in the same process sends without waiting for the next poll
+_wakeup = threading.Event()
+
+def _outbox_doc(channel: str, to: str, payload: dict, kind: str) -> dict:
+    now = datetime.utcnow()
+    return {
+        'channel': channel,
+        'to': to,
+        'kind': kind,
+        'payload': payload,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now
+    }
+
+def _enqueue(db, channel: str, to: str, payload: dict, kind: str):
+    result = db.outbox.insert_one(_outbox_doc(channel, to, payload, kind))
+    _wakeup.set()
+    return result.inserted_id
+
+def enqueue_email(db, to_email: str, subject: str, text: str, html: str = None, kind: str = 'email'):
+    """Queue an email for the dispatcher; returns the outbox id"""
+    return _enqueue(db, 'email', to_email, {'subject': subject, 'text': text, 'html': html}, kind)
+
+def enqueue_sms(db, phone_number: str, body: str, kind: str = 'sms'):
+    """Queue an SMS for the dispatcher; returns the outbox id"""
+    return _enqueue(db, 'sms', phone_number, {'body': body}, kind)
+
+def enqueue_templated_email(db, to_email: str, template: str, **context):
+    """Render a templates/email message and queue it; returns the outbox id"""
+    content = render_email(template, **context)
+    return enqueue_email(db, to_email, content['subject'], content['text'], content['html'], kind=template)
+
+def enqueue_templated_emails(db, template: str, recipients: list) -> int:
+    """Queue one message per (to_email, context) pair with a single insert; returns the count"""
+    if not recipients:
+        return 0
+    rendered = render_bulk(template, [context for _, context in recipients])
+    db.outbox.insert_many([
+        _outbox_doc('email', to_email, content, template)
+        for (to_email, _), content in zip(recipients, rendered)
+    ])
+    _wakeup.set()
+    return len(recipients)
+
+def email_user(db, user_id, template: str, **context):
+    """Queue a templated email to a user, if SMTP is configured and they have an address"""
+    if not email_configured():
+        return None
+    try:
+        user = db.users.find_one({'_id': user_id}, {'email': 1, 'fullName': 1})
+        if not user or not user.get('email'):
+            return None
+        context.setdefault('user_name', user.get('fullName'))
+        return enqueue_templated_email(db, user['email'], template, **context)
+    except Exception as e:
+        print(f"Error queueing {template} email: {e}")
+        return None
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+
+class OutboxDispatcher:
+    """Claims due outbox messages and sends them, reusing one SMTP session"""
+
+    def __init__(self, db, batch_size: int = OUTBOX_BATCH_SIZE, poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.db = db
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.smtp = SMTPConnection()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def claim_batch(self) -> list:
+        """Atomically lease up to batch_size due messages"""
+        now = datetime.utcnow()
+        # A lease that expired on its last allowed attempt is not retried again
+        self.db.outbox.update_many(
+            {'status': 'sending', 'lease_expires_at': {'$lte': now}, 'attempts': {'$gte': OUTBOX_MAX_ATTEMPTS}},
+            {'$set': {'status': 'failed', 'last_error': 'Lease expired', 'updated_at': now},
+             '$unset': {'lease_expires_at': ''}}
+        )
+        batch = []
+        while len(batch) < self.batch_size:
+            message = self.db.outbox.find_one_and_update(
+                {'$or': [
+                    {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                    {'status': 'sending', 'lease_expires_at': {'$lte': now}, 'attempts': {'$lt': OUTBOX_MAX_ATTEMPTS}}
+                ]},
+                {
+                    '$set': {'status': 'sending', 'lease_expires_at': now + timedelta(seconds=OUTBOX_LEASE_SECONDS)},
+                    '$inc': {'attempts': 1}
+                },
+                sort=[('next_attempt_at', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+
+    @staticmethod
+    def _lease_filter(message: dict) -> dict:
+        # Only the dispatcher still holding this claim may settle it; after the
+        # lease expires another dispatcher owns the message
+        return {'_id': message['_id'], 'status': 'sending', 'lease_expires_at': message['lease_expires_at']}
+
+    def _send(self, message: dict):
+        payload = message['payload']
+        if message['channel'] == 'email':
+            self.smtp.send(build_email_message(
+                message['to'], payload['subject'], payload['text'], payload.get('html'), self.smtp.settings
+            ))
+        elif message['channel'] == 'sms':
+            send_sms(message['to'], payload['body'])
+        else:
+            raise ValueError(f"Unknown outbox channel: {message['channel']}")
+
+    def _mark_failed_attempt(self, message: dict, error: Exception):
+        attempts = message['attempts']
+        update = {'last_error': str(error)[:500], 'updated_at': datetime.utcnow()}
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            update['status'] = 'failed'
+            print(f"[ERROR] Giving up on {message['channel']} to {message['to']} after {attempts} attempt(s): {error}")
+        else:
+            update['status'] = 'pending'
+            update['next_attempt_at'] = datetime.utcnow() + retry_delay(attempts)
+        self.db.outbox.update_one(self._lease_filter(message), {'$set': update, '$unset': {'lease_expires_at': ''}})
+
+    def dispatch_once(self) -> int:
+        """Send one batch of due messages; returns how many were sent"""
+        sent = 0
+        for message in self.claim_batch():
+            try:
+                self._send(message)
+            except Exception as e:
+                self._mark_failed_attempt(message, e)
+                continue
+            self.db.outbox.update_one(
+                self._lease_filter(message),
+                {'$set': {'status': 'sent', 'sent_at': datetime.utcnow()}, '$unset': {'lease_expires_at': ''}}
+            )
+            sent += 1
+        return sent
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                # Keep draining while full batches come back
+                while self.dispatch_once() >= self.batch_size and not self._stop.is_set():
+                    pass
+                self.smtp.close_if_idle()
+            except Exception as e:
+                print(f"[ERROR] Outbox dispatcher error: {e}")
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
+        self.smtp.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        _wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+_dispatcher = None
+
+def start_outbox_dispatcher(db):
+    """Start this process's background dispatcher once"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = OutboxDispatcher(db).start()
+    return _dispatcher
+
+def _reset_after_fork():
+    # Threads do not survive fork; the child starts its own dispatcher
+    global _dispatcher, _wakeup
+    _dispatcher = None
+    _wakeup = threading.Event()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,71 @@
+# lib/pagination.py
+
+import base64
+import json
+from datetime import datetime
+from bson.objectid import ObjectId
+
+def encode_cursor(sort_value: datetime, doc_id: ObjectId) -> str:
+    """Opaque continuation token for the last document of a page"""
+    payload = json.dumps({'v': sort_value.isoformat() if sort_value else None, 'id': str(doc_id)})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token: str):
+    """Return (sort_value, ObjectId) from a token; raises ValueError if it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        sort_value = datetime.fromisoformat(payload['v']) if payload.get('v') else None
+        return sort_value, ObjectId(payload['id'])
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def keyset_filter(token: str, field: str = 'created_at') -> dict:
+    """Query clause selecting documents after the cursor for a (field desc, _id desc) sort
+
+    A descending sort puts documents whose field is null or missing last, so
+    they follow every dated cursor; `{field: None}` matches both.
+    """
+    sort_value, doc_id = decode_cursor(token)
+    if sort_value is None:
+        return {field: None, '_id': {'$lt': doc_id}}
+    return {'$or': [
+        {field: {'$lt': sort_value}},
+        {field: sort_value, '_id': {'$lt': doc_id}},
+        {field: None}
+    ]}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def page_request(args, default_limit: int = DEFAULT_PAGE_SIZE, max_limit: int = MAX_PAGE_SIZE):
+    """(paginate, limit, cursor) from request args.
+
+    Paging is opt-in: a list endpoint returns one page only when `limit` or
+    `cursor` is given, so existing clients keep receiving the full list.
+    """
+    paginate = 'limit' in args or 'cursor' in args
+    limit = min(max(args.get('limit', default_limit, type=int) or default_limit, 1), max_limit)
+    return paginate, limit, args.get('cursor') or None
+
+def fetch_page(collection, query: dict, limit: int, cursor: str = None, field: str = 'created_at', projection: dict = None):
+    """One (field desc, _id desc) page of a collection; returns (documents, next_cursor).
+
+    Page N costs the same as page 1: the cursor becomes a range condition on
+    the sort keys instead of a skip. Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        after = keyset_filter(cursor, field)
+        query = {'$and': [query, after]} if '$or' in query else {**query, **after}
+    documents = list(collection.find(query, projection).sort([(field, -1), ('_id', -1)]).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1].get(field), documents[-1]['_id'])
+    return documents, next_cursor
+
+def page_envelope(key: str, items: list, next_cursor: str, **extra) -> dict:
+    """Response body shared by paginated list endpoints: {key: [...], 'next_cursor': ...}"""
+    body = {key: items, 'next_cursor': next_cursor}
+    body.update(extra)
+    return body
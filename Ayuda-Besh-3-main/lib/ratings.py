@@ -0,0 +1,166 @@
+# lib/ratings.py
+
+from pymongo import ReturnDocument
+
+# Provider rating aggregates.
+#
+# A provider document carries `rating_stats` ({'sum', 'count', 'stars':
+# {'1'..'5': n}}) over the ratings of its completed bookings, and `rating`,
+# the rounded average derived from it. A rating only $incs these fields, so
+# its cost doesn't grow with the provider's history. The booking's `rating`
+# field stays the raw data: `python manage.py reconcile-ratings` recomputes
+# the aggregates from it and reports (and fixes) any drift.
+#
+# Providers get empty aggregates when they register; providers created
+# before that are seeded by `reconcile-ratings`, or from their bookings by
+# the first rating or summary read that finds none. A rating seeds before it
+# writes the booking (see apply_rating).
+#
+# Review listings read only the `reviews` collection; ratings stored on
+# bookings before every rating also wrote a review are copied there by
+# `python manage.py migrate-booking-ratings`.
+
+STARS = ('1', '2', '3', '4', '5')
+
+def empty_rating_stats() -> dict:
+    return {'sum': 0, 'count': 0, 'stars': {star: 0 for star in STARS}}
+
+def average_rating(stats: dict) -> float:
+    return round(stats['sum'] / stats['count'], 2) if stats and stats.get('count') else 0
+
+def _rated_bookings_match(provider_ids=None) -> dict:
+    match = {'status': 'completed', 'rating': {'$exists': True, '$ne': None}}
+    if provider_ids is not None:
+        match['provider_id'] = {'$in': list(provider_ids)}
+    return match
+
+def compute_rating_stats(db, provider_ids=None) -> dict:
+    """{provider_id: rating_stats} recomputed from the rated bookings"""
+    stats = {}
+    for row in db.bookings.aggregate([
+        {'$match': _rated_bookings_match(provider_ids)},
+        {'$group': {'_id': {'provider_id': '$provider_id', 'rating': '$rating'}, 'count': {'$sum': 1}}}
+    ]):
+        provider_stats = stats.setdefault(row['_id']['provider_id'], empty_rating_stats())
+        rating = int(row['_id']['rating'])
+        provider_stats['sum'] += rating * row['count']
+        provider_stats['count'] += row['count']
+        if str(rating) in provider_stats['stars']:
+            provider_stats['stars'][str(rating)] += row['count']
+    return stats
+
+def ensure_rating_stats(db, provider_id):
+    """Seed a provider's aggregates from its bookings if it has none yet"""
+    if db.users.find_one({'_id': provider_id, 'rating_stats': {'$exists': True}}, {'_id': 1}):
+        return
+    stats = compute_rating_stats(db, [provider_id]).get(provider_id, empty_rating_stats())
+    db.users.update_one(
+        {'_id': provider_id, 'rating_stats': {'$exists': False}},
+        {'$set': {'rating_stats': stats, 'rating': average_rating(stats)}}
+    )
+
+def apply_rating(db, provider_id, rating: int, previous_rating=None) -> float:
+    """Fold a new rating (or a change from previous_rating) into the aggregates; returns the average.
+
+    Call ensure_rating_stats() before the rating is written onto the booking
+    and this after. A seed then only counts ratings written before the
+    provider had aggregates, which are never $inc'd, so two first ratings
+    racing to seed cannot count either one twice. Returns 0 if the provider
+    no longer exists.
+    """
+    provider = db.users.find_one({'_id': provider_id}, {'rating_stats': 1})
+    if provider is None:
+        return 0
+    if provider.get('rating_stats') is None:
+        # Not seeded beforehand: the seed reads the bookings, this rating included
+        ensure_rating_stats(db, provider_id)
+        return average_rating((db.users.find_one({'_id': provider_id}, {'rating_stats': 1}) or {}).get('rating_stats'))
+    increments = {f'rating_stats.stars.{rating}': 1}
+    if previous_rating is None:
+        increments['rating_stats.sum'] = rating
+        increments['rating_stats.count'] = 1
+    else:
+        previous_rating = int(previous_rating)
+        if previous_rating == rating:
+            return average_rating(provider['rating_stats'])
+        increments['rating_stats.sum'] = rating - previous_rating
+        increments[f'rating_stats.stars.{previous_rating}'] = -1
+    provider = db.users.find_one_and_update(
+        {'_id': provider_id},
+        {'$inc': increments},
+        projection={'rating_stats': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if provider is None:
+        return 0
+    stats = provider['rating_stats']
+    average = average_rating(stats)
+    # Only if no other rating landed meanwhile; a later one writes its own average
+    db.users.update_one(
+        {'_id': provider_id, 'rating_stats.sum': stats['sum'], 'rating_stats.count': stats['count']},
+        {'$set': {'rating': average}}
+    )
+    return average
+
+def reconcile_ratings(db, fix: bool = True) -> list:
+    """Compare every provider's aggregates with its bookings; returns the ids that drifted"""
+    expected = compute_rating_stats(db)
+    drifted = []
+    for provider in db.users.find({'role': 'provider'}, {'rating_stats': 1, 'rating': 1}):
+        stats = expected.get(provider['_id'], empty_rating_stats())
+        if provider.get('rating_stats') == stats and provider.get('rating') == average_rating(stats):
+            continue
+        drifted.append(str(provider['_id']))
+        if fix:
+            db.users.update_one(
+                {'_id': provider['_id']},
+                {'$set': {'rating_stats': stats, 'rating': average_rating(stats)}}
+            )
+    return drifted
+
+def rating_distribution(stats: dict) -> dict:
+    """{1..5: count} histogram for API responses"""
+    stars = (stats or {}).get('stars', {})
+    return {int(star): max(stars.get(star, 0), 0) for star in STARS}
+
+def get_rating_summary(db, provider: dict) -> dict:
+    """total_reviews, average_rating and rating_distribution of a provider document"""
+    stats = provider.get('rating_stats')
+    if stats is None:
+        ensure_rating_stats(db, provider['_id'])
+        # None if the provider was deleted meanwhile
+        stats = (db.users.find_one({'_id': provider['_id']}, {'rating_stats': 1}) or {}).get('rating_stats')
+    return {
+        'total_reviews': (stats or {}).get('count', 0),
+        'average_rating': average_rating(stats),
+        'rating_distribution': rating_distribution(stats)
+    }
+
+def migrate_booking_ratings(db) -> int:
+    """Copy ratings stored only on bookings into `reviews`; returns how many reviews were added"""
+    before = db.reviews.estimated_document_count()
+    db.bookings.aggregate([
+        {'$match': _rated_bookings_match()},
+        {'$lookup': {
+            'from': 'users',
+            'localField': 'customer_id',
+            'foreignField': '_id',
+            'as': 'customer',
+            'pipeline': [{'$project': {'fullName': 1}}]
+        }},
+        {'$project': {
+            '_id': 0,
+            'booking_id': '$_id',
+            'provider_id': 1,
+            'customer_id': 1,
+            'customer_name': {'$ifNull': [{'$first': '$customer.fullName'}, 'Anonymous']},
+            'rating': 1,
+            'review': {'$ifNull': ['$review', None]},
+            'created_at': {'$ifNull': ['$rated_at', '$completed_at']},
+            'updated_at': {'$ifNull': ['$rated_at', '$completed_at']},
+            'migrated_from_booking': {'$literal': True}
+        }},
+        # reviews.booking_unique makes this idempotent; existing reviews win
+        {'$merge': {'into': 'reviews', 'on': 'booking_id', 'whenMatched': 'keepExisting', 'whenNotMatched': 'insert'}}
+    ])
+    return db.reviews.estimated_document_count() - before
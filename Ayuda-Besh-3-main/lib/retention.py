@@ -0,0 +1,123 @@
+# lib/retention.py
+
+import os
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+
+# Retention policies (days/seconds, from the environment):
+#   PASSWORD_RESET_TTL_SECONDS     reset codes are deleted this long after they expire
+#   NOTIFICATION_READ_TTL_DAYS     read notifications are deleted this long after being read (0 keeps them)
+#                                   Notifications marked read before read_at was recorded
+#                                   only expire after `manage.py backfill-notification-read-at`
+#   NOTIFICATION_ARCHIVE_AFTER_DAYS `manage.py archive-notifications` moves older notifications
+#                                   into notifications_archive, one document per user and month
+# The TTL policies are applied through TTL indexes in lib.mongodb.INDEXES.
+
+PASSWORD_RESET_TTL_SECONDS = int(os.getenv('PASSWORD_RESET_TTL_SECONDS', '86400'))
+NOTIFICATION_READ_TTL_DAYS = int(os.getenv('NOTIFICATION_READ_TTL_DAYS', '30'))
+NOTIFICATION_ARCHIVE_AFTER_DAYS = int(os.getenv('NOTIFICATION_ARCHIVE_AFTER_DAYS', '180'))
+
+# Compact field names used inside archive buckets
+ARCHIVE_ITEM = {
+    'id': '$_id',
+    't': '$title',
+    'm': '$message',
+    'ty': '$type',
+    'r': '$read',
+    'c': '$created_at',
+    'b': '$booking_id'
+}
+
+def archive_notifications(db, older_than_days: int = None, batch_size: int = 5000) -> int:
+    """Move notifications older than the cutoff into monthly buckets; returns how many moved.
+
+    Safe to re-run after an interruption: items already in a bucket are not added twice.
+    """
+    days = NOTIFICATION_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    moved = 0
+    while True:
+        batch = list(db.notifications.find(
+            {'created_at': {'$lt': cutoff}}, {'user_id': 1, 'read': 1}
+        ).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return moved
+        ids = [notification['_id'] for notification in batch]
+
+        db.notifications.aggregate([
+            {'$match': {'_id': {'$in': ids}}},
+            {'$sort': {'created_at': 1}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'month': {'$dateTrunc': {'date': '$created_at', 'unit': 'month'}}},
+                'items': {'$push': ARCHIVE_ITEM}
+            }},
+            {'$project': {
+                '_id': 0,
+                'user_id': '$_id.user_id',
+                'month': '$_id.month',
+                'items': 1,
+                'count': {'$size': '$items'}
+            }},
+            {'$merge': {
+                'into': 'notifications_archive',
+                'on': ['user_id', 'month'],
+                'whenMatched': [
+                    {'$set': {'items': {'$concatArrays': ['$items', {'$filter': {
+                        'input': '$$new.items',
+                        'cond': {'$not': [{'$in': ['$$this.id', '$items.id']}]}
+                    }}]}}},
+                    {'$set': {'count': {'$size': '$items'}}}
+                ],
+                'whenNotMatched': 'insert'
+            }}
+        ])
+        db.notifications.delete_many({'_id': {'$in': ids}})
+
+        # Archived unread notifications no longer count towards the badge
+        unread = {}
+        for notification in batch:
+            if not notification.get('read'):
+                unread[notification['user_id']] = unread.get(notification['user_id'], 0) + 1
+        if unread:
+            db.notification_counters.bulk_write([
+                UpdateOne({'_id': user_id}, {'$inc': {'unread': -count}})
+                for user_id, count in unread.items()
+            ], ordered=False)
+        moved += len(batch)
+
+def backfill_read_at(db, batch_size: int = 5000) -> int:
+    """Give read notifications without read_at their created_at, so the TTL index covers them
+
+    Returns how many were updated. Those already older than the retention
+    period are then removed by the next TTL pass. Safe to re-run.
+    """
+    now = datetime.utcnow()
+    updated = 0
+    while True:
+        batch = list(db.notifications.find(
+            {'read': True, 'read_at': {'$exists': False}}, {'created_at': 1}
+        ).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return updated
+        db.notifications.bulk_write([
+            UpdateOne(
+                {'_id': notification['_id'], 'read_at': {'$exists': False}},
+                # TTL indexes skip documents whose field is not a date
+                {'$set': {'read_at': notification['created_at'] if isinstance(notification.get('created_at'), datetime) else now}}
+            )
+            for notification in batch
+        ], ordered=False)
+        updated += len(batch)
+
+def storage_report(db, collection_names=None) -> dict:
+    """Document count, data size, storage size and index size (bytes) per collection"""
+    report = {}
+    for name in collection_names or sorted(db.list_collection_names()):
+        stats = db.command('collStats', name)
+        report[name] = {
+            'count': stats.get('count', 0),
+            'size': stats.get('size', 0),
+            'storage_size': stats.get('storageSize', 0),
+            'index_size': stats.get('totalIndexSize', 0)
+        }
+    return report
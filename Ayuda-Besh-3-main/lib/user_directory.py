@@ -0,0 +1,126 @@
+# lib/user_directory.py
+
+import re
+import unicodedata
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# Search and role totals for the admin user directory (GET /api/admin/users).
+#
+# Every user document carries `search_keys`: the normalized (lowercase,
+# accent-free) words of its username, fullName and email, plus the whole
+# username and email. A multikey index on it turns a search into anchored
+# prefix scans, one per search word, instead of a collection scan. This
+# matches word prefixes, where the old in-memory search matched any
+# substring ('elacr' no longer finds 'jdelacruz').
+#
+# Users stored before search_keys existed are still matched the old way
+# (case-insensitive substring of each field) until `python manage.py
+# rebuild-user-directory` has run; the index finds them through their
+# missing key, so that branch costs nothing once every user has keys.
+#
+# Role totals live in one `counters` document ({_id: 'user_roles', counts:
+# {role: n}, seeded: bool}) that user inserts and deletes $inc; it is seeded
+# from a count the first time it is read (or by `python manage.py
+# rebuild-user-directory`).
+
+SEARCH_FIELDS = ('username', 'fullName', 'email')
+ROLE_COUNTER_ID = 'user_roles'
+ROLES = ('customer', 'provider', 'admin')
+
+_word = re.compile(r'[^\W_]+')
+
+def normalize(text) -> str:
+    """Lowercase and strip accents so 'José' matches 'jose'"""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+def search_keys(user: dict) -> list:
+    keys = set()
+    for field in SEARCH_FIELDS:
+        value = normalize(user.get(field))
+        keys.update(_word.findall(value))
+        if field != 'fullName' and value:
+            keys.add(value)
+    return sorted(keys)
+
+def with_search_keys(user: dict) -> dict:
+    """Add `search_keys` to a user document before it is inserted"""
+    user['search_keys'] = search_keys(user)
+    return user
+
+def insert_user(db, user: dict):
+    """Insert a new user with its search keys and count it in the role totals"""
+    result = db.users.insert_one(with_search_keys(user))
+    record_user_created(db, user.get('role'))
+    return result
+
+def refresh_search_keys(db, user_id):
+    """Recompute `search_keys` after username, fullName or email changed"""
+    user = db.users.find_one({'_id': user_id}, {field: 1 for field in SEARCH_FIELDS})
+    if user:
+        db.users.update_one({'_id': user_id}, {'$set': {'search_keys': search_keys(user)}})
+
+def search_filter(text: str) -> dict:
+    """Query clause matching users with a search key starting with every word of text"""
+    words = _word.findall(normalize(text))
+    if not words:
+        return {}
+    clauses = [{'search_keys': {'$regex': '^' + re.escape(word)}} for word in words]
+    indexed = clauses[0] if len(clauses) == 1 else {'$and': clauses}
+    legacy = {
+        'search_keys': {'$exists': False},
+        '$or': [{field: {'$regex': re.escape(text.strip()), '$options': 'i'}} for field in SEARCH_FIELDS]
+    }
+    return {'$or': [indexed, legacy]}
+
+# Role totals
+
+def record_user_created(db, role: str):
+    db.counters.update_one({'_id': ROLE_COUNTER_ID}, {'$inc': {f'counts.{role}': 1}}, upsert=True)
+
+def record_user_deleted(db, role: str):
+    db.counters.update_one({'_id': ROLE_COUNTER_ID}, {'$inc': {f'counts.{role}': -1}}, upsert=True)
+
+def _count_roles(db) -> dict:
+    counts = {role: 0 for role in ROLES}
+    for row in db.users.aggregate([{'$group': {'_id': '$role', 'count': {'$sum': 1}}}]):
+        if row['_id']:
+            counts[row['_id']] = row['count']
+    return counts
+
+def get_role_counts(db) -> dict:
+    """{role: number of users}, from the counter document"""
+    counter = db.counters.find_one({'_id': ROLE_COUNTER_ID})
+    if counter is None or not counter.get('seeded'):
+        counts = _count_roles(db)
+        try:
+            db.counters.update_one(
+                {'_id': ROLE_COUNTER_ID, 'seeded': {'$ne': True}},
+                {'$set': {'counts': counts, 'seeded': True}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # Seeded concurrently
+        return counts
+    counts = {role: 0 for role in ROLES}
+    counts.update({role: max(count, 0) for role, count in counter.get('counts', {}).items()})
+    return counts
+
+def rebuild_user_directory(db, batch_size: int = 1000) -> int:
+    """Backfill `search_keys` on every user and recount role totals; returns users updated"""
+    updated = 0
+    batch = []
+    for user in db.users.find({}, {field: 1 for field in SEARCH_FIELDS}):
+        batch.append(UpdateOne({'_id': user['_id']}, {'$set': {'search_keys': search_keys(user)}}))
+        if len(batch) >= batch_size:
+            updated += db.users.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += db.users.bulk_write(batch, ordered=False).modified_count
+    db.counters.update_one(
+        {'_id': ROLE_COUNTER_ID},
+        {'$set': {'counts': _count_roles(db), 'seeded': True}},
+        upsert=True
+    )
+    return updated
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the AyudaBesh database
+
+Usage:
+    python manage.py <command>
+
+Run `python manage.py --help` to list the available commands.
+
+Recommended once when deploying over existing data:
+    python manage.py backfill-geo
+        Providers saved with only latitude/longitude have no geo_location, so
+        nearby search measures their distance in Python, outside the 2dsphere
+        index, until this runs.
+    python manage.py rebuild-user-directory
+        Users stored before search keys existed are matched by a slower
+        substring fallback in admin user search until this runs.
+    python manage.py backfill-notification-read-at
+        Notifications marked read before read_at was recorded have no
+        read_at, so the read-notification TTL index never removes them.
+    python manage.py reconcile-ratings
+        Providers registered before rating aggregates existed are otherwise
+        seeded from their bookings by the first rating or review read.
+"""
+
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables
+env_path = os.path.join(os.path.dirname(__file__), '.env')
+load_dotenv(env_path)
+
+from flask import Flask
+from config import Config
+from lib.mongodb import init_db, get_database, index_report
+from lib.booking_stats import rebuild_booking_stats
+from lib.media import migrate_data_url_pictures
+from lib.outbox import OutboxDispatcher
+from lib.notifications import rebuild_unread_counters
+from lib.user_directory import rebuild_user_directory
+from lib.booking_slots import reconcile_booking_slots
+from lib.ratings import reconcile_ratings, migrate_booking_ratings
+from lib.retention import archive_notifications, backfill_read_at, storage_report, NOTIFICATION_ARCHIVE_AFTER_DAYS
+
+def backfill_geo(args):
+    """Store legacy latitude/longitude provider fields as GeoJSON points"""
+    db = get_database()
+    result = db.users.update_many(
+        {
+            'latitude': {'$type': 'number'},
+            'longitude': {'$type': 'number'},
+            'geo_location': {'$exists': False}
+        },
+        [{'$set': {'geo_location': {'type': 'Point', 'coordinates': ['$longitude', '$latitude']}}}]
+    )
+    print(f"[OK] Added geo_location to {result.modified_count} user(s)")
+
+def report_indexes(args):
+    """List missing, unregistered and unused indexes per collection"""
+    report = index_report(get_database())
+    for collection_name, entry in report.items():
+        print(f"{collection_name}:")
+        for label in ('missing', 'extra', 'unused'):
+            print(f"   {label}: {', '.join(entry[label]) or '-'}")
+
+def backfill_booking_stats(args):
+    """Rebuild the booking_daily_stats rollups from the full booking history"""
+    rows = rebuild_booking_stats(get_database())
+    print(f"[OK] Rebuilt booking_daily_stats ({rows} row(s))")
+
+def migrate_profile_pictures(args):
+    """Move base64 profile pictures out of user documents into GridFS"""
+    moved = migrate_data_url_pictures(get_database())
+    print(f"[OK] Moved {moved} profile picture(s) to GridFS")
+
+def run_outbox(args):
+    """Send queued email/SMS in the foreground (for deployments with OUTBOX_DISPATCHER=False)"""
+    dispatcher = OutboxDispatcher(get_database())
+    print("[OK] Outbox dispatcher running, press Ctrl+C to stop")
+    try:
+        dispatcher.run()
+    except KeyboardInterrupt:
+        dispatcher.smtp.close()
+
+def rebuild_notification_counters(args):
+    """Recompute the per-user unread notification counters"""
+    rows = rebuild_unread_counters(get_database())
+    print(f"[OK] Rebuilt notification_counters ({rows} row(s))")
+
+def run_notification_archive(args):
+    """Move old notifications into monthly notifications_archive buckets"""
+    moved = archive_notifications(get_database(), args.older_than_days, args.batch_size)
+    print(f"[OK] Archived {moved} notification(s) older than {args.older_than_days} day(s)")
+
+def backfill_notification_read_at(args):
+    """Set read_at on legacy read notifications so the TTL index expires them"""
+    db = get_database()
+    before = storage_report(db, ['notifications'])['notifications']
+    updated = backfill_read_at(db, args.batch_size)
+    print(f"[OK] Set read_at on {updated} read notification(s); "
+          f"{before['count']} notification(s), {before['size'] / 1048576:.2f} MB of data before the next TTL pass")
+    print("   Run `python manage.py storage-report notifications` after the TTL monitor has run (every 60 s) to compare")
+
+def report_storage(args):
+    """Print document count, data, storage and index size per collection"""
+    report = storage_report(get_database(), args.collections or None)
+    print(f"{'collection':<28}{'docs':>10}{'data MB':>10}{'storage MB':>12}{'index MB':>10}")
+    for collection_name, stats in report.items():
+        print(f"{collection_name:<28}{stats['count']:>10}{stats['size'] / 1048576:>10.2f}"
+              f"{stats['storage_size'] / 1048576:>12.2f}{stats['index_size'] / 1048576:>10.2f}")
+
+def rebuild_user_search(args):
+    """Backfill user search keys and recount the role totals"""
+    updated = rebuild_user_directory(get_database())
+    print(f"[OK] Updated search keys of {updated} user(s) and recounted role totals")
+
+def reconcile_slots(args):
+    """Reserve missing booking slots and release slots of inactive bookings"""
+    summary = reconcile_booking_slots(get_database())
+    print(f"[OK] Reserved slots for {summary['reserved']} booking(s), released {summary['released']} slot(s)")
+    for booking_id in summary['conflicts']:
+        print(f"[WARNING] Booking {booking_id} overlaps another active booking; resolve it manually")
+
+def reconcile_provider_ratings(args):
+    """Check provider rating aggregates against the rated bookings and fix any drift"""
+    drifted = reconcile_ratings(get_database(), fix=not args.dry_run)
+    for provider_id in drifted:
+        print(f"   {provider_id}")
+    action = 'differ from' if args.dry_run else 'were rebuilt from'
+    print(f"[OK] {len(drifted)} provider rating aggregate(s) {action} the bookings")
+
+def migrate_ratings(args):
+    """Copy ratings stored only on bookings into the reviews collection"""
+    added = migrate_booking_ratings(get_database())
+    print(f"[OK] Added {added} review(s) from booking ratings")
+
+def main():
+    parser = argparse.ArgumentParser(description='AyudaBesh maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('backfill-geo', help=backfill_geo.__doc__).set_defaults(func=backfill_geo)
+    subparsers.add_parser('index-report', help=report_indexes.__doc__).set_defaults(func=report_indexes)
+    subparsers.add_parser('backfill-booking-stats', help=backfill_booking_stats.__doc__).set_defaults(func=backfill_booking_stats)
+    subparsers.add_parser('migrate-profile-pictures', help=migrate_profile_pictures.__doc__).set_defaults(func=migrate_profile_pictures)
+    subparsers.add_parser('run-outbox', help=run_outbox.__doc__).set_defaults(func=run_outbox)
+    subparsers.add_parser('rebuild-notification-counters', help=rebuild_notification_counters.__doc__).set_defaults(func=rebuild_notification_counters)
+    archive_parser = subparsers.add_parser('archive-notifications', help=run_notification_archive.__doc__)
+    archive_parser.add_argument('--older-than-days', type=int, default=NOTIFICATION_ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument('--batch-size', type=int, default=5000)
+    archive_parser.set_defaults(func=run_notification_archive)
+    read_at_parser = subparsers.add_parser('backfill-notification-read-at', help=backfill_notification_read_at.__doc__)
+    read_at_parser.add_argument('--batch-size', type=int, default=5000)
+    read_at_parser.set_defaults(func=backfill_notification_read_at)
+    storage_parser = subparsers.add_parser('storage-report', help=report_storage.__doc__)
+    storage_parser.add_argument('collections', nargs='*', help='Collections to report (default: all)')
+    storage_parser.set_defaults(func=report_storage)
+    subparsers.add_parser('rebuild-user-directory', help=rebuild_user_search.__doc__).set_defaults(func=rebuild_user_search)
+    subparsers.add_parser('reconcile-booking-slots', help=reconcile_slots.__doc__).set_defaults(func=reconcile_slots)
+    ratings_parser = subparsers.add_parser('reconcile-ratings', help=reconcile_provider_ratings.__doc__)
+    ratings_parser.add_argument('--dry-run', action='store_true', help='Only report providers whose aggregates drifted')
+    ratings_parser.set_defaults(func=reconcile_provider_ratings)
+    subparsers.add_parser('migrate-booking-ratings', help=migrate_ratings.__doc__).set_defaults(func=migrate_ratings)
+
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    try:
+        init_db(app)
+    except Exception:
+        print("[ERROR] Please check your MONGODB_URI in .env file and ensure MongoDB is running.")
+        sys.exit(1)
+
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,70 @@
 # routes/admin.py
-from flask import Blueprint, request, jsonify
-from lib.mongodb import get_database
+from flask import Blueprint, request, jsonify, current_app
+from lib.mongodb import get_database, get_pool_diagnostics
+from lib.cache import TTLCache
+from lib.media import delete_profile_pictures
+from lib.catalog import bump_catalog_version
+from lib.outbox import email_user
+from lib.export import EXPORT_FORMATS, export_response, iter_batches
+from lib.pagination import page_request, fetch_page, page_envelope
+from lib.joins import Ref, join_refs, fetch_by_ids
+from lib.user_directory import insert_user, search_filter, get_role_counts, record_user_deleted
+from lib.ratings import empty_rating_stats
+from lib.booking_stats import (BOOKING_AMOUNT, BOOKING_STATUSES, booking_amount, booking_stats_group,
+                               booking_stats_seeded, summarize_booking_stats)
+from lib.notifications import create_notification
 from lib.decorators import admin_required, token_required
+from lib.auth import token_cache_stats
+from lib.hashing import HashingOverloaded, overloaded_response, get_hashing_stats
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 
 admin_bp = Blueprint('admin', __name__)
 
-def create_notification(user_id, title, message, type='info', booking_id=None):
-    """Helper to create notifications"""
-    try:
-        db = get_database()
-        notification = {
-            'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
-            'title': title,
-            'message': message,
-            'type': type,
-            'read': False,
-            'created_at': datetime.utcnow(),
-            'booking_id': ObjectId(booking_id) if booking_id else None
-        }
-        db.notifications.insert_one(notification)
-    except Exception as e:
-        print(f"Error creating notification: {e}")
+def _export_format():
+    """Requested export format, or None for the regular JSON report"""
+    fmt = request.args.get('format', 'json').lower()
+    if fmt == 'json':
+        return None
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Invalid format. Use json, {", ".join(EXPORT_FORMATS)}')
+    return fmt
+
+def _users_by_id(db, user_ids, projection):
+    """Fetch the given users with one $in query, keyed by _id"""
+    return fetch_by_ids(db, 'users', list(user_ids), projection)
+
+def _export_booking_rows(db, cursor, include_provider_company=False):
+    """Booking export rows, resolving customer/provider names one cursor chunk at a time"""
+    for batch in iter_batches(cursor):
+        users = _users_by_id(
+            db,
+            {b['customer_id'] for b in batch} | {b['provider_id'] for b in batch},
+            {'fullName': 1, 'username': 1, 'email': 1}
+        )
+        for booking in batch:
+            customer = users.get(booking['customer_id']) or {}
+            provider = users.get(booking['provider_id']) or {}
+            yield {
+                'booking_id': booking['_id'],
+                'created_at': booking.get('created_at'),
+                'booking_time': booking.get('booking_time'),
+                'completed_at': booking.get('completed_at'),
+                'status': booking.get('status', ''),
+                'service_type': booking.get('service_type', ''),
+                'customer_id': booking['customer_id'],
+                'customer_name': customer.get('fullName', 'Unknown'),
+                'customer_email': customer.get('email', ''),
+                'provider_id': booking['provider_id'],
+                'provider_name': provider.get('username', provider.get('fullName', 'Unknown')),
+                'provider_owner_name': provider.get('fullName', 'Unknown'),
+                'price': booking.get('price', 0),
+                'final_price': booking.get('final_price'),
+                'amount': booking_amount(booking)
+            }
+
+# Several admins refreshing the dashboard share one computation per TTL window
+_dashboard_stats_cache = TTLCache(maxsize=1, ttl=30)
 
 @admin_bp.route('/providers/pending', methods=['GET'])
 @token_required
@@ -165,6 +207,7 @@ def verify_provider(provider_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'Provider not found'}), 404
+        bump_catalog_version(db)
         return jsonify({'message': 'Provider verified'}), 200
     except Exception as e:
         print(f"Error verifying provider: {e}")
@@ -197,6 +240,7 @@ def reject_provider(provider_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'Provider not found'}), 404
+        bump_catalog_version(db)
         return jsonify({'message': 'Provider rejected'}), 200
     except Exception as e:
         print(f"Error rejecting provider: {e}")
@@ -230,6 +274,9 @@ def delete_provider(provider_id):
         
         if result.deleted_count == 0:
             return jsonify({'error': 'Provider not found'}), 404
+        record_user_deleted(db, 'provider')
+        delete_profile_pictures(db, ObjectId(provider_id))
+        bump_catalog_version(db)
         
         return jsonify({'message': 'Provider deleted successfully'}), 200
     except Exception as e:
@@ -262,22 +309,41 @@ def manage_disputes():
         user_id = request.current_user.get('user_id')
         
         if role == 'admin':
-            disputes = list(db.disputes.find().sort('created_at', -1))
+            query = {}
         elif role == 'provider':
-            disputes = list(db.disputes.find({'provider_id': ObjectId(user_id)}).sort('created_at', -1))
+            query = {'provider_id': ObjectId(user_id)}
         else:
             return jsonify({'error': 'Access denied'}), 403
+        if request.args.get('status'):
+            query['status'] = request.args['status']
         
+        paginate, limit, cursor = page_request(request.args)
+        next_cursor = None
+        if paginate:
+            try:
+                disputes, next_cursor = fetch_page(db.disputes, query, limit, cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        else:
+            disputes = list(db.disputes.find(query).sort('created_at', -1))
+        
+        # Resolve customers and providers with one users query
+        join_refs(db, disputes, [
+            Ref('customer_id', 'users', ('fullName',), 'customer'),
+            Ref('provider_id', 'users', ('fullName',), 'provider')
+        ])
         for dispute in disputes:
+            customer = dispute.pop('customer')
+            provider = dispute.pop('provider')
             dispute['_id'] = str(dispute['_id'])
             dispute['booking_id'] = str(dispute['booking_id'])
             dispute['customer_id'] = str(dispute['customer_id'])
             dispute['provider_id'] = str(dispute['provider_id'])
             # Add user names
-            customer = db.users.find_one({'_id': ObjectId(dispute['customer_id'])})
-            provider = db.users.find_one({'_id': ObjectId(dispute['provider_id'])})
             dispute['customer_name'] = customer['fullName'] if customer else 'Unknown'
             dispute['provider_name'] = provider['fullName'] if provider else 'Unknown'
+        if paginate:
+            return jsonify(page_envelope('disputes', disputes, next_cursor)), 200
         return jsonify(disputes), 200
 
 @admin_bp.route('/reports', methods=['GET', 'POST'])
@@ -307,13 +373,32 @@ def manage_reports():
         user_id = request.current_user.get('user_id')
         
         if role == 'admin':
-            reports = list(db.reports.find().sort('created_at', -1))
+            query = {}
         elif role == 'provider':
-            reports = list(db.reports.find({'provider_id': ObjectId(user_id)}).sort('created_at', -1))
+            query = {'provider_id': ObjectId(user_id)}
         else:
             return jsonify({'error': 'Access denied'}), 403
+        if request.args.get('status'):
+            query['status'] = request.args['status']
+        
+        paginate, limit, cursor = page_request(request.args)
+        next_cursor = None
+        if paginate:
+            try:
+                reports, next_cursor = fetch_page(db.reports, query, limit, cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        else:
+            reports = list(db.reports.find(query).sort('created_at', -1))
         
+        # Resolve customers and providers with one users query
+        join_refs(db, reports, [
+            Ref('customer_id', 'users', ('fullName', 'email'), 'customer'),
+            Ref('provider_id', 'users', ('username', 'fullName'), 'provider')
+        ])
         for report in reports:
+            customer = report.pop('customer')
+            provider = report.pop('provider')
             report['_id'] = str(report['_id'])
             report['booking_id'] = str(report['booking_id'])
             report['customer_id'] = str(report['customer_id'])
@@ -327,8 +412,6 @@ def manage_reports():
             if 'checked' not in report:
                 report['checked'] = False
             # Add user names
-            customer = db.users.find_one({'_id': ObjectId(report['customer_id'])})
-            provider = db.users.find_one({'_id': ObjectId(report['provider_id'])})
             report['customer_name'] = customer['fullName'] if customer else 'Unknown'
             report['customer_email'] = customer.get('email', '') if customer else ''
             report['provider_name'] = provider.get('username', provider.get('fullName', 'Unknown')) if provider else 'Unknown'
@@ -337,6 +420,8 @@ def manage_reports():
             # Format dates
             if 'created_at' in report and report['created_at']:
                 report['created_at'] = report['created_at'].isoformat() if hasattr(report['created_at'], 'isoformat') else str(report['created_at'])
+        if paginate:
+            return jsonify(page_envelope('reports', reports, next_cursor)), 200
         return jsonify(reports), 200
 
 @admin_bp.route('/disputes/<dispute_id>', methods=['GET'])
@@ -553,9 +638,17 @@ def add_dispute_response(dispute_id):
 @token_required
 @admin_required
 def daily_bookings_report():
-    """Generate daily bookings report"""
+    """Generate daily bookings report
+
+    `format=csv` or `format=ndjson` streams the day's bookings instead; exports
+    also accept an inclusive `end_date` to cover a range of days.
+    """
     try:
         db = get_database()
+        try:
+            export_format = _export_format()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get date from query parameter or use today
         date_str = request.args.get('date')
@@ -571,6 +664,23 @@ def daily_bookings_report():
         start_date = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
         end_date = start_date + timedelta(days=1)
         
+        if export_format:
+            if request.args.get('end_date'):
+                try:
+                    end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d') + timedelta(days=1)
+                except:
+                    return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
+            cursor = db.bookings.find(
+                {'created_at': {'$gte': start_date, '$lt': end_date}}
+            ).sort('created_at', -1).batch_size(1000)
+            return export_response(
+                _export_booking_rows(db, cursor),
+                ['booking_id', 'created_at', 'booking_time', 'status', 'service_type',
+                 'customer_name', 'customer_email', 'provider_name', 'price', 'final_price', 'amount'],
+                export_format,
+                f'daily-bookings-{start_date.strftime("%Y-%m-%d")}'
+            )
+        
         bookings = list(db.bookings.find({
             'created_at': {
                 '$gte': start_date,
@@ -578,14 +688,29 @@ def daily_bookings_report():
             }
         }).sort('created_at', -1))
         
-        # Enhance with customer/provider names and calculate totals
-        total_revenue = 0
-        status_counts = {'pending': 0, 'accepted': 0, 'completed': 0, 'rejected': 0, 'cancelled': 0}
-        
+        # Totals come from the precomputed daily rollup rows; a day the rollups
+        # don't fully cover yet (before backfill-booking-stats has run) is
+        # counted from the bookings listed below so the two always agree
+        day_totals = summarize_booking_stats(db, {'day': start_date})
+        day_totals = day_totals[0] if day_totals else {}
+        if day_totals.get('total', 0) != len(bookings):
+            day_totals = {
+                'total': len(bookings),
+                'created_revenue': sum(booking_amount(b) for b in bookings if b.get('status') == 'completed')
+            }
+            for status in BOOKING_STATUSES:
+                day_totals[status] = sum(1 for b in bookings if b.get('status') == status)
+        status_counts = {status: day_totals.get(status, 0) for status in BOOKING_STATUSES}
+        
+        # Resolve customers and providers with one users query
+        join_refs(db, bookings, [
+            Ref('customer_id', 'users', ('fullName', 'email'), 'customer'),
+            Ref('provider_id', 'users', ('username', 'fullName'), 'provider')
+        ])
         for booking in bookings:
-            customer = db.users.find_one({'_id': booking['customer_id']})
-            provider = db.users.find_one({'_id': booking['provider_id']})
-            booking['customer_name'] = customer['fullName'] if customer else 'Unknown'
+            customer = booking.pop('customer')
+            provider = booking.pop('provider')
+            booking['customer_name'] = customer.get('fullName', 'Unknown') if customer else 'Unknown'
             booking['customer_email'] = customer.get('email', '') if customer else ''
             booking['provider_name'] = provider.get('username', provider.get('fullName', 'Unknown')) if provider else 'Unknown'
             booking['provider_company'] = provider.get('username', 'Unknown') if provider else 'Unknown'
@@ -598,21 +723,11 @@ def daily_bookings_report():
                 booking['created_at'] = booking['created_at'].isoformat() if hasattr(booking['created_at'], 'isoformat') else str(booking['created_at'])
             if 'booking_time' in booking and booking['booking_time']:
                 booking['booking_time'] = booking['booking_time'].isoformat() if hasattr(booking['booking_time'], 'isoformat') else str(booking['booking_time'])
-            
-            # Calculate revenue (use final_price if available, else price)
-            price = booking.get('final_price') or booking.get('price', 0)
-            if booking.get('status') == 'completed':
-                total_revenue += price
-            
-            # Count by status
-            status = booking.get('status', 'pending')
-            if status in status_counts:
-                status_counts[status] += 1
         
         return jsonify({
             'date': date_str or target_date.strftime('%Y-%m-%d'),
-            'total_bookings': len(bookings),
-            'total_revenue': total_revenue,
+            'total_bookings': day_totals.get('total', 0),
+            'total_revenue': day_totals.get('created_revenue', 0),
             'status_breakdown': status_counts,
             'bookings': bookings
         }), 200
@@ -626,31 +741,48 @@ def daily_bookings_report():
 @token_required
 @admin_required
 def provider_activity_report():
-    """Provider activity report"""
+    """Provider activity report
+
+    Optional query parameters: `sort` ('activity' (default) or 'earnings'),
+    and `page`/`limit` to return one page of providers.
+    """
     try:
         db = get_database()
-        providers = list(db.users.find({'role': 'provider'}))
+        sort_by = request.args.get('sort', 'activity')
+        if sort_by not in ('activity', 'earnings'):
+            return jsonify({'error': 'Invalid sort. Use activity or earnings'}), 400
+        page = request.args.get('page', 1, type=int)
+        limit = request.args.get('limit', type=int)
+        
+        # Per-provider booking metrics in a single grouped aggregation
+        completed = {'$eq': ['$status', 'completed']}
+        rated = {'$and': [completed, {'$gt': [{'$ifNull': ['$rating', 0]}, 0]}]}
+        metrics = {
+            row['_id']: row
+            for row in db.bookings.aggregate([
+                {'$group': {
+                    '_id': '$provider_id',
+                    'total_jobs': {'$sum': {'$cond': [completed, 1, 0]}},
+                    'pending_jobs': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
+                    'accepted_jobs': {'$sum': {'$cond': [{'$eq': ['$status', 'accepted']}, 1, 0]}},
+                    'total_earnings': {'$sum': {'$cond': [completed, BOOKING_AMOUNT, 0]}},
+                    'rating_sum': {'$sum': {'$cond': [rated, '$rating', 0]}},
+                    'total_ratings': {'$sum': {'$cond': [rated, 1, 0]}}
+                }}
+            ])
+        }
+        
+        providers = db.users.find({'role': 'provider'}, {
+            'fullName': 1, 'username': 1, 'location': 1, 'is_verified': 1,
+            'verified_at': 1, 'services_offered': 1
+        })
         
         report = []
         for provider in providers:
             provider_id = provider['_id']
-            
-            # Get all bookings for this provider
-            all_bookings = list(db.bookings.find({'provider_id': provider_id}))
-            completed_bookings = [b for b in all_bookings if b.get('status') == 'completed']
-            pending_bookings = [b for b in all_bookings if b.get('status') == 'pending']
-            accepted_bookings = [b for b in all_bookings if b.get('status') == 'accepted']
-            
-            # Calculate metrics
-            total_jobs = len(completed_bookings)
-            total_earnings = sum(b.get('final_price') or b.get('price', 0) for b in completed_bookings)
-            
-            # Calculate average rating
-            rated_bookings = [b for b in completed_bookings if b.get('rating')]
-            if rated_bookings:
-                avg_rating = sum(b.get('rating', 0) for b in rated_bookings) / len(rated_bookings)
-            else:
-                avg_rating = 0
+            stats = metrics.get(provider_id, {})
+            total_ratings = stats.get('total_ratings', 0)
+            avg_rating = stats.get('rating_sum', 0) / total_ratings if total_ratings else 0
             
             # Get verification status
             is_verified = provider.get('is_verified', False)
@@ -665,36 +797,101 @@ def provider_activity_report():
                 'location': provider.get('location', 'Not specified'),
                 'is_verified': is_verified,
                 'verified_at': verification_date,
-                'total_jobs': total_jobs,
-                'pending_jobs': len(pending_bookings),
-                'accepted_jobs': len(accepted_bookings),
-                'total_earnings': round(total_earnings, 2),
+                'total_jobs': stats.get('total_jobs', 0),
+                'pending_jobs': stats.get('pending_jobs', 0),
+                'accepted_jobs': stats.get('accepted_jobs', 0),
+                'total_earnings': round(stats.get('total_earnings', 0), 2),
                 'avg_rating': round(avg_rating, 2),
-                'total_ratings': len(rated_bookings),
+                'total_ratings': total_ratings,
                 'services_offered': provider.get('services_offered', [])
             })
         
-        # Sort by total jobs (most active first)
-        report.sort(key=lambda x: x['total_jobs'], reverse=True)
+        # Sort by total jobs (most active first) or by earnings
+        sort_key = 'total_earnings' if sort_by == 'earnings' else 'total_jobs'
+        report.sort(key=lambda x: x[sort_key], reverse=True)
         
-        return jsonify({
+        response = {
             'total_providers': len(report),
             'verified_providers': len([p for p in report if p['is_verified']]),
             'providers': report
-        }), 200
+        }
+        if limit:
+            limit = min(max(limit, 1), 500)
+            page = max(page, 1)
+            response['providers'] = report[(page - 1) * limit:page * limit]
+            response['pagination'] = {'page': page, 'limit': limit, 'total': len(report)}
+        
+        return jsonify(response), 200
     except Exception as e:
         print(f"Error generating provider activity report: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
 
+def _customer_history_rows(db, booking_query):
+    """Per-customer summary rows computed server-side and streamed from one aggregation cursor"""
+    customer_match = {'role': 'customer'}
+    booking_match = {key: value for key, value in booking_query.items() if key != 'customer_id'}
+    if 'customer_id' in booking_query:
+        customer_match['_id'] = booking_query['customer_id']
+    pipeline = [
+        {'$match': customer_match},
+        {'$project': {'fullName': 1, 'email': 1, 'createdAt': 1}},
+        {'$lookup': {
+            'from': 'bookings',
+            'localField': '_id',
+            'foreignField': 'customer_id',
+            'pipeline': [
+                {'$match': booking_match},
+                {'$group': {
+                    '_id': None,
+                    'total_bookings': {'$sum': 1},
+                    'completed_bookings': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]}},
+                    'pending_bookings': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
+                    'total_spent': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, BOOKING_AMOUNT, 0]}},
+                    'providers': {'$addToSet': '$provider_id'}
+                }}
+            ],
+            'as': 'stats'
+        }},
+        {'$lookup': {
+            'from': 'reviews',
+            'localField': '_id',
+            'foreignField': 'customer_id',
+            'pipeline': [{'$count': 'count'}],
+            'as': 'reviews'
+        }}
+    ]
+    for customer in db.users.aggregate(pipeline, batchSize=1000):
+        stats = customer['stats'][0] if customer['stats'] else {}
+        created_at = customer.get('createdAt')
+        yield {
+            'customer_id': customer['_id'],
+            'customer_name': customer.get('fullName', 'Unknown'),
+            'email': customer.get('email', ''),
+            'total_bookings': stats.get('total_bookings', 0),
+            'completed_bookings': stats.get('completed_bookings', 0),
+            'pending_bookings': stats.get('pending_bookings', 0),
+            'total_spent': round(stats.get('total_spent', 0), 2),
+            'unique_providers': len(stats.get('providers', [])),
+            'reviews_given': customer['reviews'][0]['count'] if customer['reviews'] else 0,
+            'registration_date': created_at if hasattr(created_at, 'isoformat') else None
+        }
+
 @admin_bp.route('/reports/customer-history', methods=['GET'])
 @token_required
 @admin_required
 def customer_history_report():
-    """Generate customer history report"""
+    """Generate customer history report
+
+    `format=csv` or `format=ndjson` streams one summary row per customer.
+    """
     try:
         db = get_database()
+        try:
+            export_format = _export_format()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get optional filters
         customer_id = request.args.get('customer_id')
@@ -723,6 +920,15 @@ def customer_history_report():
                 except:
                     return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
         
+        if export_format:
+            return export_response(
+                _customer_history_rows(db, query),
+                ['customer_id', 'customer_name', 'email', 'total_bookings', 'completed_bookings',
+                 'pending_bookings', 'total_spent', 'unique_providers', 'reviews_given', 'registration_date'],
+                export_format,
+                'customer-history'
+            )
+        
         # Get customers
         if customer_id:
             customers = [db.users.find_one({'_id': ObjectId(customer_id), 'role': 'customer'})]
@@ -786,70 +992,152 @@ def customer_history_report():
         traceback.print_exc()
         return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
 
+def recent_completed_bookings_pipeline(provider_ids, query, limit):
+    """users pipeline giving each provider's latest `limit` bookings matching query
+
+    The $limit inside the per-provider $lookup walks the
+    provider_status_completed_at index, so the cost is bounded by
+    providers x limit rather than by every completed booking.
+    """
+    booking_match = {key: value for key, value in query.items() if key != 'provider_id'}
+    return [
+        {'$match': {'_id': {'$in': provider_ids}}},
+        {'$lookup': {
+            'from': 'bookings',
+            'let': {'provider_id': '$_id'},
+            'pipeline': [
+                {'$match': dict(booking_match, **{'$expr': {'$eq': ['$provider_id', '$$provider_id']}})},
+                {'$sort': {'completed_at': -1}},
+                {'$limit': limit},
+                {'$project': {
+                    'customer_id': 1,
+                    'service_type': 1,
+                    'price': 1,
+                    'final_price': 1,
+                    'completed_at': 1
+                }}
+            ],
+            'as': 'bookings'
+        }},
+        {'$project': {'bookings': 1}}
+    ]
+
 @admin_bp.route('/reports/provider-earnings', methods=['GET'])
 @token_required
 @admin_required
 def provider_earnings_report():
-    """Generate provider earnings report"""
+    """Generate provider earnings report
+
+    `format=csv` or `format=ndjson` streams one row per completed booking instead.
+    """
     try:
         db = get_database()
+        try:
+            export_format = _export_format()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get optional filters
         provider_id = request.args.get('provider_id')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Build query
+        # Build queries for the rollup rows (by completion day) and the raw bookings
         query = {'status': 'completed'}
+        rollup_match = {}
         if provider_id:
             try:
                 query['provider_id'] = ObjectId(provider_id)
+                rollup_match['provider_id'] = ObjectId(provider_id)
             except:
                 return jsonify({'error': 'Invalid provider_id'}), 400
         
         if start_date or end_date:
             query['completed_at'] = {}
+            rollup_match['day'] = {}
             if start_date:
                 try:
-                    query['completed_at']['$gte'] = datetime.strptime(start_date, '%Y-%m-%d')
+                    start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+                    query['completed_at']['$gte'] = start_dt
+                    rollup_match['day']['$gte'] = start_dt
                 except:
                     return jsonify({'error': 'Invalid start_date format. Use YYYY-MM-DD'}), 400
             if end_date:
                 try:
                     end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
                     query['completed_at']['$lte'] = end_dt
+                    rollup_match['day']['$lt'] = end_dt
                 except:
                     return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
         
+        if export_format:
+            cursor = db.bookings.find(query).sort('completed_at', -1).batch_size(1000)
+            return export_response(
+                _export_booking_rows(db, cursor),
+                ['booking_id', 'completed_at', 'provider_id', 'provider_name', 'provider_owner_name',
+                 'customer_name', 'service_type', 'amount'],
+                export_format,
+                'provider-earnings'
+            )
+        
         # Get providers
         if provider_id:
             providers = [db.users.find_one({'_id': ObjectId(provider_id), 'role': 'provider'})]
             providers = [p for p in providers if p]
         else:
-            providers = list(db.users.find({'role': 'provider', 'is_verified': True}))
+            providers = list(db.users.find(
+                {'role': 'provider', 'is_verified': True},
+                {'fullName': 1, 'username': 1, 'location': 1}
+            ))
+        
+        # Earnings totals per provider from the precomputed rollups, or from the
+        # raw bookings before backfill-booking-stats has run
+        if booking_stats_seeded(db):
+            rollup_match['completed_count'] = {'$gt': 0}
+            totals = {row['_id']: row for row in summarize_booking_stats(db, rollup_match, group_by='provider_id')}
+        else:
+            totals = {
+                row['_id']: row
+                for row in db.bookings.aggregate([
+                    {'$match': query},
+                    {'$group': {
+                        '_id': '$provider_id',
+                        'completed_count': {'$sum': 1},
+                        'completed_revenue': {'$sum': BOOKING_AMOUNT}
+                    }}
+                ])
+            }
+        
+        # Latest 10 completed bookings per provider in the range, in one aggregation
+        provider_ids = [provider['_id'] for provider in providers]
+        recent = {}
+        if provider_ids:
+            recent = {
+                row['_id']: row['bookings']
+                for row in db.users.aggregate(recent_completed_bookings_pipeline(provider_ids, query, 10))
+            }
+        customer_ids = list({b['customer_id'] for bookings in recent.values() for b in bookings})
+        customer_names = {
+            c['_id']: c.get('fullName', 'Unknown')
+            for c in db.users.find({'_id': {'$in': customer_ids}}, {'fullName': 1})
+        } if customer_ids else {}
         
         report = []
         total_platform_earnings = 0
         
         for provider in providers:
             provider_id_obj = provider['_id']
+            provider_totals = totals.get(provider_id_obj, {})
+            total_earnings = provider_totals.get('completed_revenue', 0)
+            total_jobs = provider_totals.get('completed_count', 0)
             
-            # Get completed bookings for this provider
-            provider_query = query.copy()
-            provider_query['provider_id'] = provider_id_obj
-            bookings = list(db.bookings.find(provider_query).sort('completed_at', -1))
-            
-            # Calculate earnings
             earnings = []
-            total_earnings = 0
-            for booking in bookings:
-                price = booking.get('final_price') or booking.get('price', 0)
-                total_earnings += price
+            for booking in recent.get(provider_id_obj, []):
                 earnings.append({
                     'booking_id': str(booking['_id']),
                     'service_type': booking.get('service_type', ''),
-                    'customer_name': db.users.find_one({'_id': booking['customer_id']}).get('fullName', 'Unknown') if db.users.find_one({'_id': booking['customer_id']}) else 'Unknown',
-                    'amount': price,
+                    'customer_name': customer_names.get(booking.get('customer_id'), 'Unknown'),
+                    'amount': booking_amount(booking),
                     'completed_at': booking.get('completed_at').isoformat() if booking.get('completed_at') and hasattr(booking.get('completed_at'), 'isoformat') else None
                 })
             
@@ -861,9 +1149,9 @@ def provider_earnings_report():
                 'company_name': provider.get('username', 'Unknown'),
                 'location': provider.get('location', 'Not specified'),
                 'total_earnings': round(total_earnings, 2),
-                'total_jobs': len(bookings),
-                'avg_earnings_per_job': round(total_earnings / len(bookings), 2) if bookings else 0,
-                'earnings_breakdown': earnings[:10]  # Last 10 earnings
+                'total_jobs': total_jobs,
+                'avg_earnings_per_job': round(total_earnings / total_jobs, 2) if total_jobs else 0,
+                'earnings_breakdown': earnings  # Last 10 earnings
             })
         
         # Sort by total earnings (highest first)
@@ -880,86 +1168,153 @@ def provider_earnings_report():
         traceback.print_exc()
         return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
 
+def _live_booking_totals(db, today, month_start):
+    """All-time, today and month booking totals counted from the raw bookings in one
+    $facet pass, shaped like booking_stats_group() rows"""
+    facets = next(db.bookings.aggregate([
+        {'$facet': {
+            'by_status': [
+                {'$group': {
+                    '_id': '$status',
+                    'count': {'$sum': 1},
+                    'revenue': {'$sum': BOOKING_AMOUNT}
+                }}
+            ],
+            'completed': [
+                {'$match': {'status': 'completed', 'completed_at': {'$gte': month_start}}},
+                {'$group': {
+                    '_id': None,
+                    'month': {'$sum': BOOKING_AMOUNT},
+                    'today': {'$sum': {'$cond': [{'$gte': ['$completed_at', today]}, BOOKING_AMOUNT, 0]}}
+                }}
+            ],
+            'created': [
+                {'$match': {'created_at': {'$gte': month_start}}},
+                {'$group': {
+                    '_id': None,
+                    'month': {'$sum': 1},
+                    'today': {'$sum': {'$cond': [{'$gte': ['$created_at', today]}, 1, 0]}}
+                }}
+            ]
+        }}
+    ]))
+    by_status = {row['_id']: row for row in facets['by_status']}
+    completed = facets['completed'][0] if facets['completed'] else {}
+    created = facets['created'][0] if facets['created'] else {}
+    all_time = {status: by_status.get(status, {}).get('count', 0) for status in BOOKING_STATUSES}
+    all_time['total'] = sum(row['count'] for row in by_status.values())
+    all_time['created_revenue'] = by_status.get('completed', {}).get('revenue', 0)
+    return (
+        all_time,
+        {'total': created.get('today', 0), 'completed_revenue': completed.get('today', 0)},
+        {'total': created.get('month', 0), 'completed_revenue': completed.get('month', 0)}
+    )
+
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @token_required
 @admin_required
 def dashboard_stats():
     """Get dashboard statistics for admin with analytics"""
     try:
-        db = get_database()
-        
-        # Total bookings (all time)
-        total_bookings = db.bookings.count_documents({})
-        
-        # Bookings by status
-        bookings_by_status = {
-            'pending': db.bookings.count_documents({'status': 'pending'}),
-            'accepted': db.bookings.count_documents({'status': 'accepted'}),
-            'completed': db.bookings.count_documents({'status': 'completed'}),
-            'rejected': db.bookings.count_documents({'status': 'rejected'}),
-            'cancelled': db.bookings.count_documents({'status': 'cancelled'})
-        }
+        cached = _dashboard_stats_cache.get('stats')
+        if cached is not None:
+            return jsonify(cached), 200
         
-        # Calculate total revenue from completed bookings
-        completed_bookings = list(db.bookings.find({'status': 'completed'}))
-        total_revenue = sum(b.get('final_price') or b.get('price', 0) for b in completed_bookings)
-        
-        # Today's bookings
+        db = get_database()
         today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_bookings = db.bookings.count_documents({'created_at': {'$gte': today}})
-        today_revenue = sum(
-            (b.get('final_price') or b.get('price', 0)) 
-            for b in db.bookings.find({'status': 'completed', 'completed_at': {'$gte': today}})
-        )
-        
-        # This month's bookings
-        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_bookings = db.bookings.count_documents({'created_at': {'$gte': month_start}})
-        month_revenue = sum(
-            (b.get('final_price') or b.get('price', 0)) 
-            for b in db.bookings.find({'status': 'completed', 'completed_at': {'$gte': month_start}})
-        )
-        
-        # Active providers (verified providers)
-        active_providers = db.users.count_documents({'role': 'provider', 'is_verified': True})
-        pending_providers = db.users.count_documents({'role': 'provider', 'is_verified': {'$ne': True}})
-        
-        # Total customers
-        total_customers = db.users.count_documents({'role': 'customer'})
-        
-        # Open disputes
-        open_disputes = db.disputes.count_documents({'status': 'open'})
-        total_disputes = db.disputes.count_documents({})
+        month_start = today.replace(day=1)
+        
+        if booking_stats_seeded(db):
+            # Booking counts and revenue from the daily rollups in one pass
+            rollup_facets = next(db.booking_daily_stats.aggregate([
+                {'$facet': {
+                    'all': [booking_stats_group()],
+                    'today': [{'$match': {'day': {'$gte': today}}}, booking_stats_group()],
+                    'month': [{'$match': {'day': {'$gte': month_start}}}, booking_stats_group()]
+                }}
+            ]))
+            all_time = rollup_facets['all'][0] if rollup_facets['all'] else {}
+            today_stats = rollup_facets['today'][0] if rollup_facets['today'] else {}
+            month_stats = rollup_facets['month'][0] if rollup_facets['month'] else {}
+        else:
+            # Before backfill-booking-stats has run the rollups miss older bookings
+            all_time, today_stats, month_stats = _live_booking_totals(db, today, month_start)
+        
+        rating_summary = list(db.bookings.aggregate([
+            {'$match': {'status': 'completed', 'rating': {'$exists': True, '$ne': None}}},
+            {'$group': {'_id': None, 'average': {'$avg': '$rating'}, 'count': {'$sum': 1}}}
+        ]))
+        
+        # All user metrics in one pass
+        user_facets = next(db.users.aggregate([
+            {'$facet': {
+                'providers': [
+                    {'$match': {'role': 'provider'}},
+                    {'$group': {
+                        '_id': {'$cond': [{'$eq': ['$is_verified', True]}, 'active', 'pending']},
+                        'count': {'$sum': 1}
+                    }}
+                ],
+                'customers': [
+                    {'$match': {'role': 'customer'}},
+                    {'$count': 'count'}
+                ]
+            }}
+        ]))
         
-        # Average rating
-        rated_bookings = list(db.bookings.find({
-            'status': 'completed',
-            'rating': {'$exists': True, '$ne': None}
-        }))
-        avg_rating = sum(b.get('rating', 0) for b in rated_bookings) / len(rated_bookings) if rated_bookings else 0
+        disputes_by_status = {
+            row['_id']: row['count']
+            for row in db.disputes.aggregate([{'$group': {'_id': '$status', 'count': {'$sum': 1}}}])
+        }
         
-        return jsonify({
-            'total_bookings': total_bookings,
-            'bookings_by_status': bookings_by_status,
-            'total_revenue': round(total_revenue, 2),
-            'today_bookings': today_bookings,
-            'today_revenue': round(today_revenue, 2),
-            'month_bookings': month_bookings,
-            'month_revenue': round(month_revenue, 2),
-            'active_providers': active_providers,
-            'pending_providers': pending_providers,
-            'total_customers': total_customers,
-            'open_disputes': open_disputes,
-            'total_disputes': total_disputes,
-            'average_rating': round(avg_rating, 2),
-            'total_ratings': len(rated_bookings)
-        }), 200
+        ratings = rating_summary[0] if rating_summary else {}
+        providers = {row['_id']: row['count'] for row in user_facets['providers']}
+        customers = user_facets['customers'][0]['count'] if user_facets['customers'] else 0
+        
+        stats = {
+            'total_bookings': all_time.get('total', 0),
+            'bookings_by_status': {status: all_time.get(status, 0) for status in BOOKING_STATUSES},
+            'total_revenue': round(all_time.get('created_revenue', 0), 2),
+            'today_bookings': today_stats.get('total', 0),
+            'today_revenue': round(today_stats.get('completed_revenue', 0), 2),
+            'month_bookings': month_stats.get('total', 0),
+            'month_revenue': round(month_stats.get('completed_revenue', 0), 2),
+            'active_providers': providers.get('active', 0),
+            'pending_providers': providers.get('pending', 0),
+            'total_customers': customers,
+            'open_disputes': disputes_by_status.get('open', 0),
+            'total_disputes': sum(disputes_by_status.values()),
+            'average_rating': round(ratings.get('average') or 0, 2),
+            'total_ratings': ratings.get('count', 0)
+        }
+        _dashboard_stats_cache.set('stats', stats, ttl=current_app.config.get('ADMIN_STATS_CACHE_TTL', 30))
+        return jsonify(stats), 200
     except Exception as e:
         print(f"Error getting dashboard stats: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Failed to get stats: {str(e)}'}), 500
 
+@admin_bp.route('/diagnostics/db', methods=['GET'])
+@token_required
+@admin_required
+def db_diagnostics():
+    """MongoDB connection pool settings and counters for the worker serving this request"""
+    try:
+        return jsonify(get_pool_diagnostics()), 200
+    except Exception as e:
+        print(f"Error getting database diagnostics: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Failed to get diagnostics: {str(e)}'}), 500
+
+@admin_bp.route('/diagnostics/auth', methods=['GET'])
+@token_required
+@admin_required
+def auth_diagnostics():
+    """Verified-token cache and password hashing pool counters for the worker serving this request"""
+    return jsonify({'token_cache': token_cache_stats(), 'password_hashing': get_hashing_stats()}), 200
+
 @admin_bp.route('/accounts/<user_id>/disable', methods=['POST'])
 @token_required
 @admin_required
@@ -994,6 +1349,7 @@ def disable_account(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        bump_catalog_version(db)
         
         # Create notification for the user
         user = db.users.find_one({'_id': ObjectId(user_id)})
@@ -1005,6 +1361,11 @@ def disable_account(user_id):
                 f'Your account has been disabled{duration_text} by an administrator. Reason: {reason}',
                 'warning'
             )
+            email_user(
+                db, user['_id'], 'account_disabled',
+                reason=reason,
+                disabled_until=disable_until.strftime('%Y-%m-%d') if disable_until else None
+            )
         
         return jsonify({
             'message': f'Account disabled successfully{" until " + disable_until.isoformat() if disable_until else " permanently"}',
@@ -1041,6 +1402,7 @@ def enable_account(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'User not found'}), 404
+        bump_catalog_version(db)
         
         return jsonify({'message': 'Account enabled successfully'}), 200
     except Exception as e:
@@ -1095,10 +1457,13 @@ def approve_account_deletion(user_id):
             }), 400
         
         # Permanently delete the user
-        result = db.users.delete_one({'_id': ObjectId(user_id)})
+        deleted_user = db.users.find_one_and_delete({'_id': ObjectId(user_id)}, projection={'role': 1})
         
-        if result.deleted_count == 0:
+        if deleted_user is None:
             return jsonify({'error': 'User not found or already deleted'}), 404
+        record_user_deleted(db, deleted_user.get('role'))
+        delete_profile_pictures(db, ObjectId(user_id))
+        bump_catalog_version(db)
         
         return jsonify({'message': 'Account deleted permanently'}), 200
     except Exception as e:
@@ -1141,6 +1506,7 @@ def reject_account_deletion(user_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'Failed to update account'}), 500
+        bump_catalog_version(db)
         
         # Create notification for the user about rejection
         create_notification(
@@ -1174,18 +1540,20 @@ def get_all_users():
         if role_filter and role_filter in ['customer', 'provider', 'admin']:
             query['role'] = role_filter
         
-        # Get all users matching role filter (exclude passwords)
-        users = list(db.users.find(query, {'password': 0}).sort('createdAt', -1))
-        
-        # Apply search filter if provided
+        # Word-prefix match on username/fullName/email, served by the search_keys index
         if search_query:
-            search_lower = search_query.lower()
-            users = [
-                u for u in users
-                if search_lower in u.get('username', '').lower() or
-                   search_lower in u.get('fullName', '').lower() or
-                   search_lower in u.get('email', '').lower()
-            ]
+            query.update(search_filter(search_query))
+        
+        # Users matching the filters (exclude passwords); `limit`/`cursor` return one page
+        paginate, limit, cursor = page_request(request.args)
+        next_cursor = None
+        if paginate:
+            try:
+                users, next_cursor = fetch_page(db.users, query, limit, cursor, field='createdAt', projection={'password': 0})
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        else:
+            users = list(db.users.find(query, {'password': 0}).sort('createdAt', -1))
         
         # Format response - ensure sensitive data is handled properly
         for user in users:
@@ -1200,23 +1568,32 @@ def get_all_users():
             if 'verified_at' in user and user.get('verified_at'):
                 user['verified_at'] = user['verified_at'].isoformat() if hasattr(user['verified_at'], 'isoformat') else str(user['verified_at'])
         
-        # Get counts for summary
-        total_customers = db.users.count_documents({'role': 'customer'})
-        total_providers = db.users.count_documents({'role': 'provider'})
-        total_admins = db.users.count_documents({'role': 'admin'})
-        
+        # Role totals come from the maintained counter, not three collection counts
+        role_counts = get_role_counts(db)
+        if not paginate:
+            total = len(users)
+        elif search_query:
+            total = db.users.count_documents(query)
+        elif 'role' in query:
+            total = role_counts.get(query['role'], 0)
+        else:
+            total = sum(role_counts.values())
+        
+        summary = {
+            'total': total,
+            'total_customers': role_counts['customer'],
+            'total_providers': role_counts['provider'],
+            'total_admins': role_counts['admin'],
+            'filtered_by': {
+                'role': role_filter or 'all',
+                'search': search_query or None
+            }
+        }
+        if paginate:
+            return jsonify(page_envelope('users', users, next_cursor, summary=summary)), 200
         return jsonify({
             'users': users,
-            'summary': {
-                'total': len(users),
-                'total_customers': total_customers,
-                'total_providers': total_providers,
-                'total_admins': total_admins,
-                'filtered_by': {
-                    'role': role_filter or 'all',
-                    'search': search_query or None
-                }
-            }
+            'summary': summary
         }), 200
     except Exception as e:
         print(f"Error fetching users: {e}")
@@ -1328,10 +1705,13 @@ def create_user():
             user_doc['service_radius'] = data.get('service_radius', 0)
             user_doc['equipment'] = data.get('equipment', '')
             user_doc['rating'] = 0
+            user_doc['rating_stats'] = empty_rating_stats()
             if user_doc.get('is_verified'):
                 user_doc['verified_at'] = datetime.utcnow()
         
-        result = users_collection.insert_one(user_doc)
+        result = insert_user(db, user_doc)
+        if user_doc.get('is_verified'):
+            bump_catalog_version(db)
         
         user = {
             'id': str(result.inserted_id),
@@ -1346,7 +1726,10 @@ def create_user():
             'user': user
         }), 201
         
+    except HashingOverloaded as error:
+        return overloaded_response(error)
     except Exception as error:
         print("=== CREATE USER ERROR ===")
+        import traceback
         traceback.print_exc()
         return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
@@ -3,11 +3,15 @@
 from flask import Blueprint, request, jsonify, make_response
 from lib.mongodb import get_database
 from lib.auth import (
-    verify_password, generate_token, hash_password,
+    verify_password, generate_token, hash_password, password_needs_rehash,
     generate_verification_code, generate_reset_token, verify_reset_token,
     verify_token
 )
-from lib.email_service import send_verification_email, send_sms_verification
+from lib.hashing import HashingOverloaded, overloaded_response
+from lib.email_service import email_configured, sms_configured, verification_sms_content
+from lib.outbox import enqueue_templated_email, enqueue_sms
+from lib.user_directory import insert_user
+from lib.ratings import empty_rating_stats
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 import traceback
@@ -53,6 +57,16 @@ def login():
         if not user or not verify_password(password, user.get('password', '')):
             return jsonify({'error': 'Invalid credentials'}), 401
         
+        # Upgrade hashes made with an older algorithm or cost
+        if password_needs_rehash(user.get('password', '')):
+            try:
+                users_collection.update_one(
+                    {'_id': user['_id'], 'password': user['password']},
+                    {'$set': {'password': hash_password(password), 'password_rehashed_at': datetime.utcnow()}}
+                )
+            except HashingOverloaded:
+                pass  # Retried on a later login
+        
         user_data = {
             'id': str(user['_id']),
             'username': user.get('username', ''),
@@ -79,6 +93,8 @@ def login():
         print(f"[OK] LOGIN SUCCESS: Token cookie set for user '{username}' (role: {role})")
         return response
         
+    except HashingOverloaded as error:
+        return overloaded_response(error)
     except Exception as error:
         print("=== LOGIN ERROR ===")
         print(f"Error type: {type(error).__name__}")
@@ -158,7 +174,7 @@ def admin_signup():
             'createdAt': datetime.utcnow()
         }
         
-        result = users_collection.insert_one(admin_doc)
+        result = insert_user(db, admin_doc)
         
         user = {
             'id': str(result.inserted_id),
@@ -175,6 +191,8 @@ def admin_signup():
             'user': user
         }), 201
         
+    except HashingOverloaded as error:
+        return overloaded_response(error)
     except Exception as error:
         print("=== ADMIN SIGNUP ERROR ===")
         traceback.print_exc()
@@ -243,8 +261,9 @@ def signup():
             user_doc['service_radius'] = data.get('service_radius', 0)  # Service radius from signup form
             user_doc['equipment'] = data.get('equipment', '')  # Equipment from signup form
             user_doc['rating'] = 0  # Initialize rating
+            user_doc['rating_stats'] = empty_rating_stats()
         
-        result = users_collection.insert_one(user_doc)
+        result = insert_user(db, user_doc)
         
         user = {
             'id': str(result.inserted_id),
@@ -272,6 +291,8 @@ def signup():
         print(f"[OK] SIGNUP SUCCESS: Token cookie set for user '{username}' (role: {role})")
         return response
         
+    except HashingOverloaded as error:
+        return overloaded_response(error)
     except Exception as error:
         print("=== SIGNUP ERROR ===")
         traceback.print_exc()
@@ -361,11 +382,12 @@ def forgot_password():
         reset_token = generate_reset_token(str(user['_id']))
         
         # Store verification code in database with expiration (15 minutes)
+        # Supersede earlier codes; the expires_at TTL index removes them later
         password_resets_collection = db['password_resets']
-        password_resets_collection.delete_many({
-            'user_id': user['_id'],
-            'used': False
-        })
+        password_resets_collection.update_many(
+            {'user_id': user['_id'], 'used': False},
+            {'$set': {'used': True}}
+        )
         
         password_resets_collection.insert_one({
             'user_id': user['_id'],
@@ -385,6 +407,22 @@ def forgot_password():
         email_sent = False
         sms_sent = False
         
+        # Messages are queued in the outbox and sent by the background dispatcher
+        def queue_email():
+            if not email_configured():
+                return False
+            enqueue_templated_email(
+                db, user_email, 'password_reset',
+                user_name=user_name, verification_code=verification_code, expires_minutes=15
+            )
+            return True
+        
+        def queue_sms(phone_number):
+            if not sms_configured():
+                return False
+            enqueue_sms(db, phone_number, verification_sms_content(verification_code), kind='password_reset')
+            return True
+        
         # Determine if identifier is email or phone
         is_email = '@' in identifier
         
@@ -392,22 +430,22 @@ def forgot_password():
         if is_email:
             # User provided email - send via email
             if user_email:
-                email_sent = send_verification_email(user_email, verification_code, user_name)
+                email_sent = queue_email()
             # Also try SMS if user has phone number
             if user_phone:
-                sms_sent = send_sms_verification(user_phone, verification_code)
+                sms_sent = queue_sms(user_phone)
         else:
             # User provided phone/username - try to send via SMS first
             if user_phone:
-                sms_sent = send_sms_verification(user_phone, verification_code)
+                sms_sent = queue_sms(user_phone)
             elif is_phone:
                 # User provided phone but not in DB - try to send to provided number
                 normalized_phone = re.sub(r'[\s\-\(\)]', '', identifier)
-                sms_sent = send_sms_verification(normalized_phone, verification_code)
+                sms_sent = queue_sms(normalized_phone)
             
             # Always try email as backup if user has email
             if user_email:
-                email_sent = send_verification_email(user_email, verification_code, user_name)
+                email_sent = queue_email()
         
         # If neither email nor SMS was sent successfully, return code in response (for development)
         response_data = {
@@ -519,6 +557,8 @@ def reset_password():
             'message': 'Password reset successfully'
         }), 200
         
+    except HashingOverloaded as error:
+        return overloaded_response(error)
     except Exception as error:
         print("=== RESET PASSWORD ERROR ===")
         traceback.print_exc()
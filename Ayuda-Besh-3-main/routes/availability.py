@@ -3,11 +3,15 @@
 from flask import Blueprint, request, jsonify
 from lib.mongodb import get_database
 from lib.decorators import token_required
-from datetime import datetime, timedelta
+from lib.availability import get_compiled_availability, invalidate_compiled_availability, validate_availability
+from datetime import date, datetime, timedelta
 from bson.objectid import ObjectId
 
 availability_bp = Blueprint('availability', __name__)
 
+MAX_BATCH_CHECKS = 500
+MAX_BATCH_PROVIDERS = 100
+
 @availability_bp.route('/availability', methods=['GET', 'POST', 'PUT', 'DELETE'])
 @token_required
 def manage_availability():
@@ -83,8 +87,11 @@ def manage_availability():
                     except:
                         return jsonify({'error': f'Invalid date format: {date_entry.get("date")}'}), 400
             
-            # Check if availability exists
-            existing = db.availability.find_one({'provider_id': provider_id})
+            # Reject times that would not compile (HH:MM, start before end)
+            try:
+                validate_availability({'schedule': schedule, 'specific_dates': formatted_specific_dates})
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             availability_doc = {
                 'provider_id': provider_id,
@@ -94,18 +101,21 @@ def manage_availability():
                 'updated_at': datetime.utcnow()
             }
             
-            if existing:
-                # Update existing
-                result = db.availability.update_one(
-                    {'provider_id': provider_id},
-                    {'$set': availability_doc}
-                )
+            # Create or update; version tells other workers' caches it changed
+            result = db.availability.update_one(
+                {'provider_id': provider_id},
+                {
+                    '$set': availability_doc,
+                    '$inc': {'version': 1},
+                    '$setOnInsert': {'created_at': availability_doc['updated_at']}
+                },
+                upsert=True
+            )
+            if result.matched_count:
                 message = 'Availability updated successfully'
             else:
-                # Create new
-                availability_doc['created_at'] = datetime.utcnow()
-                result = db.availability.insert_one(availability_doc)
                 message = 'Availability created successfully'
+            invalidate_compiled_availability(provider_id)
             
             return jsonify({
                 'message': message,
@@ -120,6 +130,7 @@ def manage_availability():
         elif request.method == 'DELETE':
             # Delete availability (reset to defaults)
             result = db.availability.delete_one({'provider_id': provider_id})
+            invalidate_compiled_availability(provider_id)
             return jsonify({'message': 'Availability deleted successfully'}), 200
         
     except Exception as e:
@@ -153,95 +164,86 @@ def check_availability():
         except:
             return jsonify({'error': 'Invalid provider_id or datetime format'}), 400
         
-        # Get provider availability
-        availability = db.availability.find_one({'provider_id': provider_obj_id})
-        
-        if not availability:
-            # Default: available during weekdays 9 AM - 6 PM
-            day_name = requested_dt.strftime('%A').lower()
-            if day_name in ['saturday', 'sunday']:
-                return jsonify({'available': False, 'reason': 'Provider not available on weekends'}), 200
-            
-            hour = requested_dt.hour
-            if hour < 9 or hour >= 18:
-                return jsonify({'available': False, 'reason': 'Outside working hours (9 AM - 6 PM)'}), 200
-            
+        compiled = get_compiled_availability(db, [provider_obj_id])[provider_obj_id]
+        available, reason = compiled.check(requested_dt)
+        if available:
             return jsonify({'available': True}), 200
+        return jsonify({'available': False, 'reason': reason}), 200
         
-        # Check specific dates first (overrides regular schedule)
-        specific_dates = availability.get('specific_dates', [])
-        requested_date = requested_dt.date()
-        
-        for date_entry in specific_dates:
-            if date_entry.get('date') and date_entry['date'].date() == requested_date:
-                if not date_entry.get('available', True):
-                    return jsonify({
-                        'available': False,
-                        'reason': date_entry.get('reason', 'Provider marked this date as unavailable')
-                    }), 200
-                # If available on specific date, check time
-                if 'start' in date_entry and 'end' in date_entry:
-                    requested_time = requested_dt.time()
-                    start_time = datetime.strptime(date_entry['start'], '%H:%M').time()
-                    end_time = datetime.strptime(date_entry['end'], '%H:%M').time()
-                    
-                    if requested_time < start_time or requested_time >= end_time:
-                        return jsonify({
-                            'available': False,
-                            'reason': f'Outside working hours ({date_entry["start"]} - {date_entry["end"]})'
-                        }), 200
-                
-                # Check breaks
-                breaks = date_entry.get('breaks', [])
-                requested_time = requested_dt.time()
-                for break_period in breaks:
-                    break_start = datetime.strptime(break_period['start'], '%H:%M').time()
-                    break_end = datetime.strptime(break_period['end'], '%H:%M').time()
-                    if break_start <= requested_time < break_end:
-                        return jsonify({
-                            'available': False,
-                            'reason': 'During break time'
-                        }), 200
-                
-                return jsonify({'available': True}), 200
-        
-        # Check regular schedule
-        day_name = requested_dt.strftime('%A').lower()
-        schedule = availability.get('schedule', {})
-        
-        if day_name not in schedule:
-            return jsonify({'available': False, 'reason': 'Day not in schedule'}), 200
-        
-        day_schedule = schedule[day_name]
-        if not day_schedule.get('available', False):
-            return jsonify({'available': False, 'reason': f'Provider not available on {day_name}'}), 200
-        
-        # Check working hours
-        requested_time = requested_dt.time()
-        start_time = datetime.strptime(day_schedule['start'], '%H:%M').time()
-        end_time = datetime.strptime(day_schedule['end'], '%H:%M').time()
+    except Exception as e:
+        print(f"Error checking availability: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Failed to check availability: {str(e)}'}), 500
+
+@availability_bp.route('/availability/check-batch', methods=['POST'])
+def check_availability_batch():
+    """Check many provider/datetime pairs, or whole-day slot grids, in one call
+
+    Body: {"checks": [{"provider_id", "datetime"}, ...]} returns one result per
+    check in order; {"provider_ids": [...], "date": "YYYY-MM-DD", "step_minutes": 30}
+    returns each provider's slot grid for that day.
+    """
+    try:
+        db = get_database()
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'Request body must be valid JSON'}), 400
         
-        if requested_time < start_time or requested_time >= end_time:
-            return jsonify({
-                'available': False,
-                'reason': f'Outside working hours ({day_schedule["start"]} - {day_schedule["end"]})'
-            }), 200
+        if 'checks' in data:
+            checks = data.get('checks') or []
+            if (not isinstance(checks, list) or len(checks) > MAX_BATCH_CHECKS
+                    or not all(isinstance(check, dict) for check in checks)):
+                return jsonify({'error': f'checks must be a list of at most {MAX_BATCH_CHECKS} objects'}), 400
+            
+            parsed = []
+            for check in checks:
+                try:
+                    parsed.append((
+                        ObjectId(check['provider_id']),
+                        datetime.fromisoformat(str(check['datetime']).replace('Z', '+00:00'))
+                    ))
+                except Exception:
+                    parsed.append(None)
+            compiled = get_compiled_availability(db, [item[0] for item in parsed if item])
+            
+            results = []
+            for check, item in zip(checks, parsed):
+                result = {'provider_id': check.get('provider_id'), 'datetime': check.get('datetime')}
+                if item is None:
+                    result['error'] = 'Invalid provider_id or datetime format'
+                else:
+                    available, reason = compiled[item[0]].check(item[1])
+                    result['available'] = available
+                    if not available:
+                        result['reason'] = reason
+                results.append(result)
+            return jsonify({'results': results}), 200
         
-        # Check breaks
-        breaks = day_schedule.get('breaks', [])
-        for break_period in breaks:
-            break_start = datetime.strptime(break_period['start'], '%H:%M').time()
-            break_end = datetime.strptime(break_period['end'], '%H:%M').time()
-            if break_start <= requested_time < break_end:
-                return jsonify({
-                    'available': False,
-                    'reason': 'During break time'
-                }), 200
+        provider_ids = data.get('provider_ids') or []
+        if not isinstance(provider_ids, list) or not provider_ids or len(provider_ids) > MAX_BATCH_PROVIDERS:
+            return jsonify({'error': f'Provide checks, or 1 to {MAX_BATCH_PROVIDERS} provider_ids with a date'}), 400
+        try:
+            provider_obj_ids = [ObjectId(provider_id) for provider_id in provider_ids]
+            day = date.fromisoformat(data.get('date', ''))
+            step_minutes = int(data.get('step_minutes', 30))
+        except Exception:
+            return jsonify({'error': 'Invalid provider_ids, date (YYYY-MM-DD) or step_minutes'}), 400
+        if step_minutes < 5 or step_minutes > 240:
+            return jsonify({'error': 'step_minutes must be between 5 and 240'}), 400
         
-        return jsonify({'available': True}), 200
+        compiled = get_compiled_availability(db, provider_obj_ids)
+        return jsonify({
+            'date': day.isoformat(),
+            'step_minutes': step_minutes,
+            'providers': {
+                str(provider_obj_id): compiled[provider_obj_id].day_grid(day, step_minutes)
+                for provider_obj_id in provider_obj_ids
+            }
+        }), 200
         
     except Exception as e:
-        print(f"Error checking availability: {e}")
+        print(f"Error checking availability batch: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Failed to check availability: {str(e)}'}), 500
@@ -1,81 +1,90 @@
 # routes/bookings.py
 from flask import Blueprint, request, jsonify
 from lib.mongodb import get_database
+from lib.notifications import create_notification
 from lib.decorators import token_required
+from lib.pagination import page_request, fetch_page, page_envelope
+from lib.booking_stats import record_status_change
+from lib.joins import Ref, join_refs
+from lib.ratings import apply_rating, ensure_rating_stats
+from lib.booking_slots import ACTIVE_STATUSES, SlotUnavailable, reserve_slots, release_slots
+from lib.catalog import RATING_BUMP_SECONDS, bump_catalog_version
+from lib.outbox import email_user
 from datetime import datetime
 from bson.objectid import ObjectId
 
 bookings_bp = Blueprint('bookings', __name__)
 
-def create_notification(user_id, title, message, type='info', booking_id=None):
-    """Helper to create notifications"""
-    try:
-        db = get_database()
-        notification = {
-            'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
-            'title': title,
-            'message': message,
-            'type': type,
-            'read': False,
-            'created_at': datetime.utcnow(),
-            'booking_id': ObjectId(booking_id) if booking_id else None
-        }
-        db.notifications.insert_one(notification)
-    except Exception as e:
-        print(f"Error creating notification: {e}")
-
 @bookings_bp.route('/payment-transactions', methods=['GET'])
 @token_required
 def get_payment_transactions():
-    """Get payment transaction history for current user"""
+    """Get payment transaction history for current user
+
+    `limit`/`cursor` return one page as {'transactions': [...], 'next_cursor': ...}.
+    """
     try:
         db = get_database()
         user_id = ObjectId(request.current_user['user_id'])
         role = request.current_user.get('role')
         
-        # Get bookings that have payments (completed bookings or any with final_price)
+        # Only bookings with payments (completed bookings or any with final_price)
         if role == 'customer':
             query = {'customer_id': user_id}
         else:  # provider
             query = {'provider_id': user_id}
+        query['$or'] = [{'status': 'completed'}, {'final_price': {'$nin': [None, 0, '']}}]
+        
+        paginate, limit, cursor = page_request(request.args)
+        next_cursor = None
+        if paginate:
+            try:
+                bookings, next_cursor = fetch_page(db.bookings, query, limit, cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        else:
+            bookings = list(db.bookings.find(query).sort('created_at', -1))
         
-        # Get all bookings and create transaction records
-        bookings = list(db.bookings.find(query).sort('created_at', -1))
+        # Resolve the other party of every booking with one users query
+        if role == 'customer':
+            join_refs(db, bookings, [Ref('provider_id', 'users', ('username', 'fullName'), 'counterpart')])
+        else:
+            join_refs(db, bookings, [Ref('customer_id', 'users', ('fullName',), 'counterpart')])
         
         transactions = []
         for booking in bookings:
-            # Only include bookings with payments (completed or with final_price)
-            if booking.get('status') == 'completed' or booking.get('final_price'):
-                transaction = {
-                    'transaction_id': str(booking['_id']),
-                    'booking_id': str(booking['_id']),
-                    'date': booking.get('completed_at', booking.get('created_at', datetime.utcnow())),
-                    'amount': booking.get('final_price') or booking.get('price', 0),
-                    'status': booking.get('status', 'pending'),
-                    'payment_method': booking.get('payment_method', 'face_to_face'),  # Default to face-to-face
-                    'service_type': booking.get('service_type', ''),
-                }
-                
-                # Add provider/customer info
-                if role == 'customer':
-                    provider = db.users.find_one({'_id': booking['provider_id']})
-                    transaction['provider_name'] = provider.get('username', provider.get('fullName', 'Unknown')) if provider else 'Unknown'
-                    transaction['type'] = 'payment_out'
-                else:
-                    customer = db.users.find_one({'_id': booking['customer_id']})
-                    transaction['customer_name'] = customer.get('fullName', 'Unknown') if customer else 'Unknown'
-                    transaction['type'] = 'payment_in'
-                
-                transactions.append(transaction)
-        
-        # Sort by date (newest first)
-        transactions.sort(key=lambda x: x['date'], reverse=True)
+            transaction = {
+                'transaction_id': str(booking['_id']),
+                'booking_id': str(booking['_id']),
+                'date': booking.get('completed_at', booking.get('created_at', datetime.utcnow())),
+                'amount': booking.get('final_price') or booking.get('price', 0),
+                'status': booking.get('status', 'pending'),
+                'payment_method': booking.get('payment_method', 'face_to_face'),  # Default to face-to-face
+                'service_type': booking.get('service_type', ''),
+            }
+            
+            # Add provider/customer info
+            if role == 'customer':
+                provider = booking['counterpart']
+                transaction['provider_name'] = provider.get('username', provider.get('fullName', 'Unknown')) if provider else 'Unknown'
+                transaction['type'] = 'payment_out'
+            else:
+                customer = booking['counterpart']
+                transaction['customer_name'] = customer.get('fullName', 'Unknown') if customer else 'Unknown'
+                transaction['type'] = 'payment_in'
+            
+            transactions.append(transaction)
+        
+        # Sort by date (newest first); pages keep the cursor's created_at order
+        if not paginate:
+            transactions.sort(key=lambda x: x['date'], reverse=True)
         
         # Format dates
         for transaction in transactions:
             if isinstance(transaction['date'], datetime):
                 transaction['date'] = transaction['date'].isoformat()
         
+        if paginate:
+            return jsonify(page_envelope('transactions', transactions, next_cursor)), 200
         return jsonify(transactions), 200
     except Exception as e:
         print(f"Error fetching payment transactions: {e}")
@@ -86,7 +95,12 @@ def get_payment_transactions():
 @bookings_bp.route('/my-bookings', methods=['GET'])
 @token_required
 def get_my_bookings():
-    """Get bookings for current user (customer or provider)"""
+    """Get bookings for current user (customer or provider)
+
+    Without query parameters the full history is returned as a list. Passing
+    `limit` (and the `next_cursor` of the previous page as `cursor`) returns one
+    page as {'bookings': [...], 'next_cursor': ...} instead.
+    """
     db = get_database()
     user_id = ObjectId(request.current_user['user_id'])
     role = request.current_user['role']
@@ -96,13 +110,35 @@ def get_my_bookings():
     else:  # provider
         query = {'provider_id': user_id}
     
-    bookings = list(db.bookings.find(query).sort('created_at', -1))
+    paginate, limit, cursor = page_request(request.args)
+    next_cursor = None
+    if paginate:
+        try:
+            bookings, next_cursor = fetch_page(db.bookings, query, limit, cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    else:
+        bookings = list(db.bookings.find(query).sort([('created_at', -1), ('_id', -1)]))
+    
+    # Resolve the other party of every booking with a single query
+    if role == 'customer':
+        counterpart_field = 'provider_id'
+        counterpart_projection = {'username': 1, 'fullName': 1}
+        missing_name_field = 'provider_name'
+    else:
+        counterpart_field = 'customer_id'
+        counterpart_projection = {'fullName': 1, 'email': 1}
+        missing_name_field = 'customer_name'
+    counterpart_ids = list({b[counterpart_field] for b in bookings if missing_name_field not in b})
+    counterparts = {}
+    if counterpart_ids:
+        counterparts = {
+            u['_id']: u for u in db.users.find({'_id': {'$in': counterpart_ids}}, counterpart_projection)
+        }
     
     # Enhance bookings with user information
     for booking in bookings:
-        # Store original ObjectId before converting to string
-        provider_id_obj = booking['provider_id']
-        customer_id_obj = booking['customer_id']
+        counterpart = counterparts.get(booking[counterpart_field])
         
         booking['_id'] = str(booking['_id'])
         booking['customer_id'] = str(booking['customer_id'])
@@ -110,20 +146,20 @@ def get_my_bookings():
         
         # Get provider/customer names if not already included
         if role == 'customer' and 'provider_name' not in booking:
-            provider = db.users.find_one({'_id': provider_id_obj})
             # Use company name (username) for provider, fallback to fullName if username not available
-            if provider:
-                booking['provider_name'] = provider.get('username', provider.get('fullName', 'Unknown'))
-                booking['provider_company_name'] = provider.get('username', 'Unknown')
-                booking['provider_owner_name'] = provider.get('fullName', 'Unknown')
+            if counterpart:
+                booking['provider_name'] = counterpart.get('username', counterpart.get('fullName', 'Unknown'))
+                booking['provider_company_name'] = counterpart.get('username', 'Unknown')
+                booking['provider_owner_name'] = counterpart.get('fullName', 'Unknown')
             else:
                 booking['provider_name'] = 'Unknown'
         
         if role == 'provider' and 'customer_name' not in booking:
-            customer = db.users.find_one({'_id': customer_id_obj})
-            booking['customer_name'] = customer['fullName'] if customer else 'Unknown'
-            booking['customer_email'] = customer.get('email', '') if customer else ''
+            booking['customer_name'] = counterpart.get('fullName', 'Unknown') if counterpart else 'Unknown'
+            booking['customer_email'] = counterpart.get('email', '') if counterpart else ''
     
+    if paginate:
+        return jsonify(page_envelope('bookings', bookings, next_cursor)), 200
     return jsonify(bookings), 200
 
 @bookings_bp.route('/<booking_id>/accept', methods=['POST'])
@@ -138,15 +174,14 @@ def accept_booking(booking_id):
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
         
-        # SECURITY: Prevent double booking - check if provider already has another booking at this time
-        existing_booking = db.bookings.find_one({
-            'provider_id': booking['provider_id'],
-            'booking_time': booking['booking_time'],
-            'status': {'$in': ['pending', 'accepted']},
-            '_id': {'$ne': ObjectId(booking_id)}  # Exclude current booking
-        })
+        if booking['provider_id'] != ObjectId(request.current_user['user_id']) or booking['status'] != 'pending':
+            return jsonify({'error': 'Booking not found or already accepted'}), 404
         
-        if existing_booking:
+        # SECURITY: Prevent double booking - a pending booking already holds its slots;
+        # one created before slot reservations claims them now, atomically
+        try:
+            reserve_slots(db, booking)
+        except SlotUnavailable:
             return jsonify({
                 'error': 'Cannot accept booking: Another booking already exists at this time slot. Please reject this booking or ask the customer to choose a different time.'
             }), 409  # 409 Conflict
@@ -161,8 +196,14 @@ def accept_booking(booking_id):
         )
         
         if result.matched_count == 0:
+            # Rejected or cancelled meanwhile: don't keep the slots claimed above
+            current = db.bookings.find_one({'_id': ObjectId(booking_id)}, {'status': 1})
+            if not current or current.get('status') not in ACTIVE_STATUSES:
+                release_slots(db, ObjectId(booking_id))
             return jsonify({'error': 'Booking not found or already accepted'}), 404
         
+        record_status_change(db, booking, 'pending', 'accepted')
+        
         # Create notification for customer
         booking = db.bookings.find_one({'_id': ObjectId(booking_id)})
         if booking:
@@ -173,6 +214,14 @@ def accept_booking(booking_id):
                 'success',
                 booking_id
             )
+            provider = db.users.find_one({'_id': booking['provider_id']}, {'username': 1, 'fullName': 1})
+            email_user(
+                db, booking['customer_id'], 'booking_accepted',
+                provider_name=(provider or {}).get('username', (provider or {}).get('fullName', 'Your provider')),
+                service_name=booking.get('service_type', 'service'),
+                booking_time=booking['booking_time'].strftime('%Y-%m-%d %H:%M')
+                if hasattr(booking.get('booking_time'), 'strftime') else booking.get('booking_time')
+            )
         
         return jsonify({'message': 'Booking accepted'}), 200
     except Exception as e:
@@ -207,10 +256,12 @@ def reject_booking(booking_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'Booking not found or already processed'}), 404
+        release_slots(db, ObjectId(booking_id))
         
         # Create notification for customer
         booking = db.bookings.find_one({'_id': ObjectId(booking_id)})
         if booking:
+            record_status_change(db, booking, 'pending', 'rejected')
             create_notification(
                 booking['customer_id'],
                 'Booking Rejected',
@@ -268,21 +319,24 @@ def complete_booking(booking_id):
         if request.current_user['role'] != 'provider':
             return jsonify({'error': 'Only providers can complete bookings'}), 403
         
+        completed_at = datetime.utcnow()
         result = db.bookings.update_one(
             {
                 '_id': ObjectId(booking_id),
                 'provider_id': ObjectId(request.current_user['user_id']),
                 'status': 'accepted'
             },
-            {'$set': {'status': 'completed', 'completed_at': datetime.utcnow()}}
+            {'$set': {'status': 'completed', 'completed_at': completed_at}}
         )
         
         if result.matched_count == 0:
             return jsonify({'error': 'Booking not found or not in accepted state'}), 404
+        release_slots(db, ObjectId(booking_id))
         
         # Create notification for customer
         booking = db.bookings.find_one({'_id': ObjectId(booking_id)})
         if booking:
+            record_status_change(db, booking, 'accepted', 'completed', completed_at)
             create_notification(
                 booking['customer_id'],
                 'Booking Completed',
@@ -349,17 +403,23 @@ def rate_provider(booking_id):
             update_data['review'] = review_text
             update_data['reviewed_at'] = datetime.utcnow()
         
-        # Update booking with rating and optional review
-        result = db.bookings.update_one(
+        provider_id = booking['provider_id']
+        # Seed the provider's aggregates before the booking write, so the seed
+        # never counts this rating on top of the $inc below
+        ensure_rating_stats(db, provider_id)
+        
+        # Update booking with rating and optional review; the previous rating
+        # (if this is a re-rating) comes back from the same atomic write
+        previous = db.bookings.find_one_and_update(
             {'_id': ObjectId(booking_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'rating': 1}
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             return jsonify({'error': 'Failed to update rating'}), 500
         
         # Create or update review document in reviews collection
-        provider_id = booking['provider_id']
         review_doc = {
             'booking_id': ObjectId(booking_id),
             'provider_id': provider_id,
@@ -387,22 +447,9 @@ def rate_provider(booking_id):
             # Create new review
             db.reviews.insert_one(review_doc)
         
-        # Calculate and update provider's average rating
-        provider_bookings = list(db.bookings.find({
-            'provider_id': provider_id,
-            'rating': {'$exists': True, '$ne': None}
-        }))
-        
-        avg_rating = rating
-        if provider_bookings:
-            total_rating = sum(b.get('rating', 0) for b in provider_bookings)
-            avg_rating = total_rating / len(provider_bookings)
-            
-            # Update provider's rating
-            db.users.update_one(
-                {'_id': provider_id},
-                {'$set': {'rating': round(avg_rating, 2)}}
-            )
+        # Fold the rating into the provider's running aggregates
+        avg_rating = apply_rating(db, provider_id, rating, previous.get('rating'))
+        bump_catalog_version(db, coalesce_seconds=RATING_BUMP_SECONDS)
         
         # Create notification for provider about the review
         create_notification(
@@ -412,6 +459,13 @@ def rate_provider(booking_id):
             'success',
             booking_id
             )
+        email_user(
+            db, provider_id, 'review_received',
+            customer_name=customer_name,
+            service_name=booking.get('service_type', 'service'),
+            rating=rating,
+            review_text=review_text
+        )
         
         return jsonify({
             'message': 'Rating and review submitted successfully',
@@ -456,9 +510,9 @@ def cancel_booking(booking_id):
         data = request.get_json() or {}
         cancellation_reason = data.get('reason', 'Cancelled by user')
         
-        # Update booking status
+        # Update booking status (only if it is still in the status checked above)
         result = db.bookings.update_one(
-            {'_id': ObjectId(booking_id)},
+            {'_id': ObjectId(booking_id), 'status': booking['status']},
             {
                 '$set': {
                     'status': 'cancelled',
@@ -471,6 +525,9 @@ def cancel_booking(booking_id):
         
         if result.matched_count == 0:
             return jsonify({'error': 'Failed to cancel booking'}), 500
+        release_slots(db, ObjectId(booking_id))
+        
+        record_status_change(db, booking, booking['status'], 'cancelled')
         
         # Create notification for the other party
         booking = db.bookings.find_one({'_id': ObjectId(booking_id)})
@@ -1,8 +1,10 @@
 # routes/notifications.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from lib.mongodb import get_database
 from lib.decorators import token_required
-from datetime import datetime
+from lib import notification_stream
+from lib.notification_stream import concurrent_server, format_sse, parse_event_id, serialize_notification
+from lib import notifications as notification_service
 from bson.objectid import ObjectId
 
 notifications_bp = Blueprint('notifications', __name__)
@@ -29,11 +31,7 @@ def get_notifications():
             if 'created_at' in notification and notification['created_at']:
                 notification['created_at'] = notification['created_at'].isoformat() if hasattr(notification['created_at'], 'isoformat') else str(notification['created_at'])
         
-        # Count unread notifications
-        unread_count = db.notifications.count_documents({
-            'user_id': user_id,
-            'read': False
-        })
+        unread_count = notification_service.get_unread_count(db, user_id)
         
         return jsonify({
             'notifications': notifications,
@@ -45,6 +43,71 @@ def get_notifications():
         traceback.print_exc()
         return jsonify({'error': f'Failed to fetch notifications: {str(e)}'}), 500
 
+@notifications_bp.route('/notifications/stream', methods=['GET'])
+@token_required
+def stream_notifications():
+    """Server-Sent Events stream of new notifications and unread count changes
+
+    Reconnecting clients send Last-Event-ID (or `last_event_id`) to replay
+    notifications they missed. Needs a threaded or gevent server (see
+    lib/notification_stream.py); elsewhere it answers 503 and clients poll.
+    """
+    if not concurrent_server(request.environ):
+        return jsonify({'error': 'Notification streaming needs a threaded or gevent worker'}), 503
+    
+    db = get_database()
+    user_id = ObjectId(request.current_user['user_id'])
+    broker = notification_stream.broker
+    broker.ensure_source(db)
+    
+    subscription = broker.subscribe(str(user_id))
+    if subscription is None:
+        response = jsonify({'error': 'Too many open notification streams, please retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '10'
+        return response
+    
+    last_event_id = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    
+    def events():
+        try:
+            yield 'retry: 5000\n\n'
+            # Subscribed before reading, so nothing created meanwhile is lost
+            last_sent = last_event_id
+            if last_event_id:
+                for notification in db.notifications.find(
+                    {'user_id': user_id, '_id': {'$gt': last_event_id}}
+                ).sort('_id', 1).limit(100):
+                    last_sent = notification['_id']
+                    yield format_sse('notification', serialize_notification(notification), str(notification['_id']))
+            yield format_sse('unread', {'count': notification_service.get_unread_count(db, user_id)})
+            
+            while not subscription.overflowed:
+                item = subscription.get(timeout=notification_stream.HEARTBEAT_SECONDS)
+                if item is None:
+                    yield ': keepalive\n\n'
+                    continue
+                # Unread changes queued together are sent as one count, read
+                # after them: it may already include changes queued before the
+                # initial count, so deltas are never added on top of it
+                delta = None
+                for event, data, event_id in [item] + subscription.drain():
+                    if event == 'unread':
+                        delta = (delta or 0) + data.get('delta', 0)
+                        continue
+                    if event_id and last_sent and ObjectId(event_id) <= last_sent:
+                        continue  # Already replayed
+                    yield format_sse(event, data, event_id)
+                if delta is not None:
+                    yield format_sse('unread', {'count': notification_service.get_unread_count(db, user_id), 'delta': delta})
+        finally:
+            subscription.close()
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @notifications_bp.route('/notifications/<notification_id>/read', methods=['POST'])
 @token_required
 def mark_notification_read(notification_id):
@@ -53,15 +116,7 @@ def mark_notification_read(notification_id):
         db = get_database()
         user_id = ObjectId(request.current_user['user_id'])
         
-        result = db.notifications.update_one(
-            {
-                '_id': ObjectId(notification_id),
-                'user_id': user_id
-            },
-            {'$set': {'read': True, 'read_at': datetime.utcnow()}}
-        )
-        
-        if result.matched_count == 0:
+        if not notification_service.mark_read(db, user_id, notification_id):
             return jsonify({'error': 'Notification not found'}), 404
         
         return jsonify({'message': 'Notification marked as read'}), 200
@@ -77,37 +132,11 @@ def mark_all_read():
         db = get_database()
         user_id = ObjectId(request.current_user['user_id'])
         
-        result = db.notifications.update_many(
-            {
-                'user_id': user_id,
-                'read': False
-            },
-            {'$set': {'read': True, 'read_at': datetime.utcnow()}}
-        )
+        modified_count = notification_service.mark_all_read(db, user_id)
         
         return jsonify({
-            'message': f'{result.modified_count} notifications marked as read'
+            'message': f'{modified_count} notifications marked as read'
         }), 200
     except Exception as e:
         print(f"Error marking all notifications as read: {e}")
         return jsonify({'error': f'Failed to mark all as read: {str(e)}'}), 500
-
-def create_notification(user_id, title, message, type='info', booking_id=None, link=None):
-    """Helper function to create a notification"""
-    try:
-        db = get_database()
-        notification = {
-            'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
-            'title': title,
-            'message': message,
-            'type': type,  # 'info', 'success', 'warning', 'error'
-            'read': False,
-            'created_at': datetime.utcnow(),
-            'booking_id': ObjectId(booking_id) if booking_id else None,
-            'link': link
-        }
-        result = db.notifications.insert_one(notification)
-        return str(result.inserted_id)
-    except Exception as e:
-        print(f"Error creating notification: {e}")
-        return None
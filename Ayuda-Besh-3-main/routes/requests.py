@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from lib.mongodb import get_database
 from lib.decorators import token_required
+from lib.pagination import page_request, fetch_page, page_envelope
 from bson import ObjectId
 from datetime import datetime
 
@@ -56,9 +57,16 @@ def get_my_requests():
         db = get_database()
         requests_collection = db['service_requests']
         
-        requests = list(requests_collection.find(
-            {'customerId': user_id}
-        ).sort('createdAt', -1))
+        query = {'customerId': user_id}
+        paginate, limit, cursor = page_request(request.args)
+        next_cursor = None
+        if paginate:
+            try:
+                requests, next_cursor = fetch_page(requests_collection, query, limit, cursor, field='createdAt')
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        else:
+            requests = list(requests_collection.find(query).sort('createdAt', -1))
         
         # Convert ObjectId to string for JSON serialization
         for req in requests:
@@ -68,6 +76,8 @@ def get_my_requests():
             if 'updatedAt' in req:
                 req['updatedAt'] = req['updatedAt'].isoformat() if hasattr(req['updatedAt'], 'isoformat') else str(req['updatedAt'])
         
+        if paginate:
+            return jsonify(page_envelope('requests', requests, next_cursor)), 200
         return jsonify(requests), 200
         
     except Exception as error:
@@ -81,9 +91,16 @@ def get_pending_requests():
         db = get_database()
         requests_collection = db['service_requests']
         
-        requests = list(requests_collection.find(
-            {'status': 'pending'}
-        ).sort('createdAt', -1))
+        query = {'status': 'pending'}
+        paginate, limit, cursor = page_request(request.args)
+        next_cursor = None
+        if paginate:
+            try:
+                requests, next_cursor = fetch_page(requests_collection, query, limit, cursor, field='createdAt')
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        else:
+            requests = list(requests_collection.find(query).sort('createdAt', -1))
         
         # Convert ObjectId to string for JSON serialization
         for req in requests:
@@ -93,6 +110,8 @@ def get_pending_requests():
             if 'updatedAt' in req:
                 req['updatedAt'] = req['updatedAt'].isoformat() if hasattr(req['updatedAt'], 'isoformat') else str(req['updatedAt'])
         
+        if paginate:
+            return jsonify(page_envelope('requests', requests, next_cursor)), 200
         return jsonify(requests), 200
         
     except Exception as error:
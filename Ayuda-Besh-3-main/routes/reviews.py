@@ -3,31 +3,34 @@
 from flask import Blueprint, request, jsonify
 from lib.mongodb import get_database
 from lib.decorators import token_required
-from datetime import datetime
+from lib.pagination import MAX_PAGE_SIZE, page_request, fetch_page
+from lib.ratings import get_rating_summary
+from lib.joins import Ref, join_refs
 from bson.objectid import ObjectId
 
 reviews_bp = Blueprint('reviews', __name__)
 
-def create_notification(user_id, title, message, type='info', booking_id=None):
-    """Helper to create notifications"""
-    try:
-        db = get_database()
-        notification = {
-            'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
-            'title': title,
-            'message': message,
-            'type': type,
-            'read': False,
-            'created_at': datetime.utcnow(),
-            'booking_id': ObjectId(booking_id) if booking_id else None
-        }
-        db.notifications.insert_one(notification)
-    except Exception as e:
-        print(f"Error creating notification: {e}")
+def _format_review(review: dict) -> dict:
+    return {
+        'review_id': str(review['_id']),
+        'booking_id': str(review['booking_id']),
+        'customer_id': str(review['customer_id']),
+        'customer_name': review.get('customer_name', 'Anonymous'),
+        'rating': review.get('rating', 0),
+        'review': review.get('review'),
+        'created_at': review.get('created_at').isoformat() if review.get('created_at') else None,
+        'updated_at': review.get('updated_at').isoformat() if review.get('updated_at') else None
+    }
 
 @reviews_bp.route('/provider/<provider_id>', methods=['GET'])
 def get_provider_reviews(provider_id):
-    """Get all reviews and ratings for a specific provider"""
+    """Get all reviews and ratings for a specific provider
+
+    The summary comes from the provider's rating aggregates (lib.ratings) and the
+    list from the reviews collection. `page`/`limit` pages by offset; `cursor`
+    (empty for the first page, then `next_cursor`) pages by keyset instead, so
+    deep pages cost the same as the first.
+    """
     try:
         db = get_database()
         
@@ -38,90 +41,43 @@ def get_provider_reviews(provider_id):
             return jsonify({'error': 'Invalid provider ID'}), 400
         
         # Check if provider exists
-        provider = db.users.find_one({'_id': provider_obj_id, 'role': 'provider'})
+        provider = db.users.find_one(
+            {'_id': provider_obj_id, 'role': 'provider'},
+            {'username': 1, 'fullName': 1, 'rating_stats': 1}
+        )
         if not provider:
             return jsonify({'error': 'Provider not found'}), 404
         
-        # Get query parameters for pagination
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
-        skip = (page - 1) * limit
-        
-        # Get reviews from reviews collection
-        reviews = list(db.reviews.find(
-            {'provider_id': provider_obj_id}
-        ).sort('created_at', -1).skip(skip).limit(limit))
-        
-        # Also get ratings from bookings (for backward compatibility)
-        bookings_with_ratings = list(db.bookings.find({
-            'provider_id': provider_obj_id,
-            'rating': {'$exists': True, '$ne': None},
-            'status': 'completed'
-        }).sort('rated_at', -1))
-        
-        # Combine and format reviews
-        all_reviews = []
-        booking_ids_in_reviews = {str(r['booking_id']) for r in reviews}
-        
-        # Add reviews from reviews collection
-        for review in reviews:
-            all_reviews.append({
-                'review_id': str(review['_id']),
-                'booking_id': str(review['booking_id']),
-                'customer_id': str(review['customer_id']),
-                'customer_name': review.get('customer_name', 'Anonymous'),
-                'rating': review.get('rating', 0),
-                'review': review.get('review'),
-                'created_at': review.get('created_at').isoformat() if review.get('created_at') else None,
-                'updated_at': review.get('updated_at').isoformat() if review.get('updated_at') else None
-            })
-        
-        # Add ratings from bookings that don't have reviews yet (backward compatibility)
-        for booking in bookings_with_ratings:
-            booking_id_str = str(booking['_id'])
-            if booking_id_str not in booking_ids_in_reviews:
-                # Get customer info
-                customer = db.users.find_one({'_id': booking['customer_id']})
-                customer_name = customer.get('fullName', 'Anonymous') if customer else 'Anonymous'
-                
-                all_reviews.append({
-                    'review_id': None,
-                    'booking_id': booking_id_str,
-                    'customer_id': str(booking['customer_id']),
-                    'customer_name': customer_name,
-                    'rating': booking.get('rating', 0),
-                    'review': booking.get('review'),
-                    'created_at': booking.get('rated_at').isoformat() if booking.get('rated_at') else None,
-                    'updated_at': booking.get('rated_at').isoformat() if booking.get('rated_at') else None
-                })
-        
-        # Sort all reviews by created_at (most recent first)
-        all_reviews.sort(key=lambda x: x['created_at'] or '', reverse=True)
-        
-        # Calculate statistics
-        total_reviews = len(all_reviews)
-        ratings_only = [r['rating'] for r in all_reviews if r['rating']]
-        avg_rating = round(sum(ratings_only) / len(ratings_only), 2) if ratings_only else 0
-        
-        # Rating distribution
-        rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating in ratings_only:
-            if 1 <= rating <= 5:
-                rating_distribution[int(rating)] += 1
-        
-        return jsonify({
+        # Summary from the provider's maintained rating aggregates
+        summary = get_rating_summary(db, provider)
+        body = {
             'provider_id': provider_id,
             'provider_name': provider.get('username', provider.get('fullName', 'Unknown')),
-            'total_reviews': total_reviews,
-            'average_rating': avg_rating,
-            'rating_distribution': rating_distribution,
-            'reviews': all_reviews,
-            'pagination': {
+            **summary
+        }
+        
+        query = {'provider_id': provider_obj_id}
+        if 'cursor' in request.args:
+            _, limit, cursor = page_request(request.args, default_limit=10)
+            try:
+                reviews, next_cursor = fetch_page(db.reviews, query, limit, cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            body['next_cursor'] = next_cursor
+        else:
+            # Get query parameters for pagination
+            page = max(int(request.args.get('page', 1)), 1)
+            limit = min(max(int(request.args.get('limit', 10)), 1), MAX_PAGE_SIZE)
+            reviews = list(db.reviews.find(query).sort([('created_at', -1), ('_id', -1)]).skip((page - 1) * limit).limit(limit))
+            body['pagination'] = {
                 'page': page,
                 'limit': limit,
-                'total': total_reviews
+                # Ratings without a review document count in the summary, not here
+                'total': db.reviews.count_documents(query)
             }
-        }), 200
+        
+        body['reviews'] = [_format_review(review) for review in reviews]
+        return jsonify(body), 200
         
     except Exception as e:
         print(f"Error fetching provider reviews: {e}")
@@ -203,10 +159,14 @@ def get_my_reviews():
             {'customer_id': user_id}
         ).sort('created_at', -1))
         
-        # Enhance with provider and booking info
+        # Enhance with provider and booking info, one query per collection
+        join_refs(db, reviews, [
+            Ref('provider_id', 'users', ('username', 'fullName'), 'provider'),
+            Ref('booking_id', 'bookings', ('service_type',), 'booking')
+        ])
         for review in reviews:
-            provider = db.users.find_one({'_id': review['provider_id']})
-            booking = db.bookings.find_one({'_id': review['booking_id']})
+            provider = review.pop('provider')
+            booking = review.pop('booking')
             
             review['_id'] = str(review['_id'])
             review['provider_id'] = str(review['provider_id'])
@@ -1,13 +1,89 @@
 # routes/services.py
 
-from flask import Blueprint, request, jsonify
+import hashlib
+from flask import Blueprint, request, jsonify, current_app, redirect
+from werkzeug.wsgi import wrap_file
 from lib.mongodb import get_database
 from lib.decorators import token_required
+from lib.booking_stats import record_booking_created
+from lib.booking_slots import MAX_DURATION_MINUTES, DEFAULT_DURATION_MINUTES, SlotUnavailable, reserve_slots, release_slots
+from lib.catalog import get_service_catalog, bump_catalog_version
+from lib.notifications import create_notification, notify_admins
+from lib.user_directory import refresh_search_keys
+from lib.media import (ALLOWED_EXTENSIONS, MAX_PICTURE_BYTES, THUMBNAIL_SIZES, store_profile_picture,
+                       open_profile_picture, profile_picture_url, profile_picture_version)
 from datetime import datetime
+from math import radians, cos, sin, asin, sqrt
 from bson.objectid import ObjectId
 
 services_bp = Blueprint('services', __name__)
 
+def get_provider_ratings(db, provider_ids):
+    """Average rating per provider from rated completed bookings, keyed by provider ObjectId"""
+    if not provider_ids:
+        return {}
+    pipeline = [
+        {'$match': {
+            'provider_id': {'$in': provider_ids},
+            'status': 'completed',
+            'rating': {'$exists': True, '$ne': None}
+        }},
+        {'$group': {'_id': '$provider_id', 'avg_rating': {'$avg': '$rating'}}}
+    ]
+    return {row['_id']: round(row['avg_rating'], 2) for row in db.bookings.aggregate(pipeline)}
+
+def geo_point(latitude, longitude):
+    """GeoJSON point for the 2dsphere-indexed users.geo_location field (longitude first)"""
+    return {'type': 'Point', 'coordinates': [float(longitude), float(latitude)]}
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points on Earth in km"""
+    latitude1, longitude1, latitude2, longitude2 = map(radians, [latitude1, longitude1, latitude2, longitude2])
+    a = sin((latitude2 - latitude1) / 2) ** 2 + cos(latitude1) * cos(latitude2) * sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * asin(sqrt(a)) * 6371  # Radius of earth in kilometers
+
+def nearby_providers_pipeline(query, latitude, longitude, max_distance_km, projection):
+    """$geoNear pipeline: providers matching query within max_distance_km and their own
+    service_radius (km, default 50), nearest first, with distance_m in meters"""
+    # maxDistance keeps the 2dsphere index scan to the search area and each
+    # provider's service_radius bounds the match within it
+    return [
+        {'$geoNear': {
+            'near': geo_point(latitude, longitude),
+            'key': 'geo_location',
+            'distanceField': 'distance_m',
+            'maxDistance': max_distance_km * 1000,
+            'spherical': True,
+            'query': query
+        }},
+        {'$match': {'$expr': {
+            '$lte': ['$distance_m', {'$multiply': [{'$ifNull': ['$service_radius', 50]}, 1000]}]
+        }}},
+        {'$project': projection}
+    ]
+
+def providers_without_geo_location(db, query, latitude, longitude, max_distance_km, projection):
+    """Providers matching query that $geoNear cannot see because they have no geo_location.
+
+    Legacy latitude/longitude fields (until `manage.py backfill-geo` runs) get the
+    same radius filter and a distance computed here; providers with no
+    coordinates at all are kept with distance_km None.
+    """
+    providers = []
+    for provider in db.users.find(dict(query, geo_location={'$exists': False}), projection):
+        provider_latitude = provider.get('latitude')
+        provider_longitude = provider.get('longitude')
+        if isinstance(provider_latitude, (int, float)) and isinstance(provider_longitude, (int, float)):
+            distance = haversine_km(latitude, longitude, provider_latitude, provider_longitude)
+            service_radius = provider.get('service_radius')
+            if distance > min(50 if service_radius is None else service_radius, max_distance_km):
+                continue
+            provider['distance_km'] = round(distance, 2)
+        else:
+            provider['distance_km'] = None
+        providers.append(provider)
+    return providers
+
 @services_bp.route('/services', methods=['GET'])
 def get_services():
     """Get all available service categories"""
@@ -36,7 +112,6 @@ def get_providers():
     location = request.args.get('location')
     latitude = request.args.get('latitude', type=float)
     longitude = request.args.get('longitude', type=float)
-    radius_km = request.args.get('radius', type=float, default=50)  # Default 50km radius
     
     query = {
         'role': 'provider',
@@ -52,62 +127,36 @@ def get_providers():
         # Simple text-based location matching
         query['location'] = {'$regex': location, '$options': 'i'}
     
-    providers = list(db.users.find(query, {
+    projection = {
         'password': 0,
-        'is_verified': 0
-    }))
+        'is_verified': 0,
+        'geo_location': 0
+    }
     
     # If coordinates provided, filter by distance
     if latitude and longitude:
-        from math import radians, cos, sin, asin, sqrt
-        
-        def haversine(lon1, lat1, lon2, lat2):
-            """Calculate distance between two points on Earth in km"""
-            lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            r = 6371  # Radius of earth in kilometers
-            return c * r
-        
-        # Filter providers by distance (if they have coordinates)
-        filtered_providers = []
+        # Radius filter and distance sort are done server-side by $geoNear on the 2dsphere index
+        max_distance_km = current_app.config.get('PROVIDER_SEARCH_MAX_KM', 100)
+        providers = list(db.users.aggregate(
+            nearby_providers_pipeline(query, latitude, longitude, max_distance_km, projection)
+        ))
         for provider in providers:
-            provider_lat = provider.get('latitude')
-            provider_lon = provider.get('longitude')
-            
-            if provider_lat and provider_lon:
-                distance = haversine(longitude, latitude, provider_lon, provider_lat)
-                provider['distance_km'] = round(distance, 2)
-                
-                # Check if within service radius
-                service_radius = provider.get('service_radius', 50)
-                if distance <= service_radius:
-                    filtered_providers.append(provider)
-            else:
-                # If provider doesn't have coordinates, include them anyway
-                provider['distance_km'] = None
-                filtered_providers.append(provider)
+            provider['distance_km'] = round(provider.pop('distance_m') / 1000, 2)
         
-        providers = filtered_providers
-        # Sort by distance
-        providers.sort(key=lambda x: x.get('distance_km') or float('inf'))
+        # Providers without geo_location are filtered here; those without any
+        # coordinates are included anyway, after the sorted matches
+        providers.extend(providers_without_geo_location(db, query, latitude, longitude, max_distance_km, projection))
+        providers.sort(key=lambda provider: float('inf') if provider['distance_km'] is None else provider['distance_km'])
+    else:
+        providers = list(db.users.find(query, projection))
+    
+    # Get average ratings for all listed providers in a single aggregation
+    ratings = get_provider_ratings(db, [provider['_id'] for provider in providers])
     
     # Convert ObjectId to string and add rating
     for provider in providers:
+        provider['rating'] = ratings.get(provider['_id'], 0)
         provider['_id'] = str(provider['_id'])
-        # Get average rating from bookings
-        provider_bookings = list(db.bookings.find({
-            'provider_id': ObjectId(provider['_id']),
-            'status': 'completed',
-            'rating': {'$exists': True, '$ne': None}
-        }))
-        if provider_bookings:
-            avg_rating = sum(b.get('rating', 0) for b in provider_bookings) / len(provider_bookings)
-            provider['rating'] = round(avg_rating, 2)
-        else:
-            provider['rating'] = 0
     
     return jsonify(providers), 200
 
@@ -147,22 +196,14 @@ def book_service():
             response.headers['Content-Type'] = 'application/json'
             return response, 400
         
-        # SECURITY: Prevent double booking - check if provider already has a booking at this time
-        provider_id_obj = ObjectId(data['provider_id'])
-        existing_booking = db.bookings.find_one({
-            'provider_id': provider_id_obj,
-            'booking_time': booking_time,
-            'status': {'$in': ['pending', 'accepted']}  # Only check active bookings
-        })
-        
-        if existing_booking:
-            response = jsonify({
-                'error': 'This time slot is already booked. Please select a different time.'
-            })
+        duration_minutes = int(data.get('duration_minutes') or DEFAULT_DURATION_MINUTES)
+        if not 0 < duration_minutes <= MAX_DURATION_MINUTES:
+            response = jsonify({'error': f'duration_minutes must be between 1 and {MAX_DURATION_MINUTES}'})
             response.headers['Content-Type'] = 'application/json'
-            return response, 409  # 409 Conflict
+            return response, 400
         
         booking = {
+            '_id': ObjectId(),
             'customer_id': ObjectId(user_id),
             'customer_name': data.get('customer_name', ''),
             'customer_email': data.get('customer_email', ''),
@@ -170,6 +211,7 @@ def book_service():
             'provider_id': ObjectId(data['provider_id']),
             'service_type': data['service_type'],
             'booking_time': booking_time,
+            'duration_minutes': duration_minutes,
             'service_address': data.get('service_address', ''),
             'special_instructions': data.get('special_instructions', ''),
             'status': 'pending',
@@ -178,23 +220,33 @@ def book_service():
             'created_at': datetime.utcnow()
         }
         
-        result = db.bookings.insert_one(booking)
+        # SECURITY: Prevent double booking - the unique slot index rejects any overlap atomically
+        try:
+            reserve_slots(db, booking)
+        except SlotUnavailable:
+            response = jsonify({
+                'error': 'This time slot is already booked. Please select a different time.'
+            })
+            response.headers['Content-Type'] = 'application/json'
+            return response, 409  # 409 Conflict
+        
+        try:
+            result = db.bookings.insert_one(booking)
+        except Exception:
+            release_slots(db, booking['_id'])
+            raise
         booking_id = str(result.inserted_id)
+        record_booking_created(db, booking)
         
         # Create notification for provider
-        try:
-            notification = {
-                'user_id': ObjectId(data['provider_id']),
-                'title': 'New Booking Request',
-                'message': f'You have a new booking request for {data["service_type"]} from {data.get("customer_name", "a customer")}.',
-                'type': 'info',
-                'read': False,
-                'created_at': datetime.utcnow(),
-                'booking_id': ObjectId(booking_id)
-            }
-            db.notifications.insert_one(notification)
-        except Exception as e:
-            print(f"Error creating notification: {e}")
+        create_notification(
+            data['provider_id'],
+            'New Booking Request',
+            f'You have a new booking request for {data["service_type"]} from {data.get("customer_name", "a customer")}.',
+            'info',
+            booking_id,
+            db=db
+        )
         
         response = jsonify({'booking_id': booking_id, 'message': 'Booking created successfully'})
         response.headers['Content-Type'] = 'application/json'
@@ -237,16 +289,14 @@ def update_provider_profile():
     if 'profile_picture' in request.files:
         from werkzeug.utils import secure_filename
         import os
-        import base64
         
         file = request.files['profile_picture']
         if file and file.filename:
             # Validate file type
-            allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
             filename = secure_filename(file.filename)
             file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
             
-            if file_ext not in allowed_extensions:
+            if file_ext not in ALLOWED_EXTENSIONS:
                 return jsonify({'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, WEBP'}), 400
             
             # Check file size (5MB limit)
@@ -254,21 +304,22 @@ def update_provider_profile():
             file_size = file.tell()
             file.seek(0)
             
-            if file_size > 5 * 1024 * 1024:
+            if file_size > MAX_PICTURE_BYTES:
                 return jsonify({'error': 'File size must be less than 5MB'}), 400
             
-            # Read file and convert to base64 for storage (or save to filesystem)
-            # For simplicity, we'll store as base64 data URL
-            file_data = file.read()
-            file_base64 = base64.b64encode(file_data).decode('utf-8')
-            mime_type = file.content_type or 'image/jpeg'
-            profile_picture_url = f'data:{mime_type};base64,{file_base64}'
-            
-            update_data['profile_picture'] = profile_picture_url
+            # Store the image (and its thumbnails) in GridFS; this also points the
+            # user document at its URL
+            try:
+                store_profile_picture(db, user_id, file.read(), file.content_type or 'image/jpeg')
+                update_data['profile_picture_updated_at'] = datetime.utcnow()
+            except Exception as e:
+                print(f"Error storing profile picture: {e}")
+                return jsonify({'error': 'Failed to store profile picture'}), 500
     
     # Handle JSON data (for non-file updates)
+    data = {}
     if request.is_json:
-        data = request.get_json()
+        data = request.get_json() or {}
         
         # Service-related fields (for providers)
         if role == 'provider':
@@ -280,6 +331,17 @@ def update_provider_profile():
                 update_data['service_radius'] = data.get('service_radius', 0)
             if 'equipment' in data:
                 update_data['equipment'] = data.get('equipment', '')
+            if 'latitude' in data and 'longitude' in data:
+                try:
+                    latitude = float(data['latitude'])
+                    longitude = float(data['longitude'])
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'Invalid latitude/longitude'}), 400
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                    return jsonify({'error': 'Latitude/longitude out of range'}), 400
+                update_data['latitude'] = latitude
+                update_data['longitude'] = longitude
+                update_data['geo_location'] = geo_point(latitude, longitude)
     
         # Common fields
         if 'location' in data:
@@ -325,6 +387,10 @@ def update_provider_profile():
     )
     
     if result.matched_count > 0:
+        if role == 'provider':
+            bump_catalog_version(db)
+        if 'fullName' in update_data or 'email' in update_data:
+            refresh_search_keys(db, user_id)
         # Return updated user data
         updated_user = db.users.find_one(
             {'_id': user_id},
@@ -338,70 +404,92 @@ def update_provider_profile():
         }), 200
     return jsonify({'error': 'Failed to update profile'}), 500
 
+@services_bp.route('/users/<user_id>/profile-picture', methods=['GET'])
+def get_profile_picture(user_id):
+    """Serve a user's profile picture (`size=small|medium` for thumbnails)"""
+    try:
+        user_obj_id = ObjectId(user_id)
+    except Exception:
+        return jsonify({'error': 'Invalid user ID'}), 400
+    
+    size = request.args.get('size', 'original')
+    if size != 'original' and size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f'Invalid size. Use original, {", ".join(THUMBNAIL_SIZES)}'}), 400
+    
+    # A versioned URL (?v=<hash>) is only ever answered with that exact content;
+    # a bare URL serves whatever users.profile_picture points at
+    db = get_database()
+    version = request.args.get('v')
+    picture = open_profile_picture(db, user_obj_id, size, version)
+    if picture is None:
+        current_version = profile_picture_version(db, user_obj_id) if version else None
+        if current_version and current_version != version:
+            # Replaced since this URL was issued: send the client to the current picture
+            return redirect(profile_picture_url(user_obj_id, current_version, size if size != 'original' else None))
+        return jsonify({'error': 'Profile picture not found'}), 404
+    
+    metadata = picture.metadata or {}
+    response = current_app.response_class(
+        wrap_file(request.environ, picture),
+        mimetype=metadata.get('contentType', 'image/jpeg'),
+        direct_passthrough=True
+    )
+    response.content_length = picture.length
+    response.last_modified = picture.upload_date
+    response.set_etag(metadata.get('etag') or str(picture._id))
+    # Versioned URLs (?v=<hash>) never change content; bare URLs must revalidate
+    if request.args.get('v'):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+    # Handles If-None-Match / If-Modified-Since (304) and Range (206)
+    return response.make_conditional(request, accept_ranges=True, complete_length=picture.length)
+
 @services_bp.route('/available-services', methods=['GET'])
 def get_available_services():
-    """Get all services from verified providers for customer dashboard"""
+    """Get all services from verified providers for customer dashboard
+
+    Optional query parameters: `service_type`, `location` (substring match)
+    and `page`/`limit`, which return {'services', 'pagination'} instead of a list.
+    """
     db = get_database()
+    service_type = request.args.get('service_type', '').strip()
+    location = request.args.get('location', '').strip().lower()
+    page = request.args.get('page', 1, type=int)
+    limit = request.args.get('limit', type=int)
     
-    # Get all verified providers
-    providers = list(db.users.find(
-        {'role': 'provider', 'is_verified': True},
-        {'password': 0}
-    ))
-    
-    # Get service categories for descriptions
-    service_categories = {}
-    for service in db.services.find({}):
-        service_categories[service.get('category', '')] = {
-            'name': service.get('name', ''),
-            'description': service.get('description', '')
-        }
+    catalog = get_service_catalog(db, ttl=current_app.config.get('SERVICE_CATALOG_CACHE_TTL'))
     
-    # Build list of available services (one entry per provider-service combination)
-    available_services = []
-    for provider in providers:
-        provider_id = str(provider['_id'])
-        services_offered = provider.get('services_offered', [])
-        location = provider.get('location', 'Not specified')
-        description = provider.get('description', '')
-        hourly_rate = provider.get('hourly_rate', 500)
-        company_name = provider.get('username', 'Unknown Company')  # Company name (username)
-        owner_name = provider.get('fullName', 'Unknown Owner')  # Owner's full name
-        rating = provider.get('rating', 0)
+    # The response only depends on the catalog build and the query string
+    etag = hashlib.sha1(
+        f"{catalog['version']}:{catalog['built_at']}:{request.query_string.decode()}".encode('utf-8')
+    ).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        available_services = catalog['entries']
+        if service_type:
+            available_services = [s for s in available_services if s['service_type'] == service_type]
+        if location:
+            available_services = [s for s in available_services if location in (s['location'] or '').lower()]
         
-        # If provider has services_offered, create entry for each service
-        if services_offered and len(services_offered) > 0:
-            for service_type in services_offered:
-                service_info = service_categories.get(service_type, {})
-                service_name = service_info.get('name', service_type.replace('_', ' ').title())
-                service_description = service_info.get('description', description or 'Professional service provider')
-                
-                available_services.append({
-                    'provider_id': provider_id,
-                    'company_name': company_name,
-                    'owner_name': owner_name,
-                    'service_type': service_type,
-                    'service_name': service_name,
-                    'description': description or service_description,
-                    'location': location,
-                    'hourly_rate': hourly_rate,
-                    'rating': rating
-                })
-        else:
-            # If provider has no services specified, show them as "General Services"
-            available_services.append({
-                'provider_id': provider_id,
-                'company_name': company_name,
-                'owner_name': owner_name,
-                'service_type': 'general',
-                'service_name': 'General Services',
-                'description': description or 'Professional service provider',
-                'location': location,
-                'hourly_rate': hourly_rate,
-                'rating': rating
+        if limit:
+            limit = min(max(limit, 1), 200)
+            page = max(page, 1)
+            response = jsonify({
+                'services': available_services[(page - 1) * limit:page * limit],
+                'pagination': {'page': page, 'limit': limit, 'total': len(available_services)}
             })
+        else:
+            response = jsonify(available_services)
     
-    return jsonify(available_services), 200
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
 
 @services_bp.route('/delete-account', methods=['POST'])
 @token_required
@@ -453,33 +541,18 @@ def delete_account():
         
         if result.matched_count == 0:
             return jsonify({'error': 'Failed to update account'}), 500
+        if role == 'provider':
+            bump_catalog_version(db)
         
-        # Create notification for all admins about account deletion request
-        def create_notification(user_id, title, message, type='info'):
-            """Helper to create notifications"""
-            try:
-                notification = {
-                    'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
-                    'title': title,
-                    'message': message,
-                    'type': type,
-                    'read': False,
-                    'created_at': datetime.utcnow()
-                }
-                db.notifications.insert_one(notification)
-            except Exception as e:
-                print(f"Error creating notification: {e}")
-        
-        admins = list(db.users.find({'role': 'admin'}))
+        # Notify all admins about the account deletion request
         user_name = user.get('fullName', user.get('username', 'Unknown'))
         user_role = user.get('role', 'user')
-        for admin in admins:
-            create_notification(
-                admin['_id'],
-                'Account Deletion Request',
-                f'User {user_name} ({user_role}) has requested account deletion. Reason: {deletion_reason}',
-                'warning'
-            )
+        notify_admins(
+            'Account Deletion Request',
+            f'User {user_name} ({user_role}) has requested account deletion. Reason: {deletion_reason}',
+            'warning',
+            db=db
+        )
         
         return jsonify({
             'message': 'Account deletion requested. Your account has been disabled and is pending admin approval.',
@@ -0,0 +1,77 @@
+// Live notifications for the dashboards over Server-Sent Events (the token
+// cookie authenticates the stream). Pages provide loadNotifications(),
+// displayNotifications(list) and updateNotificationBadge(count), and pass every
+// full load through setNotificationState so pushed events can be applied locally.
+// Falls back to polling every 30 seconds when the stream is unavailable.
+
+const NOTIFICATION_POLL_INTERVAL = 30000;
+const NOTIFICATION_LIST_LIMIT = 100;
+// Coalesces the burst of read events sent by "Mark all read" into one reload
+const NOTIFICATION_REFRESH_DELAY = 500;
+
+let notificationItems = [];
+let notificationUnread = 0;
+let notificationRefreshTimer = null;
+let notificationPollTimer = null;
+
+function setNotificationState(notifications, unreadCount) {
+    notificationItems = notifications.slice(0, NOTIFICATION_LIST_LIMIT);
+    notificationUnread = Math.max(unreadCount, 0);
+    displayNotifications(notificationItems);
+    updateNotificationBadge(notificationUnread);
+}
+
+function addPushedNotification(notification) {
+    // A full load may already have picked it up. The badge is left to the
+    // unread event that follows, which carries the absolute count
+    if (notificationItems.some(item => item._id === notification._id)) {
+        return;
+    }
+    setNotificationState([notification, ...notificationItems], notificationUnread);
+}
+
+function scheduleNotificationRefresh() {
+    clearTimeout(notificationRefreshTimer);
+    notificationRefreshTimer = setTimeout(loadNotifications, NOTIFICATION_REFRESH_DELAY);
+}
+
+function pollNotifications() {
+    if (notificationPollTimer === null) {
+        loadNotifications();
+        notificationPollTimer = setInterval(loadNotifications, NOTIFICATION_POLL_INTERVAL);
+    }
+}
+
+function subscribeToNotifications() {
+    if (!window.EventSource) {
+        pollNotifications();
+        return;
+    }
+    const source = new EventSource('/api/notifications/stream');
+    let failures = 0;
+    source.addEventListener('notification', (event) => {
+        failures = 0;
+        addPushedNotification(JSON.parse(event.data));
+    });
+    source.addEventListener('unread', (event) => {
+        failures = 0;
+        const data = JSON.parse(event.data);
+        // Always the absolute count: sent on every (re)connect, after any
+        // replayed notifications, and after every change
+        notificationUnread = Math.max(data.count, 0);
+        updateNotificationBadge(notificationUnread);
+        if (data.delta < 0) {
+            // Reads change the list too
+            scheduleNotificationRefresh();
+        }
+    });
+    source.onerror = () => {
+        failures += 1;
+        // The browser gives up for good on an HTTP error (503 when the server is
+        // at its stream limit, 401 once the cookie expires); otherwise it retries
+        if (source.readyState === EventSource.CLOSED || failures >= 5) {
+            source.close();
+            pollNotifications();
+        }
+    };
+}
@@ -0,0 +1,64 @@
+# tests/conftest.py
+#
+# Tests run the real app against an in-memory mongomock database, so they
+# need no MongoDB server: `pip install -r requirements-dev.txt`, then `pytest`.
+
+import os
+
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/ayudabesh')
+# Hash in-process and keep the outbox dispatcher thread out of the tests
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['OUTBOX_DISPATCHER'] = 'False'
+
+import threading
+from collections import Counter
+import mongomock
+import pytest
+import lib.mongodb
+from lib.auth import generate_token
+
+@pytest.fixture
+def db(monkeypatch):
+    """Empty in-memory database with the registry indexes, installed as the app database"""
+    database = mongomock.MongoClient().ayudabesh
+    lib.mongodb.ensure_indexes(database)
+    monkeypatch.setattr(lib.mongodb, 'db', database)
+    return database
+
+@pytest.fixture
+def app(db, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'init_db', lambda flask_app: None)
+    flask_app = app_module.create_app()
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def auth_header(user_id, role='customer') -> dict:
+    return {'Authorization': f'Bearer {generate_token(str(user_id), role)}'}
+
+QUERY_METHODS = ('find', 'find_one', 'aggregate', 'count_documents', 'distinct')
+
+@pytest.fixture
+def query_counter(monkeypatch):
+    """Counter of read operations per (collection, method) issued while a test runs"""
+    counts = Counter()
+    # mongomock implements some methods on top of others (find_one calls find);
+    # only the outermost call is a round trip
+    nested = threading.local()
+    for method in QUERY_METHODS:
+        original = getattr(mongomock.collection.Collection, method)
+        def counted(self, *args, _original=original, _method=method, **kwargs):
+            if getattr(nested, 'active', False):
+                return _original(self, *args, **kwargs)
+            counts[(self.name, _method)] += 1
+            nested.active = True
+            try:
+                return _original(self, *args, **kwargs)
+            finally:
+                nested.active = False
+        monkeypatch.setattr(mongomock.collection.Collection, method, counted)
+    return counts
@@ -0,0 +1,285 @@
+from datetime import datetime, timedelta
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+import routes.admin
+from lib.booking_stats import SEEDED_MARKER_ID, booking_stats_seeded, record_booking_created, record_status_change
+from routes.admin import recent_completed_bookings_pipeline
+from conftest import auth_header
+
+DAY = datetime(2026, 3, 2)
+
+def add_booking(db, customer_id, provider_id, status='pending', price=100, hour=9):
+    booking = {
+        '_id': ObjectId(),
+        'customer_id': customer_id,
+        'provider_id': provider_id,
+        'service_type': 'cleaning',
+        'status': status,
+        'price': price,
+        'created_at': DAY.replace(hour=hour)
+    }
+    db.bookings.insert_one(booking)
+    return booking
+
+@pytest.fixture(autouse=True)
+def empty_stats_cache():
+    routes.admin._dashboard_stats_cache.clear()
+    yield
+    routes.admin._dashboard_stats_cache.clear()
+
+def daily_report(client, admin_id):
+    return client.get('/api/admin/reports/daily-bookings?date=2026-03-02', headers=auth_header(admin_id, 'admin')).get_json()
+
+def test_daily_report_reads_totals_from_rollups_and_names_in_one_query(client, db, query_counter):
+    admin_id = db.users.insert_one({'role': 'admin', 'username': 'admin'}).inserted_id
+    customer_id = db.users.insert_one({'role': 'customer', 'fullName': 'Ana Cruz', 'email': 'ana@example.com'}).inserted_id
+    provider_ids = [db.users.insert_one({'role': 'provider', 'username': f'pro{n}'}).inserted_id for n in range(5)]
+    for hour, provider_id in enumerate(provider_ids):
+        booking = add_booking(db, customer_id, provider_id, hour=hour)
+        record_booking_created(db, booking)
+    record_status_change(db, booking, 'pending', 'accepted')
+    db.bookings.update_one({'_id': booking['_id']}, {'$set': {'status': 'accepted'}})
+    query_counter.clear()
+    
+    report = daily_report(client, admin_id)
+    
+    assert report['total_bookings'] == 5
+    assert report['status_breakdown']['pending'] == 4
+    assert report['status_breakdown']['accepted'] == 1
+    assert {b['provider_name'] for b in report['bookings']} == {f'pro{n}' for n in range(5)}
+    assert {b['customer_email'] for b in report['bookings']} == {'ana@example.com'}
+    assert query_counter[('users', 'find')] == 1
+    assert query_counter[('users', 'find_one')] == 0
+
+def test_daily_report_counts_listed_bookings_before_rollups_are_backfilled(client, db):
+    admin_id = db.users.insert_one({'role': 'admin', 'username': 'admin'}).inserted_id
+    customer_id = db.users.insert_one({'role': 'customer', 'fullName': 'Ana Cruz'}).inserted_id
+    provider_id = db.users.insert_one({'role': 'provider', 'username': 'pro'}).inserted_id
+    add_booking(db, customer_id, provider_id, status='completed', price=250)
+    add_booking(db, customer_id, provider_id, status='pending', hour=10)
+    
+    report = daily_report(client, admin_id)
+    
+    assert report['total_bookings'] == len(report['bookings']) == 2
+    assert report['total_revenue'] == 250
+    assert report['status_breakdown']['completed'] == 1
+    assert report['status_breakdown']['pending'] == 1
+
+def dashboard(client):
+    routes.admin._dashboard_stats_cache.clear()
+    response = client.get('/api/admin/dashboard/stats', headers=auth_header(ObjectId(), 'admin'))
+    assert response.status_code == 200
+    return response.get_json()
+
+def mark_seeded(db, seeded=True):
+    db.counters.update_one({'_id': SEEDED_MARKER_ID}, {'$set': {'seeded': seeded}}, upsert=True)
+
+def test_booking_lifecycle_keeps_rollups_equal_to_the_raw_bookings(client, db):
+    assert booking_stats_seeded(db)  # No bookings yet: nothing to backfill
+    customer_id = db.users.insert_one({'role': 'customer', 'username': 'cora'}).inserted_id
+    provider_id = db.users.insert_one({'role': 'provider', 'username': 'pat', 'is_verified': True}).inserted_id
+    customer, provider = auth_header(customer_id), auth_header(provider_id, 'provider')
+    booking_ids = []
+    for hour in (9, 11, 13, 15):
+        response = client.post('/api/book', headers=customer, json={
+            'provider_id': str(provider_id), 'service_type': 'cleaning', 'price': 100,
+            'booking_time': f'2026-05-04T{hour:02d}:00:00'
+        })
+        assert response.status_code == 201, response.get_json()
+        booking_ids.append(response.get_json()['booking_id'])
+    for booking_id in booking_ids[:2]:
+        assert client.post(f'/api/{booking_id}/accept', headers=provider).status_code == 200
+    assert client.post(f'/api/{booking_ids[0]}/update-price', headers=provider, json={'final_price': 150}).status_code == 200
+    assert client.post(f'/api/{booking_ids[0]}/complete', headers=provider).status_code == 200
+    assert client.post(f'/api/{booking_ids[2]}/reject', headers=provider, json={'reason': 'Busy'}).status_code == 200
+
+    from_rollups = dashboard(client)
+    mark_seeded(db, False)
+    from_bookings = dashboard(client)
+
+    assert from_rollups == from_bookings
+    assert from_rollups['total_bookings'] == from_rollups['today_bookings'] == from_rollups['month_bookings'] == 4
+    assert from_rollups['bookings_by_status'] == {
+        'pending': 1, 'accepted': 1, 'completed': 1, 'rejected': 1, 'cancelled': 0
+    }
+    assert from_rollups['total_revenue'] == from_rollups['today_revenue'] == from_rollups['month_revenue'] == 150
+
+def test_dashboard_counts_raw_bookings_until_rollups_are_seeded(client, db, query_counter):
+    now = datetime.utcnow()
+    # Written before the rollups existed: no booking_daily_stats rows
+    db.bookings.insert_many([
+        {'provider_id': ObjectId(), 'status': 'completed', 'price': 80, 'final_price': 100,
+         'created_at': now - timedelta(days=400), 'completed_at': now - timedelta(days=400)},
+        {'provider_id': ObjectId(), 'status': 'pending', 'price': 50, 'created_at': now},
+    ])
+
+    stats = dashboard(client)
+
+    assert not booking_stats_seeded(db)
+    assert (stats['total_bookings'], stats['today_bookings'], stats['total_revenue']) == (2, 1, 100)
+    assert stats['bookings_by_status']['completed'] == stats['bookings_by_status']['pending'] == 1
+    assert ('booking_daily_stats', 'aggregate') not in query_counter
+
+    mark_seeded(db)  # As rebuild_booking_stats does when it finishes
+    query_counter.clear()
+    assert dashboard(client)['total_bookings'] == 0  # No rows recorded in this test
+    assert query_counter[('booking_daily_stats', 'aggregate')] == 1
+
+def test_recent_bookings_pipeline_limits_each_provider_inside_the_lookup():
+    provider_ids = [ObjectId(), ObjectId()]
+    query = {'status': 'completed', 'provider_id': provider_ids[0], 'completed_at': {'$gte': datetime(2026, 1, 1)}}
+
+    pipeline = recent_completed_bookings_pipeline(provider_ids, query, 10)
+
+    assert pipeline[0] == {'$match': {'_id': {'$in': provider_ids}}}
+    lookup = pipeline[1]['$lookup']
+    assert (lookup['from'], lookup['let'], lookup['as']) == ('bookings', {'provider_id': '$_id'}, 'bookings')
+    match, sort, limit = lookup['pipeline'][:3]
+    assert match == {'$match': {
+        'status': 'completed', 'completed_at': {'$gte': datetime(2026, 1, 1)},
+        '$expr': {'$eq': ['$provider_id', '$$provider_id']}
+    }}
+    assert sort == {'$sort': {'completed_at': -1}}
+    assert limit == {'$limit': 10}
+
+@pytest.fixture
+def lookup_emulation(monkeypatch):
+    """mongomock has no $lookup with let/pipeline: run the per-provider sub-pipeline by hand"""
+    real_aggregate = mongomock.collection.Collection.aggregate
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        if self.name != 'users' or len(pipeline) < 2 or '$lookup' not in pipeline[1]:
+            return real_aggregate(self, pipeline, *args, **kwargs)
+        lookup = pipeline[1]['$lookup']
+        match, sort, limit, project = (stage for stage in lookup['pipeline'])
+        booking_match = {key: value for key, value in match['$match'].items() if key != '$expr'}
+        rows = []
+        for provider in self.find(pipeline[0]['$match'], {'_id': 1}):
+            bookings = self.database[lookup['from']].find(
+                dict(booking_match, provider_id=provider['_id']), project['$project']
+            ).sort(list(sort['$sort'].items())).limit(limit['$limit'])
+            rows.append({'_id': provider['_id'], 'bookings': list(bookings)})
+        return iter(rows)
+    monkeypatch.setattr(mongomock.collection.Collection, 'aggregate', aggregate)
+
+def test_earnings_report_lists_the_latest_ten_and_totals_everything(client, db, lookup_emulation):
+    customer_id = db.users.insert_one({'role': 'customer', 'fullName': 'Ana Cruz'}).inserted_id
+    provider_ids = [
+        db.users.insert_one({'role': 'provider', 'username': f'pro{n}', 'fullName': f'Pro {n}', 'is_verified': True}).inserted_id
+        for n in range(2)
+    ]
+    for n in range(12):
+        db.bookings.insert_one({'provider_id': provider_ids[0], 'customer_id': customer_id, 'status': 'completed',
+                                'service_type': 'cleaning', 'price': 10, 'created_at': DAY,
+                                'completed_at': DAY + timedelta(hours=n)})
+    db.bookings.insert_one({'provider_id': provider_ids[1], 'customer_id': customer_id, 'status': 'accepted',
+                            'price': 999, 'created_at': DAY})
+
+    response = client.get('/api/admin/reports/provider-earnings', headers=auth_header(ObjectId(), 'admin'))
+
+    assert response.status_code == 200
+    report = response.get_json()
+    busy, idle = report['providers']
+    assert (busy['company_name'], busy['total_jobs'], busy['total_earnings']) == ('pro0', 12, 120)
+    assert len(busy['earnings_breakdown']) == 10
+    assert busy['earnings_breakdown'][0]['completed_at'] == (DAY + timedelta(hours=11)).isoformat()
+    assert {row['customer_name'] for row in busy['earnings_breakdown']} == {'Ana Cruz'}
+    assert (idle['total_jobs'], idle['earnings_breakdown']) == (0, [])
+    assert report['total_platform_earnings'] == 120
+
+def test_dashboard_user_dispute_and_rating_metrics(client, db):
+    db.users.insert_many([
+        {'role': 'provider', 'username': 'verified', 'is_verified': True},
+        {'role': 'provider', 'username': 'new'},
+        {'role': 'provider', 'username': 'rejected', 'is_verified': False},
+        {'role': 'customer', 'username': 'cora'},
+        {'role': 'admin', 'username': 'admin'},
+    ])
+    db.disputes.insert_many([{'status': 'open'}, {'status': 'open'}, {'status': 'resolved'}])
+    db.bookings.insert_many([
+        {'status': 'completed', 'rating': 5, 'created_at': DAY},
+        {'status': 'completed', 'rating': 2, 'created_at': DAY},
+        {'status': 'completed', 'created_at': DAY},
+        {'status': 'cancelled', 'rating': 1, 'created_at': DAY},
+    ])
+
+    stats = dashboard(client)
+
+    assert (stats['active_providers'], stats['pending_providers'], stats['total_customers']) == (1, 2, 1)
+    assert (stats['open_disputes'], stats['total_disputes']) == (2, 3)
+    assert (stats['average_rating'], stats['total_ratings']) == (3.5, 2)
+
+def test_dashboard_makes_one_pass_per_collection(client, db, query_counter):
+    db.bookings.insert_one({'status': 'pending', 'created_at': DAY})
+    mark_seeded(db)
+
+    dashboard(client)
+
+    assert query_counter == {
+        ('counters', 'find_one'): 1,
+        ('booking_daily_stats', 'aggregate'): 1,
+        ('bookings', 'aggregate'): 1,
+        ('users', 'aggregate'): 1,
+        ('disputes', 'aggregate'): 1,
+    }
+
+def test_dashboard_is_cached_for_a_short_ttl(client, db, query_counter):
+    headers = auth_header(ObjectId(), 'admin')
+    first = client.get('/api/admin/dashboard/stats', headers=headers).get_json()
+    db.users.insert_one({'role': 'customer', 'username': 'late'})
+    query_counter.clear()
+
+    assert client.get('/api/admin/dashboard/stats', headers=headers).get_json() == first
+    assert sum(query_counter.values()) == 0
+
+    routes.admin._dashboard_stats_cache.clear()  # As when the TTL runs out
+    assert client.get('/api/admin/dashboard/stats', headers=headers).get_json()['total_customers'] == 1
+
+def test_dashboard_is_admin_only(client):
+    assert client.get('/api/admin/dashboard/stats', headers=auth_header(ObjectId())).status_code == 403
+
+@pytest.fixture
+def activity_data(db):
+    busy, earner, idle = db.users.insert_many([
+        {'role': 'provider', 'username': 'busy', 'fullName': 'Busy Bee', 'is_verified': True},
+        {'role': 'provider', 'username': 'earner', 'fullName': 'Big Earner', 'is_verified': True},
+        {'role': 'provider', 'username': 'idle', 'fullName': 'Idle Hands'},
+    ]).inserted_ids
+    db.bookings.insert_many(
+        [{'provider_id': busy, 'status': 'completed', 'price': 10, 'rating': rating} for rating in (5, 4, 0)]
+        + [{'provider_id': busy, 'status': status, 'price': 10} for status in ('pending', 'pending', 'accepted', 'cancelled')]
+        + [{'provider_id': earner, 'status': 'completed', 'price': 50, 'final_price': 500, 'rating': 3}]
+        + [{'provider_id': earner, 'status': 'cancelled', 'price': 900, 'rating': 1}]
+    )
+    return {'busy': busy, 'earner': earner, 'idle': idle}
+
+def activity_report(client, **params):
+    response = client.get('/api/admin/reports/provider-activity', query_string=params,
+                          headers=auth_header(ObjectId(), 'admin'))
+    return response.status_code, response.get_json()
+
+def test_activity_report_groups_bookings_per_provider_in_one_pass(client, activity_data, query_counter):
+    status, report = activity_report(client)
+
+    assert status == 200
+    assert query_counter == {('bookings', 'aggregate'): 1, ('users', 'find'): 1}
+    assert (report['total_providers'], report['verified_providers']) == (3, 2)
+    rows = {row['company_name']: row for row in report['providers']}
+    assert [row['company_name'] for row in report['providers']] == ['busy', 'earner', 'idle']
+    assert {key: rows['busy'][key] for key in ('total_jobs', 'pending_jobs', 'accepted_jobs', 'total_earnings')} == {
+        'total_jobs': 3, 'pending_jobs': 2, 'accepted_jobs': 1, 'total_earnings': 30
+    }
+    # Unrated (0) and non-completed ratings are ignored
+    assert (rows['busy']['avg_rating'], rows['busy']['total_ratings']) == (4.5, 2)
+    assert (rows['earner']['total_earnings'], rows['earner']['avg_rating']) == (500, 3)
+    assert (rows['idle']['total_jobs'], rows['idle']['avg_rating']) == (0, 0)
+
+def test_activity_report_sorts_by_earnings_and_pages(client, activity_data):
+    _, by_earnings = activity_report(client, sort='earnings')
+    _, second_page = activity_report(client, sort='earnings', page=2, limit=2)
+
+    assert [row['company_name'] for row in by_earnings['providers']] == ['earner', 'busy', 'idle']
+    assert [row['company_name'] for row in second_page['providers']] == ['idle']
+    assert second_page['pagination'] == {'page': 2, 'limit': 2, 'total': 3}
+    assert activity_report(client, sort='name')[0] == 400
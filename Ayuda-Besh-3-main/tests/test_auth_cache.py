@@ -0,0 +1,73 @@
+import time
+import jwt
+import pytest
+import lib.auth
+import lib.cache
+from lib.auth import SECRET_KEY, generate_token, verify_token
+
+@pytest.fixture
+def decode_calls(monkeypatch):
+    """Number of real jwt.decode calls made by verify_token"""
+    lib.auth._token_cache.clear()
+    calls = []
+    real_decode = jwt.decode
+    def decode(*args, **kwargs):
+        calls.append(1)
+        return real_decode(*args, **kwargs)
+    monkeypatch.setattr(lib.auth.jwt, 'decode', decode)
+    yield calls
+    lib.auth._token_cache.clear()
+
+class ShiftedClock:
+    """Stand-in for the time module as seen by lib.cache, running `offset` seconds ahead"""
+    
+    def __init__(self, offset):
+        self.offset = offset
+    
+    def monotonic(self):
+        return time.monotonic() + self.offset
+
+def test_verified_token_is_served_from_cache(decode_calls):
+    token = generate_token('user-1', 'customer', expires_in=600)
+    
+    first = verify_token(token)
+    second = verify_token(token)
+    
+    assert first == second
+    assert first['user_id'] == 'user-1' and first['role'] == 'customer'
+    assert len(decode_calls) == 1
+
+def test_cached_payload_is_a_copy(decode_calls):
+    token = generate_token('user-1', 'customer', expires_in=600)
+    verify_token(token)['role'] = 'admin'
+    
+    assert verify_token(token)['role'] == 'customer'
+
+def test_cache_entry_expires_at_the_token_exp(decode_calls, monkeypatch):
+    token = generate_token('user-1', 'customer', expires_in=60)
+    verify_token(token)
+    
+    monkeypatch.setattr(lib.cache, 'time', ShiftedClock(55))
+    assert verify_token(token) is not None
+    assert len(decode_calls) == 1
+    
+    monkeypatch.setattr(lib.cache, 'time', ShiftedClock(61))
+    verify_token(token)
+    assert len(decode_calls) == 2
+
+def test_invalid_and_expired_tokens_are_rejected_and_not_cached(decode_calls):
+    expired = generate_token('user-1', 'customer', expires_in=-10)
+    forged = jwt.encode({'user_id': 'user-1', 'role': 'admin', 'exp': time.time() + 600}, 'wrong-secret', algorithm='HS256')
+    
+    for token in (expired, forged, expired, forged):
+        assert verify_token(token) is None
+    assert len(decode_calls) == 4
+    assert lib.auth.token_cache_stats()['size'] == 0
+
+def test_token_without_exp_is_not_cached(decode_calls):
+    token = jwt.encode({'user_id': 'user-1', 'role': 'customer'}, SECRET_KEY, algorithm='HS256')
+    
+    verify_token(token)
+    verify_token(token)
+    
+    assert len(decode_calls) == 2
@@ -0,0 +1,178 @@
+import time
+import pytest
+from bson.objectid import ObjectId
+import lib.availability
+from lib.availability import CompiledAvailability, get_compiled_availability
+from conftest import auth_header
+
+SCHEDULE = {
+    'monday': {'available': True, 'start': '08:00', 'end': '17:00', 'breaks': [{'start': '12:00', 'end': '13:00'}]},
+    'tuesday': {'available': False},
+    'wednesday': {'available': True, 'start': '10:00', 'end': '14:00', 'breaks': []},
+}
+SPECIFIC_DATES = [
+    {'date': '2026-03-09', 'available': False, 'reason': 'Holiday'},
+    {'date': '2026-03-11', 'available': True, 'start': '15:00', 'end': '18:00'},
+]
+
+# 2026-03-02 is a Monday
+EXPECTED = [
+    ('2026-03-02T08:00:00', True, None),
+    ('2026-03-02T07:59:00', False, 'Outside working hours (08:00 - 17:00)'),
+    ('2026-03-02T12:30:00', False, 'During break time'),
+    ('2026-03-02T13:00:00', True, None),
+    ('2026-03-02T17:00:00', False, 'Outside working hours (08:00 - 17:00)'),
+    ('2026-03-03T10:00:00', False, 'Provider not available on tuesday'),
+    ('2026-03-05T10:00:00', False, 'Day not in schedule'),
+    ('2026-03-09T10:00:00', False, 'Holiday'),
+    ('2026-03-11T11:00:00', False, 'Outside working hours (15:00 - 18:00)'),
+    ('2026-03-11T16:00:00', True, None),
+]
+
+class LaterClock:
+    """Stand-in for the time module as seen by lib.availability, past the revalidation interval"""
+
+    def monotonic(self):
+        return time.monotonic() + lib.availability.AVAILABILITY_REVALIDATE_SECONDS + 1
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    lib.availability._compiled_cache.clear()
+    yield
+    lib.availability._compiled_cache.clear()
+
+@pytest.fixture
+def provider_id(client):
+    provider_id = ObjectId()
+    response = client.put('/api/availability', headers=auth_header(provider_id, 'provider'),
+                          json={'schedule': SCHEDULE, 'specific_dates': [dict(entry) for entry in SPECIFIC_DATES]})
+    assert response.status_code == 200
+    return provider_id
+
+def check(client, provider_id, when):
+    response = client.post('/api/availability/check', json={'provider_id': str(provider_id), 'datetime': when})
+    assert response.status_code == 200
+    return response.json['available'], response.json.get('reason')
+
+def test_checks_follow_the_schedule(client, provider_id):
+    for when, available, reason in EXPECTED:
+        assert check(client, provider_id, when) == (available, reason), when
+
+def test_batch_checks_match_single_checks(client, provider_id):
+    response = client.post('/api/availability/check-batch', json={'checks': [
+        {'provider_id': str(provider_id), 'datetime': when} for when, _, _ in EXPECTED
+    ] + [{'provider_id': 'bad', 'datetime': 'never'}]})
+
+    results = response.json['results']
+    assert [(result['available'], result.get('reason')) for result in results[:-1]] == [
+        (available, reason) for _, available, reason in EXPECTED
+    ]
+    assert 'error' in results[-1]
+
+def test_provider_without_a_schedule_gets_the_default(client):
+    assert check(client, ObjectId(), '2026-03-02T09:00:00') == (True, None)
+    assert check(client, ObjectId(), '2026-03-07T09:00:00') == (False, 'Provider not available on weekends')
+
+def test_cached_checks_make_no_queries(client, provider_id, query_counter):
+    check(client, provider_id, '2026-03-02T09:00:00')
+    query_counter.clear()
+
+    for when, _, _ in EXPECTED:
+        check(client, provider_id, when)
+
+    assert sum(query_counter.values()) == 0
+
+def test_a_write_reaches_the_writing_worker_at_once(client, provider_id):
+    assert check(client, provider_id, '2026-03-03T10:00:00')[0] is False
+
+    client.put('/api/availability', headers=auth_header(provider_id, 'provider'), json={
+        'schedule': dict(SCHEDULE, tuesday={'available': True, 'start': '09:00', 'end': '12:00'})
+    })
+    assert check(client, provider_id, '2026-03-03T10:00:00') == (True, None)
+
+    client.delete('/api/availability', headers=auth_header(provider_id, 'provider'))
+    assert check(client, provider_id, '2026-03-03T10:00:00') == (True, None)
+    assert check(client, provider_id, '2026-03-07T10:00:00') == (False, 'Provider not available on weekends')
+
+def test_a_write_only_invalidates_that_provider(client, provider_id, query_counter):
+    other_id = ObjectId()
+    check(client, other_id, '2026-03-02T09:00:00')
+    client.put('/api/availability', headers=auth_header(provider_id, 'provider'), json={'schedule': SCHEDULE})
+    query_counter.clear()
+
+    check(client, other_id, '2026-03-02T09:00:00')
+
+    assert sum(query_counter.values()) == 0
+
+def test_other_workers_writes_are_seen_after_revalidation(db, client, provider_id, monkeypatch):
+    assert check(client, provider_id, '2026-03-03T10:00:00')[0] is False
+
+    # Another worker's write within the same millisecond: this worker's cache
+    # still holds the old schedule, and only the version tells them apart
+    updated_at = db.availability.find_one({'provider_id': provider_id})['updated_at']
+    db.availability.update_one({'provider_id': provider_id}, {
+        '$set': {'schedule.tuesday': {'available': True, 'start': '09:00', 'end': '12:00'}, 'updated_at': updated_at},
+        '$inc': {'version': 1}
+    })
+    assert check(client, provider_id, '2026-03-03T10:00:00')[0] is False
+
+    monkeypatch.setattr(lib.availability, 'time', LaterClock())
+    assert check(client, provider_id, '2026-03-03T10:00:00') == (True, None)
+
+def test_revalidation_reuses_unchanged_schedules(db, provider_id, monkeypatch, query_counter):
+    other_id = ObjectId()
+    get_compiled_availability(db, [provider_id, other_id])
+    monkeypatch.setattr(lib.availability, 'time', LaterClock())
+    compiled = []
+    real_compile = CompiledAvailability.compile.__func__
+    monkeypatch.setattr(CompiledAvailability, 'compile', classmethod(
+        lambda cls, doc: compiled.append(doc['provider_id']) or real_compile(cls, doc)
+    ))
+    query_counter.clear()
+
+    get_compiled_availability(db, [provider_id, other_id])
+
+    assert query_counter == {('availability', 'find'): 1}
+    assert compiled == []
+
+@pytest.mark.parametrize('schedule, specific_dates, error', [
+    ({'monday': {'available': True, 'start': '8am', 'end': '17:00'}}, [], "Invalid time: '8am' (expected HH:MM)"),
+    ({'monday': {'available': True, 'start': '08:00', 'end': '24:30'}}, [], "Invalid time: '24:30' (expected HH:MM)"),
+    ({'monday': {'available': True, 'start': '17:00', 'end': '08:00'}}, [], 'Start time must be before end time for monday'),
+    ({'monday': {'available': True, 'start': '08:00', 'end': '17:00', 'breaks': [{'start': '13:00', 'end': '12:00'}]}},
+     [], 'Start time must be before end time for monday break'),
+    ({}, [{'date': '2026-03-11', 'start': '18:00', 'end': '15:00'}], 'Start time must be before end time for 2026-03-11'),
+    ({}, [{'date': '2026-03-11', 'breaks': [{'start': '12:00'}]}], 'Missing start/end time for 2026-03-11 break'),
+])
+def test_writes_with_invalid_times_are_rejected(client, db, schedule, specific_dates, error):
+    provider_id = ObjectId()
+    response = client.put('/api/availability', headers=auth_header(provider_id, 'provider'),
+                          json={'schedule': schedule, 'specific_dates': specific_dates})
+
+    assert response.status_code == 400
+    assert response.json['error'] == error
+    assert db.availability.count_documents({}) == 0
+
+def test_writes_bump_the_version(client, db, provider_id):
+    assert db.availability.find_one({'provider_id': provider_id})['version'] == 1
+
+    client.put('/api/availability', headers=auth_header(provider_id, 'provider'), json={'schedule': SCHEDULE})
+
+    assert db.availability.find_one({'provider_id': provider_id})['version'] == 2
+
+def test_a_stored_schedule_that_does_not_compile_only_closes_that_provider(client, db, provider_id):
+    broken_id = ObjectId()
+    # Saved before writes were validated
+    db.availability.insert_one({'provider_id': broken_id, 'schedule': {
+        'monday': {'available': True, 'start': '9:00 AM', 'end': '17:00'}
+    }})
+
+    response = client.post('/api/availability/check-batch', json={'checks': [
+        {'provider_id': str(broken_id), 'datetime': '2026-03-02T10:00:00'},
+        {'provider_id': str(provider_id), 'datetime': '2026-03-02T10:00:00'}
+    ]})
+
+    assert response.status_code == 200
+    assert [(result['available'], result.get('reason')) for result in response.json['results']] == [
+        (False, 'Invalid schedule'), (True, None)
+    ]
@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+from lib.booking_slots import SLOT_MINUTES, SlotUnavailable, release_slots, reserve_slots, slot_starts
+
+START = datetime(2026, 3, 2, 9, 0)
+
+@pytest.fixture
+def atomic_inserts(monkeypatch):
+    """Make each mongomock document insert and its unique index check one atomic step, as on a server"""
+    lock = threading.RLock()
+    real_insert = mongomock.Collection._insert
+
+    def insert(self, *args, **kwargs):
+        try:
+            with lock:
+                return real_insert(self, *args, **kwargs)
+        finally:
+            # Let other requests run between the cells of one reservation
+            time.sleep(0.001)
+    monkeypatch.setattr(mongomock.Collection, '_insert', insert)
+
+def booking(provider_id, start, duration):
+    return {'_id': ObjectId(), 'provider_id': provider_id, 'booking_time': start, 'duration_minutes': duration}
+
+def active_slots(db, **query):
+    return list(db.booking_slots.find({'active': True, **query}))
+
+def test_slot_cells_cover_the_booking():
+    assert slot_starts(datetime(2026, 3, 2, 9, 10), 60) == [
+        datetime(2026, 3, 2, 9, 0) + timedelta(minutes=SLOT_MINUTES * i)
+        for i in range(-(-70 // SLOT_MINUTES))
+    ]
+
+def test_overlapping_booking_is_rejected_and_rolled_back(db):
+    provider_id = ObjectId()
+    first = booking(provider_id, START, 60)
+    reserve_slots(db, first)
+    # Starts earlier, so it claims free cells before hitting the held one
+    second = booking(provider_id, START - timedelta(minutes=90), 120)
+
+    with pytest.raises(SlotUnavailable):
+        reserve_slots(db, second)
+
+    assert active_slots(db, booking_id=second['_id']) == []
+    assert len(active_slots(db, booking_id=first['_id'])) == len(slot_starts(START, 60))
+    # Adjacent and other providers' time is still free
+    reserve_slots(db, booking(provider_id, START + timedelta(minutes=60), 60))
+    reserve_slots(db, booking(ObjectId(), START, 60))
+
+def test_reserving_again_is_idempotent_and_release_frees_the_cells(db):
+    provider_id = ObjectId()
+    first = booking(provider_id, START, 60)
+    reserve_slots(db, first)
+    reserve_slots(db, first)
+
+    assert release_slots(db, first['_id']) == len(slot_starts(START, 60))
+    reserve_slots(db, booking(provider_id, START, 60))
+
+@pytest.mark.parametrize('round', range(5))
+def test_racing_requests_for_one_slot_leave_exactly_one_booking(db, atomic_inserts, round):
+    provider_id = ObjectId()
+    threads_count = 16
+    # Every request ends on the same cell; most also start earlier, so losers
+    # usually hold some cells before they collide and must give them back
+    requests = [
+        booking(provider_id, START - timedelta(minutes=SLOT_MINUTES * (i % 4)), SLOT_MINUTES * (i % 4 + 1))
+        for i in range(threads_count)
+    ]
+    barrier = threading.Barrier(threads_count)
+    winners, losers, errors = [], [], []
+
+    def attempt(request):
+        barrier.wait()
+        try:
+            reserve_slots(db, request)
+            winners.append(request)
+        except SlotUnavailable:
+            losers.append(request)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=attempt, args=(request,)) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert errors == []
+    assert len(winners) == 1
+    assert len(losers) == threads_count - 1
+    [winner] = winners
+    held = active_slots(db, provider_id=provider_id)
+    assert {slot['booking_id'] for slot in held} == {winner['_id']}
+    assert sorted(slot['slot_start'] for slot in held) == slot_starts(winner['booking_time'], winner['duration_minutes'])
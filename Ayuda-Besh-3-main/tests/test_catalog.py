@@ -0,0 +1,81 @@
+import pytest
+import lib.catalog
+from lib.catalog import CATALOG_COUNTER_ID, bump_catalog_version, get_catalog_version
+from conftest import auth_header
+
+@pytest.fixture(autouse=True)
+def empty_catalog_cache():
+    lib.catalog._catalog_cache.clear()
+    yield
+    lib.catalog._catalog_cache.clear()
+
+def add_provider(db, **fields):
+    return db.users.insert_one(dict({
+        'role': 'provider',
+        'is_verified': True,
+        'username': 'Sparkle Co',
+        'location': 'Manila',
+        'services_offered': ['cleaning']
+    }, **fields)).inserted_id
+
+def catalog(client, query='', etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(f'/api/available-services{query}', headers=headers)
+
+def test_catalog_is_built_once_per_version(client, db, query_counter):
+    add_provider(db)
+    catalog(client)
+    query_counter.clear()
+
+    for query in ('', '?service_type=cleaning', '?location=manila&limit=10'):
+        assert catalog(client, query).status_code == 200
+
+    assert query_counter == {('counters', 'find_one'): 3}
+
+def test_bump_is_seen_through_the_shared_version(client, db):
+    add_provider(db)
+    assert catalog(client).get_json()[0]['description'] == 'Professional service provider'
+
+    # Another worker's write: only the version in MongoDB changes, not this worker's cache
+    db.users.update_many({}, {'$set': {'description': 'Deep cleaning'}})
+    assert catalog(client).get_json()[0]['description'] == 'Professional service provider'
+    db.counters.update_one({'_id': CATALOG_COUNTER_ID}, {'$inc': {'version': 1}}, upsert=True)
+
+    assert catalog(client).get_json()[0]['description'] == 'Deep cleaning'
+
+def test_catalog_writes_bump_the_version(client, db):
+    provider_id = add_provider(db, is_verified=False)
+    assert catalog(client).get_json() == []
+
+    client.post(f'/api/admin/verify-provider/{provider_id}', headers=auth_header('admin', 'admin'))
+    assert get_catalog_version(db) == 1
+    assert [entry['provider_id'] for entry in catalog(client).get_json()] == [str(provider_id)]
+
+    client.post('/api/update-profile', headers=auth_header(provider_id, 'provider'), json={'location': 'Cebu'})
+    assert get_catalog_version(db) == 2
+    assert catalog(client).get_json()[0]['location'] == 'Cebu'
+
+def test_unchanged_catalog_answers_not_modified(client, db):
+    add_provider(db)
+    first = catalog(client)
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] in ('public, no-cache', 'no-cache, public')
+
+    repeat = catalog(client, etag=etag)
+    assert repeat.status_code == 304
+    assert repeat.get_data() == b''
+    assert repeat.headers['ETag'] == etag
+
+    # The query string is part of the tag
+    assert catalog(client, '?service_type=cleaning', etag=etag).status_code == 200
+
+def test_bump_changes_the_etag(client, db):
+    add_provider(db)
+    etag = catalog(client).headers['ETag']
+
+    bump_catalog_version(db)
+
+    response = catalog(client, etag=etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()) == 1
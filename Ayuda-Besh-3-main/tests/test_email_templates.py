@@ -0,0 +1,92 @@
+import pytest
+import lib.email_templates
+from lib.email_templates import EMAIL_SUBJECTS, get_email_templates, render_bulk, render_email
+from lib.outbox import email_user, enqueue_templated_emails
+
+CONTEXTS = {
+    'password_reset': {'user_name': 'Ana', 'verification_code': '123456', 'expires_minutes': 15},
+    'booking_accepted': {'user_name': 'Ana', 'provider_name': 'bob', 'service_name': 'Plumbing', 'booking_time': '2026-01-02 10:00'},
+    'account_disabled': {'user_name': 'Ana', 'reason': 'Spam', 'disabled_until': '2026-02-01'},
+    'review_received': {'user_name': 'Bob', 'customer_name': 'Ana', 'service_name': 'Plumbing', 'rating': 5, 'review_text': 'Great'},
+}
+
+@pytest.mark.parametrize('name', sorted(EMAIL_SUBJECTS))
+def test_every_message_renders(name):
+    content = render_email(name, **CONTEXTS[name])
+
+    assert content['subject'].startswith('AyudaBesh - ')
+    assert content['text'].startswith(f"Hello {CONTEXTS[name]['user_name']},")
+    assert 'AyudaBesh Team' in content['text']
+    assert '<html' in content['html']
+    for value in CONTEXTS[name].values():
+        assert str(value) in content['text']
+        assert str(value) in content['html']
+
+def test_variable_parts_are_rendered():
+    content = render_email('review_received', **CONTEXTS['review_received'])
+
+    assert content['subject'] == 'AyudaBesh - New 5-star review from Ana'
+
+def test_html_is_escaped_but_text_and_subject_are_not():
+    content = render_email('booking_accepted', provider_name='Tom & <Co>', service_name='A&B', booking_time=None)
+
+    assert 'Tom &amp; &lt;Co&gt;' in content['html']
+    assert 'Tom & <Co>' in content['text']
+    assert content['subject'] == 'AyudaBesh - Your A&B booking was accepted'
+    assert 'Scheduled for' not in content['text']
+
+def test_templates_are_compiled_once(monkeypatch):
+    first = get_email_templates('password_reset')
+
+    def fail(*args, **kwargs):
+        raise AssertionError('template was compiled again')
+    monkeypatch.setattr(lib.email_templates._env.loader, 'get_source', fail)
+    monkeypatch.setattr(lib.email_templates._env, 'from_string', fail)
+
+    assert get_email_templates('password_reset') is first
+    render_email('password_reset', **CONTEXTS['password_reset'])
+
+def test_unknown_template_is_rejected():
+    with pytest.raises(ValueError):
+        render_email('no_such_message')
+
+def test_bulk_rendering_matches_single_rendering():
+    contexts = [dict(CONTEXTS['account_disabled'], user_name=f'User {i}') for i in range(5)]
+
+    assert render_bulk('account_disabled', contexts) == [
+        render_email('account_disabled', **context) for context in contexts
+    ]
+
+def test_bulk_queue_inserts_one_message_per_recipient(db):
+    recipients = [(f'user{i}@example.com', dict(CONTEXTS['password_reset'], verification_code=f'00000{i}')) for i in range(3)]
+
+    assert enqueue_templated_emails(db, 'password_reset', recipients) == 3
+    assert enqueue_templated_emails(db, 'password_reset', []) == 0
+
+    queued = list(db.outbox.find({}, sort=[('to', 1)]))
+    assert [message['to'] for message in queued] == ['user0@example.com', 'user1@example.com', 'user2@example.com']
+    for i, message in enumerate(queued):
+        assert message['status'] == 'pending'
+        assert message['kind'] == 'password_reset'
+        assert f'00000{i}' in message['payload']['text']
+
+def test_email_user_fills_in_the_user_name(db, monkeypatch):
+    monkeypatch.setenv('SMTP_USERNAME', 'mailer')
+    monkeypatch.setenv('SMTP_PASSWORD', 'secret')
+    db.users.insert_one({'_id': 'u1', 'username': 'ana', 'email': 'ana@example.com', 'fullName': 'Ana Cruz'})
+    db.users.insert_one({'_id': 'u2', 'username': 'noemail', 'fullName': 'No Email'})
+
+    message_id = email_user(db, 'u1', 'account_disabled', reason='Spam', disabled_until=None)
+
+    message = db.outbox.find_one({'_id': message_id})
+    assert message['to'] == 'ana@example.com'
+    assert message['payload']['text'].startswith('Hello Ana Cruz,')
+    assert 'permanently' in message['payload']['html']
+    assert email_user(db, 'u2', 'account_disabled', reason='Spam') is None
+
+def test_email_user_needs_smtp(db, monkeypatch):
+    monkeypatch.delenv('SMTP_USERNAME', raising=False)
+    db.users.insert_one({'_id': 'u1', 'email': 'ana@example.com'})
+
+    assert email_user(db, 'u1', 'account_disabled', reason='Spam') is None
+    assert db.outbox.count_documents({}) == 0
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+import lib.export
+from lib.export import export_response
+from conftest import auth_header
+
+def test_rows_are_pulled_lazily_as_chunks_are_sent(app, monkeypatch):
+    monkeypatch.setattr(lib.export, 'CHUNK_SIZE', 1024)
+    consumed = []
+    def rows():
+        for number in range(5000):
+            consumed.append(number)
+            yield {'number': number, 'label': f'row {number}'}
+    
+    with app.test_request_context():
+        response = export_response(rows(), ['number', 'label'], 'csv', 'rows')
+        chunks = response.response
+        first = next(iter(chunks))
+    
+    assert response.is_streamed
+    assert first.startswith('number,label')
+    assert 0 < len(consumed) < 5000
+
+def test_daily_bookings_csv_export_resolves_names_per_cursor_chunk(client, db, query_counter):
+    admin_id = db.users.insert_one({'role': 'admin', 'username': 'admin'}).inserted_id
+    customer_id = db.users.insert_one({'role': 'customer', 'fullName': 'Ana Cruz', 'email': 'ana@example.com'}).inserted_id
+    provider_id = db.users.insert_one({'role': 'provider', 'username': 'sparkle'}).inserted_id
+    start = datetime(2026, 3, 2)
+    db.bookings.insert_many([
+        {
+            'customer_id': customer_id,
+            'provider_id': provider_id,
+            'status': 'completed',
+            'price': 100,
+            'final_price': 120,
+            'created_at': start + timedelta(seconds=number)
+        }
+        for number in range(1200)
+    ])
+    query_counter.clear()
+    
+    response = client.get(
+        '/api/admin/reports/daily-bookings?date=2026-03-02&format=csv',
+        headers=auth_header(admin_id, 'admin')
+    )
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    
+    assert response.headers['Content-Disposition'] == 'attachment; filename="daily-bookings-2026-03-02.csv"'
+    assert len(rows) == 1200
+    assert {(row['customer_name'], row['provider_name'], row['amount']) for row in rows} == {('Ana Cruz', 'sparkle', '120')}
+    # One users lookup per 500-row chunk of the cursor
+    assert query_counter[('users', 'find')] == 3
+
+def test_ndjson_export_writes_one_json_object_per_line(app):
+    rows = [{'booking_id': ObjectId(), 'created_at': datetime(2026, 3, 2, 9, 30), 'amount': 80}]
+    
+    with app.test_request_context():
+        response = export_response(iter(rows), ['booking_id', 'created_at', 'amount'], 'ndjson', 'bookings')
+        body = ''.join(response.response)
+    
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in body.splitlines()] == [{
+        'booking_id': str(rows[0]['booking_id']),
+        'created_at': '2026-03-02T09:30:00',
+        'amount': 80
+    }]
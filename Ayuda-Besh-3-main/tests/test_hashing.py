@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import lib.hashing
+from lib.hashing import HashingOverloaded, _run
+
+@pytest.fixture
+def pool(monkeypatch):
+    """One-worker pool with a short timeout; `release` unblocks jobs waiting on it"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    monkeypatch.setattr(lib.hashing, 'POOL_WORKERS', 1)
+    monkeypatch.setattr(lib.hashing, 'MAX_PENDING', 2)
+    monkeypatch.setattr(lib.hashing, 'TIMEOUT_SECONDS', 0.05)
+    monkeypatch.setattr(lib.hashing, '_pending', 0)
+    monkeypatch.setattr(lib.hashing, '_get_pool', lambda: executor)
+    yield release
+    release.set()
+    executor.shutdown(wait=True)
+
+def wait_for_pending(count, timeout=2):
+    deadline = time.monotonic() + timeout
+    while lib.hashing._pending != count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return lib.hashing._pending
+
+def test_hash_and_verify_inline_round_trip(monkeypatch):
+    monkeypatch.setattr(lib.hashing, 'POOL_WORKERS', 0)
+    monkeypatch.setattr(lib.hashing, 'BCRYPT_ROUNDS', 4)
+    
+    hashed = lib.hashing.hash_password('s3cret!')
+    
+    assert hashed.startswith('$2')
+    assert lib.hashing.verify_password('s3cret!', hashed)
+    assert not lib.hashing.verify_password('wrong', hashed)
+    assert not lib.hashing.password_needs_rehash(hashed)
+
+def test_timed_out_running_job_keeps_its_slot_until_it_finishes(pool, monkeypatch):
+    monkeypatch.setattr(lib.hashing, 'MAX_PENDING', 1)
+    
+    with pytest.raises(HashingOverloaded):
+        _run(pool.wait)
+    assert lib.hashing._pending == 1
+    
+    # The job is still hashing, so new work is shed instead of queueing behind it
+    with pytest.raises(HashingOverloaded):
+        _run(lambda: 'not run')
+    
+    pool.set()
+    assert wait_for_pending(0) == 0
+    assert _run(lambda: 'done') == 'done'
+    assert lib.hashing._pending == 0
+
+def test_timed_out_queued_job_is_cancelled_and_frees_its_slot(pool):
+    with pytest.raises(HashingOverloaded):
+        _run(pool.wait)
+    with pytest.raises(HashingOverloaded):
+        _run(lambda: 'queued behind the running job')
+    
+    assert lib.hashing._pending == 1
+
+def test_failed_submit_frees_its_slot(pool, monkeypatch):
+    def broken_pool():
+        raise RuntimeError('cannot schedule new futures after shutdown')
+    monkeypatch.setattr(lib.hashing, '_get_pool', broken_pool)
+    
+    with pytest.raises(RuntimeError):
+        _run(lambda: 'not run')
+    assert lib.hashing._pending == 0
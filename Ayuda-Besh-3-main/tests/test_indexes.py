@@ -0,0 +1,64 @@
+import mongomock
+import pytest
+from lib.mongodb import INDEXES, ensure_indexes
+
+# (collection, equality fields, sort fields) of the queries the routes run on every request
+HOT_QUERY_SHAPES = [
+    ('users', {'username'}, []),
+    ('users', {'email'}, []),
+    ('users', {'phone'}, []),
+    ('users', {'role'}, ['createdAt']),
+    ('users', {'role', 'is_verified'}, []),
+    ('users', set(), ['createdAt', '_id']),
+    ('bookings', {'customer_id'}, ['created_at', '_id']),
+    ('bookings', {'provider_id'}, ['created_at', '_id']),
+    ('bookings', {'provider_id', 'booking_time'}, []),
+    ('bookings', {'status'}, ['completed_at']),
+    ('bookings', {'provider_id', 'status'}, ['completed_at']),
+    ('booking_slots', {'provider_id', 'slot_start'}, []),
+    ('booking_slots', {'booking_id'}, []),
+    ('notifications', {'user_id'}, ['created_at']),
+    ('notifications', {'user_id', 'read'}, []),
+    ('reviews', {'provider_id'}, ['created_at', '_id']),
+    ('reviews', {'customer_id'}, ['created_at']),
+    ('reviews', {'booking_id'}, []),
+    ('availability', {'provider_id'}, []),
+    ('password_resets', {'user_id', 'used'}, []),
+    ('disputes', set(), ['created_at', '_id']),
+    ('reports', set(), ['created_at', '_id']),
+    ('service_requests', {'customerId'}, ['createdAt']),
+    ('service_requests', {'status'}, ['createdAt']),
+    ('outbox', {'status'}, ['next_attempt_at']),
+]
+
+def serves(keys, equality, sort) -> bool:
+    """Whether an index with these keys serves equality matches followed by a sort"""
+    fields = [field for field, _ in keys]
+    return (
+        len(fields) >= len(equality) + len(sort)
+        and set(fields[:len(equality)]) == equality
+        and fields[len(equality):len(equality) + len(sort)] == sort
+    )
+
+@pytest.mark.parametrize('collection, equality, sort', HOT_QUERY_SHAPES)
+def test_hot_query_shape_has_an_index(collection, equality, sort):
+    assert any(serves(keys, equality, sort) for keys, _ in INDEXES[collection])
+
+def test_ensure_indexes_creates_missing_indexes_once():
+    database = mongomock.MongoClient().ayudabesh
+    
+    assert ensure_indexes(database) == sum(len(specs) for specs in INDEXES.values())
+    assert ensure_indexes(database) == 0
+    for collection, specs in INDEXES.items():
+        assert {options['name'] for _, options in specs} <= set(database[collection].index_information())
+
+def test_ensure_indexes_skips_a_clashing_legacy_index():
+    database = mongomock.MongoClient().ayudabesh
+    database.users.create_index([('username', 1)], name='legacy_username')
+    
+    ensure_indexes(database)
+    
+    users_indexes = database.users.index_information()
+    assert 'legacy_username' in users_indexes
+    assert 'username_unique' not in users_indexes
+    assert 'email_unique' in users_indexes
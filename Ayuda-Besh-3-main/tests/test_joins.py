@@ -0,0 +1,59 @@
+from bson.objectid import ObjectId
+from lib.joins import Ref, fetch_by_ids, join_refs
+
+BOOKING_REFS = [
+    Ref('customer_id', 'users', ('fullName',), 'customer'),
+    Ref('provider_id', 'users', ('username',), 'provider'),
+    Ref('service_id', 'services', ('name',), 'service')
+]
+
+def test_refs_to_one_collection_share_a_query_with_the_union_projection(db, query_counter):
+    customer_id = db.users.insert_one({'fullName': 'Cora Customer', 'username': 'cora', 'password': 'x'}).inserted_id
+    provider_id = db.users.insert_one({'fullName': 'Pat Provider', 'username': 'pat', 'password': 'x'}).inserted_id
+    service_id = db.services.insert_one({'name': 'Plumbing', 'category': 'plumbing'}).inserted_id
+    bookings = [
+        {'customer_id': customer_id, 'provider_id': provider_id, 'service_id': service_id}
+        for _ in range(3)
+    ]
+    query_counter.clear()
+
+    assert join_refs(db, bookings, BOOKING_REFS) is bookings
+
+    assert query_counter == {('users', 'find'): 1, ('services', 'find'): 1}
+    for booking in bookings:
+        assert booking['customer'] == {'_id': customer_id, 'fullName': 'Cora Customer', 'username': 'cora'}
+        assert booking['provider'] == {'_id': provider_id, 'fullName': 'Pat Provider', 'username': 'pat'}
+        assert booking['service'] == {'_id': service_id, 'name': 'Plumbing'}
+
+def test_missing_null_and_string_references(db):
+    user_id = db.users.insert_one({'fullName': 'Cora Customer'}).inserted_id
+    bookings = [
+        # Some older documents store ids as strings
+        {'customer_id': str(user_id)},
+        {'customer_id': None},
+        {},
+        {'customer_id': ObjectId()},
+        {'customer_id': 'not-an-id'}
+    ]
+
+    join_refs(db, bookings, BOOKING_REFS[:1])
+
+    assert bookings[0]['customer']['fullName'] == 'Cora Customer'
+    assert [booking['customer'] for booking in bookings[1:]] == [None] * 4
+
+def test_no_documents_or_no_ids_issue_no_query(db, query_counter):
+    assert join_refs(db, [], BOOKING_REFS) == []
+    assert join_refs(db, [{'customer_id': None}], BOOKING_REFS[:1]) == [{'customer_id': None, 'customer': None}]
+    assert fetch_by_ids(db, 'users', [None], ('fullName',)) == {}
+    assert sum(query_counter.values()) == 0
+
+def test_fetch_by_ids_keys_by_id_and_projects(db):
+    first, second = db.services.insert_many([
+        {'name': 'Plumbing', 'category': 'plumbing'},
+        {'name': 'Domestic Cleaning', 'category': 'cleaning'}
+    ]).inserted_ids
+
+    found = fetch_by_ids(db, 'services', [first, second, first, ObjectId()], ('name',))
+
+    assert found == {first: {'_id': first, 'name': 'Plumbing'}, second: {'_id': second, 'name': 'Domestic Cleaning'}}
+    assert fetch_by_ids(db, 'services', [first], None)[first]['category'] == 'plumbing'
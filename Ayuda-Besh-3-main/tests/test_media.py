@@ -0,0 +1,124 @@
+import hashlib
+import io
+from datetime import datetime, timedelta
+import gridfs
+import pytest
+import lib.media
+from lib.media import BUCKET_NAME, UPLOAD_GRACE_SECONDS, profile_picture_url, store_profile_picture
+
+class FakeGridOut(io.BytesIO):
+    """The GridOut attributes the picture endpoint reads"""
+    
+    def __init__(self, stored):
+        super().__init__(stored['content'])
+        self._id = stored['_id']
+        self.length = stored['length']
+        self.upload_date = stored['uploadDate']
+        self.metadata = stored['metadata']
+
+class FakeBucket:
+    """GridFSBucket stand-in keeping file documents (and their content) in the real `<bucket>.files` collection"""
+    
+    def __init__(self, db):
+        self.files = db[f'{BUCKET_NAME}.files']
+    
+    def upload_from_stream(self, filename, content, metadata=None):
+        return self.files.insert_one({
+            'filename': filename,
+            'length': len(content),
+            'uploadDate': datetime.utcnow(),
+            'metadata': metadata,
+            'content': content
+        }).inserted_id
+    
+    def open_download_stream(self, file_id):
+        stored = self.files.find_one({'_id': file_id})
+        if stored is None:
+            raise gridfs.errors.NoFile(file_id)
+        return FakeGridOut(stored)
+    
+    def delete(self, file_id):
+        if self.files.delete_one({'_id': file_id}).deleted_count == 0:
+            raise gridfs.errors.NoFile(file_id)
+
+@pytest.fixture
+def user_id(db, monkeypatch):
+    monkeypatch.setattr(lib.media, '_bucket', FakeBucket)
+    return db.users.insert_one({'role': 'customer', 'username': 'ana'}).inserted_id
+
+def stored_digests(db, user_id) -> set:
+    return {f['metadata']['sha256'] for f in db[f'{BUCKET_NAME}.files'].find({'metadata.user_id': user_id})}
+
+def url_of(user_id, data: bytes) -> str:
+    return profile_picture_url(user_id, hashlib.sha256(data).hexdigest())
+
+def age_stored_files(db, seconds):
+    db[f'{BUCKET_NAME}.files'].update_many({}, {'$set': {'uploadDate': datetime.utcnow() - timedelta(seconds=seconds)}})
+
+def test_new_picture_replaces_the_previous_one(db, user_id):
+    store_profile_picture(db, user_id, b'first', 'image/png')
+    age_stored_files(db, UPLOAD_GRACE_SECONDS + 1)
+    
+    url = store_profile_picture(db, user_id, b'second', 'image/png')
+    
+    assert url == url_of(user_id, b'second')
+    assert db.users.find_one({'_id': user_id})['profile_picture'] == url
+    assert stored_digests(db, user_id) == {hashlib.sha256(b'second').hexdigest()}
+
+def test_upload_superseded_by_a_concurrent_one_keeps_the_winners_files(db, user_id, monkeypatch):
+    store_profile_picture(db, user_id, b'old', 'image/png')
+    age_stored_files(db, UPLOAD_GRACE_SECONDS + 1)
+    set_pointer = db.users.update_one
+    
+    def update_one(query, update, *args, **kwargs):
+        result = set_pointer(query, update, *args, **kwargs)
+        # A second upload of the same user finishes right after the first one set its pointer
+        if update.get('$set', {}).get('profile_picture') == url_of(user_id, b'slow'):
+            store_profile_picture(db, user_id, b'fast', 'image/png')
+        return result
+    monkeypatch.setattr(db.users, 'update_one', update_one)
+    
+    store_profile_picture(db, user_id, b'slow', 'image/png')
+    
+    assert db.users.find_one({'_id': user_id})['profile_picture'] == url_of(user_id, b'fast')
+    digests = stored_digests(db, user_id)
+    assert hashlib.sha256(b'fast').hexdigest() in digests
+    assert hashlib.sha256(b'old').hexdigest() not in digests
+
+def fetch(client, url):
+    response = client.get(url)
+    return response.status_code, response.get_data(), response.headers
+
+def test_versioned_url_serves_exactly_that_content_after_a_b_a(client, db, user_id):
+    url_a = store_profile_picture(db, user_id, b'picture A', 'image/png')
+    url_b = store_profile_picture(db, user_id, b'picture B', 'image/png')
+    # Back to A within the grace window: A's files are reused and B's are kept
+    assert store_profile_picture(db, user_id, b'picture A', 'image/png') == url_a
+    assert stored_digests(db, user_id) == {hashlib.sha256(b'picture A').hexdigest(), hashlib.sha256(b'picture B').hexdigest()}
+    
+    status, body, headers = fetch(client, url_a)
+    assert (status, body) == (200, b'picture A')
+    assert 'immutable' in headers['Cache-Control']
+    
+    # B is newer but no longer current; its own URL still gets B, the bare URL gets A
+    assert fetch(client, url_b)[:2] == (200, b'picture B')
+    status, body, headers = fetch(client, f'/api/users/{user_id}/profile-picture')
+    assert (status, body) == (200, b'picture A')
+    assert 'no-cache' in headers['Cache-Control']
+
+def test_unknown_version_redirects_to_the_current_picture(client, db, user_id):
+    store_profile_picture(db, user_id, b'old', 'image/png')
+    age_stored_files(db, UPLOAD_GRACE_SECONDS + 1)
+    url = store_profile_picture(db, user_id, b'new', 'image/png')
+    
+    for stale in (url_of(user_id, b'old'), f'/api/users/{user_id}/profile-picture?v=not-a-hash'):
+        response = client.get(stale)
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith(url)
+    
+    response = client.get(url_of(user_id, b'old') + '&size=small')
+    assert response.headers['Location'].endswith(url + '&size=small')
+
+def test_missing_picture_is_not_found(client, db, user_id):
+    assert client.get(f'/api/users/{user_id}/profile-picture').status_code == 404
+    assert client.get(url_of(user_id, b'never stored')).status_code == 404
@@ -0,0 +1,107 @@
+import os
+from types import SimpleNamespace
+import pytest
+from bson.objectid import ObjectId
+import lib.mongodb
+from lib.mongodb import PoolStatsListener, get_client, get_database, get_pool_diagnostics
+from conftest import auth_header
+
+ADDRESS = ('db.example.com', 27017)
+
+class RecordingClient:
+    """Stand-in for MongoClient that records how it was built"""
+    created = []
+
+    def __init__(self, uri, **options):
+        self.uri = uri
+        self.options = options
+        self.pid = os.getpid()
+        RecordingClient.created.append(self)
+
+    def __getitem__(self, name):
+        return SimpleNamespace(client=self, name=name)
+
+@pytest.fixture
+def configured(monkeypatch):
+    """lib.mongodb as init_db leaves it, building RecordingClients"""
+    RecordingClient.created = []
+    monkeypatch.setattr(lib.mongodb, 'MongoClient', RecordingClient)
+    monkeypatch.setattr(lib.mongodb, '_client_uri', 'mongodb://db.example.com:27017/ayudabesh')
+    monkeypatch.setattr(lib.mongodb, '_client_options', {'maxPoolSize': 20, 'readPreference': 'secondaryPreferred'})
+    monkeypatch.setattr(lib.mongodb, '_client', None)
+    monkeypatch.setattr(lib.mongodb, '_client_pid', None)
+    monkeypatch.setattr(lib.mongodb, 'db', None)
+
+def test_client_options_come_from_config_and_skip_unset_values():
+    options = lib.mongodb._client_options_from_config({
+        'MONGODB_MAX_POOL_SIZE': 50, 'MONGODB_MIN_POOL_SIZE': 0, 'MONGODB_WAIT_QUEUE_TIMEOUT_MS': None,
+        'MONGODB_COMPRESSORS': '', 'MONGODB_READ_PREFERENCE': 'primary'
+    })
+
+    assert options == {'maxPoolSize': 50, 'minPoolSize': 0, 'readPreference': 'primary'}
+
+def test_client_is_built_once_per_process(configured):
+    client = get_client()
+
+    assert get_client() is client
+    assert get_database().client is client
+    assert client.options == {'event_listeners': [lib.mongodb.pool_stats], 'maxPoolSize': 20,
+                              'readPreference': 'secondaryPreferred'}
+
+def test_a_new_pid_gets_its_own_client_with_the_same_settings(configured, monkeypatch):
+    parent = get_client()
+    monkeypatch.setattr(os, 'getpid', lambda: parent.pid + 1)
+
+    child = get_database().client
+
+    assert child is not parent
+    assert (child.uri, child.options) == (parent.uri, parent.options)
+    assert get_client() is child
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_child_does_not_reuse_the_parent_client(configured):
+    parent = get_client()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reused = lib.mongodb._client is parent or get_client() is parent
+            os.write(write_end, b'reused' if reused else b'fresh')
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 16)
+    os.waitpid(pid, 0)
+
+    assert result == b'fresh'
+    assert get_client() is parent
+
+def test_pool_stats_follow_checkouts():
+    listener = PoolStatsListener()
+    event = SimpleNamespace(address=ADDRESS)
+    listener.pool_created(event)
+    for _ in range(2):
+        listener.connection_created(event)
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+    listener.connection_checked_in(event)
+    listener.connection_check_out_started(event)
+    listener.connection_check_out_failed(event)
+    listener.pool_cleared(event)
+
+    stats = listener.snapshot()['db.example.com:27017']
+
+    assert (stats['open'], stats['in_use'], stats['waiting']) == (2, 1, 0)
+    assert (stats['checkouts'], stats['checkout_failures'], stats['pool_cleared']) == (2, 1, 1)
+    assert stats['max_waiting'] == 1
+    assert stats['max_wait_ms'] >= stats['avg_wait_ms'] >= 0
+
+def test_diagnostics_endpoint_is_admin_only(client):
+    response = client.get('/api/admin/diagnostics/db', headers=auth_header(ObjectId(), 'admin'))
+
+    assert response.status_code == 200
+    assert response.json['pid'] == os.getpid()
+    assert response.json['client_options'] == get_pool_diagnostics()['client_options']
+    assert isinstance(response.json['servers'], dict)
+    assert client.get('/api/admin/diagnostics/db', headers=auth_header(ObjectId())).status_code == 403
+    assert client.get('/api/admin/diagnostics/db').status_code == 401
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import pytest
+from bson.objectid import ObjectId
+from conftest import auth_header
+
+START = datetime(2026, 1, 1, 9, 0)
+
+@pytest.fixture
+def customer_id(db):
+    return db.users.insert_one({'username': 'cora', 'fullName': 'Cora Customer', 'email': 'cora@example.com',
+                                'password': 'secret', 'role': 'customer'}).inserted_id
+
+@pytest.fixture
+def provider_ids(db):
+    return db.users.insert_many([
+        {'username': f'fixit{i}', 'fullName': f'Pat Provider {i}', 'email': f'pat{i}@example.com',
+         'password': 'secret', 'role': 'provider'}
+        for i in range(5)
+    ]).inserted_ids
+
+def add_bookings(db, customer_id, provider_ids, count, **fields):
+    db.bookings.insert_many([
+        dict({'customer_id': customer_id, 'provider_id': provider_ids[i % len(provider_ids)], 'status': 'pending',
+              'service_type': 'Plumbing', 'created_at': START + timedelta(minutes=i)}, **fields)
+        for i in range(count)
+    ])
+
+def my_bookings(client, user_id, role='customer', **params):
+    response = client.get('/api/my-bookings', query_string=params, headers=auth_header(user_id, role))
+    assert response.status_code == 200
+    return response.json
+
+def test_counterparts_are_resolved_with_one_query(client, db, customer_id, provider_ids, query_counter):
+    add_bookings(db, customer_id, provider_ids, 40)
+
+    bookings = my_bookings(client, customer_id)
+
+    assert len(bookings) == 40
+    assert query_counter == {('bookings', 'find'): 1, ('users', 'find'): 1}
+    first = bookings[-1]
+    assert first['provider_id'] == str(provider_ids[0])
+    assert (first['provider_name'], first['provider_company_name'], first['provider_owner_name']) == (
+        'fixit0', 'fixit0', 'Pat Provider 0'
+    )
+
+def test_providers_see_customer_details(client, db, customer_id, provider_ids):
+    add_bookings(db, customer_id, provider_ids[:1], 2)
+    add_bookings(db, ObjectId(), provider_ids[:1], 1)  # Customer account since deleted
+
+    bookings = my_bookings(client, provider_ids[0], 'provider')
+
+    assert sorted((booking['customer_name'], booking['customer_email']) for booking in bookings) == [
+        ('Cora Customer', 'cora@example.com'), ('Cora Customer', 'cora@example.com'), ('Unknown', '')
+    ]
+    assert all('password' not in booking for booking in bookings)
+
+def test_stored_names_skip_the_lookup(client, db, customer_id, provider_ids, query_counter):
+    add_bookings(db, customer_id, provider_ids, 3, provider_name='Stored Name')
+
+    bookings = my_bookings(client, customer_id)
+
+    assert {booking['provider_name'] for booking in bookings} == {'Stored Name'}
+    assert ('users', 'find') not in query_counter
+
+def test_cursor_pages_cover_the_history_once(client, db, customer_id, provider_ids):
+    add_bookings(db, customer_id, provider_ids, 7)
+    everything = [booking['_id'] for booking in my_bookings(client, customer_id)]
+
+    seen, cursor = [], None
+    while True:
+        page = my_bookings(client, customer_id, limit=3, **({'cursor': cursor} if cursor else {}))
+        assert len(page['bookings']) <= 3
+        seen.extend(booking['_id'] for booking in page['bookings'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == everything
+
+def test_bad_cursor_is_rejected(client, customer_id):
+    response = client.get('/api/my-bookings?limit=5&cursor=garbage', headers=auth_header(customer_id))
+
+    assert response.status_code == 400
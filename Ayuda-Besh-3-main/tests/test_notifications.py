@@ -0,0 +1,144 @@
+import json
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+from lib import notification_stream
+from lib import notifications as notification_service
+from lib.notifications import create_notification, create_notifications, get_unread_count, mark_all_read, mark_read
+from conftest import auth_header
+
+def insert_unread(db, user_id, count):
+    db.notifications.insert_many([{'user_id': user_id, 'title': 'Old', 'read': False} for _ in range(count)])
+
+def test_counter_is_seeded_from_existing_notifications(db):
+    user_id = ObjectId()
+    insert_unread(db, user_id, 3)
+
+    assert get_unread_count(db, user_id) == 3
+    assert db.notification_counters.find_one({'_id': user_id}) == {'_id': user_id, 'unread': 3, 'seeded': True}
+
+def test_writes_keep_a_seeded_counter_in_step(db):
+    user_id = ObjectId()
+    other_id = ObjectId()
+    assert get_unread_count(db, user_id) == 0
+
+    ids = create_notifications([user_id, user_id, other_id], 'Title', 'Message', db=db)
+    assert get_unread_count(db, user_id) == 2
+
+    assert mark_read(db, user_id, ids[0])
+    assert mark_read(db, user_id, ids[0])  # Already read: no second decrement
+    assert not mark_read(db, user_id, ids[2])  # Someone else's
+    assert get_unread_count(db, user_id) == 1
+
+    create_notification(user_id, 'Title', 'Message', db=db)
+    assert mark_all_read(db, user_id) == 2
+    assert get_unread_count(db, user_id) == 0
+    assert get_unread_count(db, other_id) == 1
+
+def test_seeding_replaces_increments_made_before_the_first_read(db):
+    user_id = ObjectId()
+    insert_unread(db, user_id, 2)
+    # Counter created by a write before anyone read it: only counts that write
+    create_notification(user_id, 'Title', 'Message', db=db)
+    assert db.notification_counters.find_one({'_id': user_id})['unread'] == 1
+
+    assert get_unread_count(db, user_id) == 3
+    assert get_unread_count(db, user_id) == 3
+
+def test_seeding_does_not_lose_a_concurrent_increment(db, monkeypatch):
+    user_id = ObjectId()
+    insert_unread(db, user_id, 2)
+    real_count = mongomock.Collection.count_documents
+    raced = []
+
+    def count_then_race(self, *args, **kwargs):
+        count = real_count(self, *args, **kwargs)
+        if self.name == 'notifications' and not raced:
+            # A notification lands between our count and our seed
+            raced.append(create_notification(user_id, 'Title', 'Message', db=db))
+        return count
+    monkeypatch.setattr(mongomock.Collection, 'count_documents', count_then_race)
+
+    assert get_unread_count(db, user_id) == 3
+    assert db.notification_counters.find_one({'_id': user_id})['unread'] == 3
+
+def test_notifications_endpoint_reports_the_unread_count(client, db):
+    user_id = ObjectId()
+    create_notifications([user_id] * 2, 'Title', 'Message', db=db)
+
+    response = client.get('/api/notifications', headers=auth_header(str(user_id)))
+
+    assert response.status_code == 200
+    assert response.json['unread_count'] == 2
+    assert len(response.json['notifications']) == 2
+
+@pytest.fixture
+def local_broker(monkeypatch):
+    """A fresh in-process broker with no change stream watcher"""
+    broker = notification_stream.NotificationBroker()
+    monkeypatch.setattr(broker, 'ensure_source', lambda db: None)
+    monkeypatch.setattr(notification_stream, 'broker', broker)
+    monkeypatch.setattr(notification_stream, 'HEARTBEAT_SECONDS', 0.01)
+    return broker
+
+THREADED = {'wsgi.multithread': True}
+
+def open_stream(client, user_id):
+    response = client.get('/api/notifications/stream', headers=auth_header(user_id),
+                          environ_overrides=THREADED, buffered=False)
+    assert response.status_code == 200
+    return response
+
+def read_events(response, count, close=True):
+    """The next `count` SSE events of a streamed response as (event, data) pairs"""
+    events = []
+    for chunk in response.response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event: '):
+            lines = dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+            events.append((lines['event'], json.loads(lines['data'])))
+            if len(events) == count:
+                break
+    if close:
+        response.close()
+    return events
+
+def test_stream_needs_a_threaded_server(client, local_broker):
+    response = client.get('/api/notifications/stream', headers=auth_header(ObjectId()))
+
+
+    assert response.status_code == 503
+    assert local_broker.stats()['connections'] == 0
+
+def test_stream_sends_absolute_unread_counts(client, db, local_broker):
+    user_id = ObjectId()
+    insert_unread(db, user_id, 2)
+    response = open_stream(client, user_id)
+    assert read_events(response, 1, close=False) == [('unread', {'count': 2})]
+
+    notification_id = create_notification(user_id, 'New', 'Hello', db=db)
+    mark_all_read(db, user_id)
+    events = read_events(response, 2)
+
+    assert events[0][0] == 'notification' and events[0][1]['_id'] == notification_id
+    # Both changes were queued before the stream woke up: one count covers them
+    assert events[1] == ('unread', {'count': 0, 'delta': -2})
+    assert local_broker.stats()['connections'] == 0
+
+def test_change_racing_the_initial_count_is_not_counted_twice(client, db, local_broker, monkeypatch):
+    user_id = ObjectId()
+    real_count = notification_service.get_unread_count
+
+    def count_after_a_new_notification(db, user_id):
+        # Created after the stream subscribed but before it read the count
+        monkeypatch.setattr(notification_service, 'get_unread_count', real_count)
+        create_notification(user_id, 'New', 'Hello', db=db)
+        return real_count(db, user_id)
+    monkeypatch.setattr(notification_service, 'get_unread_count', count_after_a_new_notification)
+
+    events = read_events(open_stream(client, user_id), 3)
+
+    assert events[0] == ('unread', {'count': 1})
+    assert events[1][0] == 'notification'
+    # A delta added on top of the initial count would make this 2
+    assert events[2] == ('unread', {'count': 1, 'delta': 1})
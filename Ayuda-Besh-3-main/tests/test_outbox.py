@@ -0,0 +1,141 @@
+import socket
+from datetime import datetime, timedelta
+import pytest
+from aiosmtpd.controller import Controller
+import lib.outbox
+from lib.email_service import SMTPConnection
+from lib.outbox import OutboxDispatcher, enqueue_email, retry_delay
+
+class RecordingHandler:
+    """aiosmtpd handler that keeps accepted messages and can be told to reject them"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.reject = False
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            return '451 Try again later'
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return '250 OK'
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+@pytest.fixture
+def dispatcher(db, smtp_server):
+    controller, _ = smtp_server
+    dispatcher = OutboxDispatcher(db, batch_size=10)
+    dispatcher.smtp = SMTPConnection({
+        'server': controller.hostname,
+        'port': controller.port,
+        'username': '',
+        'password': '',
+        'from_email': 'noreply@example.com',
+        'from_name': 'AyudaBesh',
+        'starttls': False
+    })
+    yield dispatcher
+    dispatcher.smtp.close()
+
+def test_due_emails_are_sent_over_one_session(db, dispatcher, smtp_server):
+    _, handler = smtp_server
+    ids = [enqueue_email(db, f'user{i}@example.com', f'Subject {i}', 'Body') for i in range(3)]
+
+    assert dispatcher.dispatch_once() == 3
+
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.messages) == [
+        'user0@example.com', 'user1@example.com', 'user2@example.com'
+    ]
+    assert len(handler.sessions) == 1
+    for message_id in ids:
+        message = db.outbox.find_one({'_id': message_id})
+        assert message['status'] == 'sent'
+        assert message['attempts'] == 1
+        assert 'lease_expires_at' not in message
+    assert dispatcher.dispatch_once() == 0
+
+def test_rejected_email_is_retried_with_backoff(db, dispatcher, smtp_server):
+    _, handler = smtp_server
+    handler.reject = True
+    message_id = enqueue_email(db, 'user@example.com', 'Subject', 'Body')
+
+    before = datetime.utcnow()
+    assert dispatcher.dispatch_once() == 0
+
+    message = db.outbox.find_one({'_id': message_id})
+    assert message['status'] == 'pending'
+    assert message['attempts'] == 1
+    assert '451' in message['last_error']
+    assert message['next_attempt_at'] >= before + retry_delay(1) - timedelta(seconds=1)
+    # Not due yet, so the next pass leaves it alone
+    assert dispatcher.dispatch_once() == 0
+    assert db.outbox.find_one({'_id': message_id})['attempts'] == 1
+
+    handler.reject = False
+    db.outbox.update_one({'_id': message_id}, {'$set': {'next_attempt_at': datetime.utcnow()}})
+    assert dispatcher.dispatch_once() == 1
+    message = db.outbox.find_one({'_id': message_id})
+    assert message['status'] == 'sent'
+    assert message['attempts'] == 2
+
+def test_backoff_doubles_per_attempt():
+    assert [retry_delay(n) for n in (1, 2, 3)] == [
+        timedelta(seconds=lib.outbox.OUTBOX_RETRY_BASE_SECONDS * factor) for factor in (1, 2, 4)
+    ]
+
+def test_message_fails_after_max_attempts(db, dispatcher, smtp_server, monkeypatch):
+    _, handler = smtp_server
+    handler.reject = True
+    monkeypatch.setattr(lib.outbox, 'OUTBOX_MAX_ATTEMPTS', 2)
+    message_id = enqueue_email(db, 'user@example.com', 'Subject', 'Body')
+
+    dispatcher.dispatch_once()
+    db.outbox.update_one({'_id': message_id}, {'$set': {'next_attempt_at': datetime.utcnow()}})
+    dispatcher.dispatch_once()
+
+    message = db.outbox.find_one({'_id': message_id})
+    assert message['status'] == 'failed'
+    assert message['attempts'] == 2
+    assert dispatcher.claim_batch() == []
+
+def test_stale_dispatcher_cannot_settle_a_reclaimed_message(db, dispatcher, smtp_server):
+    message_id = enqueue_email(db, 'user@example.com', 'Subject', 'Body')
+    stale = OutboxDispatcher(db)
+    [claimed] = stale.claim_batch()
+
+    # The first dispatcher stalls past its lease and another one takes over
+    db.outbox.update_one({'_id': message_id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+    assert dispatcher.dispatch_once() == 1
+
+    stale._mark_failed_attempt(claimed, RuntimeError('timed out'))
+
+    message = db.outbox.find_one({'_id': message_id})
+    assert message['status'] == 'sent'
+    assert 'last_error' not in message
+
+def test_expired_lease_on_last_attempt_is_not_reclaimed(db, dispatcher, smtp_server, monkeypatch):
+    _, handler = smtp_server
+    monkeypatch.setattr(lib.outbox, 'OUTBOX_MAX_ATTEMPTS', 1)
+    message_id = enqueue_email(db, 'user@example.com', 'Subject', 'Body')
+    OutboxDispatcher(db).claim_batch()
+    db.outbox.update_one({'_id': message_id}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+
+    assert dispatcher.dispatch_once() == 0
+
+    message = db.outbox.find_one({'_id': message_id})
+    assert message['status'] == 'failed'
+    assert message['attempts'] == 1
+    assert handler.messages == []
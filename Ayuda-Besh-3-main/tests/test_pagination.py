@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+import pytest
+from bson.objectid import ObjectId
+from lib.pagination import decode_cursor, encode_cursor, fetch_page
+from conftest import auth_header
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+def insert_bookings(db, count, customer_id, **fields):
+    # Three bookings share each timestamp, so pages often split a tie
+    docs = [
+        {'customer_id': customer_id, 'created_at': START + timedelta(minutes=i // 3), **fields}
+        for i in range(count)
+    ]
+    db.bookings.insert_many(docs)
+    return [doc['_id'] for doc in sorted(docs, key=lambda doc: (doc['created_at'], doc['_id']), reverse=True)]
+
+def walk(collection, query, limit, **kwargs):
+    seen, cursor, pages = [], None, 0
+    while True:
+        documents, cursor = fetch_page(collection, query, limit, cursor, **kwargs)
+        seen.extend(document['_id'] for document in documents)
+        pages += 1
+        if cursor is None:
+            return seen, pages
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 7, 25, 100])
+def test_pages_cover_everything_once_in_order(db, limit):
+    customer_id = ObjectId()
+    expected = insert_bookings(db, 25, customer_id)
+    insert_bookings(db, 5, ObjectId())
+
+    seen, pages = walk(db.bookings, {'customer_id': customer_id}, limit)
+
+    assert seen == expected
+    assert pages == max(-(-25 // limit), 1)
+
+def test_query_with_its_own_or_clause(db):
+    customer_id = ObjectId()
+    expected = insert_bookings(db, 10, customer_id, status='completed')
+    insert_bookings(db, 10, customer_id, status='pending')
+    query = {'customer_id': customer_id, '$or': [{'status': 'completed'}, {'final_price': {'$gt': 0}}]}
+
+    seen, _ = walk(db.bookings, query, 4)
+
+    assert seen == expected
+
+def test_new_documents_do_not_shift_later_pages(db):
+    customer_id = ObjectId()
+    expected = insert_bookings(db, 9, customer_id)
+
+    first, cursor = fetch_page(db.bookings, {'customer_id': customer_id}, 4)
+    # Newer than everything paged so far: it belongs before page 1, not on page 2
+    db.bookings.insert_one({'customer_id': customer_id, 'created_at': START + timedelta(days=1)})
+    second, _ = fetch_page(db.bookings, {'customer_id': customer_id}, 4, cursor)
+
+    assert [doc['_id'] for doc in first + second] == expected[:8]
+
+def test_custom_sort_field(db):
+    user_ids = db.users.insert_many([
+        {'username': f'user{i}', 'createdAt': START + timedelta(hours=i % 4)} for i in range(10)
+    ]).inserted_ids
+
+    seen, _ = walk(db.users, {}, 3, field='createdAt')
+
+    assert sorted(seen) == sorted(user_ids)
+    assert len(set(seen)) == 10
+
+@pytest.mark.parametrize('limit', [1, 2, 4, 30])
+def test_documents_without_the_sort_field_come_last(db, limit):
+    customer_id = ObjectId()
+    dated = insert_bookings(db, 10, customer_id)
+    undated = db.bookings.insert_many(
+        [{'customer_id': customer_id} for _ in range(3)] + [{'customer_id': customer_id, 'created_at': None} for _ in range(3)]
+    ).inserted_ids
+
+    seen, _ = walk(db.bookings, {'customer_id': customer_id}, limit)
+
+    assert seen == dated + sorted(undated, reverse=True)
+
+def test_cursor_round_trip():
+    doc_id = ObjectId()
+
+    assert decode_cursor(encode_cursor(START, doc_id)) == (START, doc_id)
+    assert decode_cursor(encode_cursor(None, doc_id)) == (None, doc_id)
+
+@pytest.mark.parametrize('token', ['', 'not-a-cursor', 'e30', encode_cursor(START, ObjectId())[:-3]])
+def test_malformed_cursor_is_rejected(db, token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+def test_payment_transactions_endpoint_pages(client, db):
+    customer_id = ObjectId()
+    expected = insert_bookings(db, 7, customer_id, status='completed')
+    headers = auth_header(str(customer_id))
+
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/payment-transactions', query_string={'limit': 3, **({'cursor': cursor} if cursor else {})}, headers=headers)
+        assert response.status_code == 200
+        seen.extend(transaction['booking_id'] for transaction in response.json['transactions'])
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == [str(booking_id) for booking_id in expected]
+
+def test_endpoint_rejects_a_bad_cursor(client):
+    response = client.get('/api/payment-transactions?cursor=garbage', headers=auth_header(str(ObjectId())))
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid cursor'
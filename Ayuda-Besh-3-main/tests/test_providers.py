@@ -0,0 +1,104 @@
+import mongomock
+from bson.objectid import ObjectId
+from routes.services import geo_point, haversine_km, nearby_providers_pipeline, providers_without_geo_location
+
+def add_provider(db, rating_values=(), **fields):
+    provider_id = db.users.insert_one(dict({
+        'role': 'provider',
+        'is_verified': True,
+        'username': f'provider{ObjectId()}',
+        'services_offered': ['cleaning']
+    }, **fields)).inserted_id
+    for rating in rating_values:
+        db.bookings.insert_one({'provider_id': provider_id, 'status': 'completed', 'rating': rating})
+    db.bookings.insert_one({'provider_id': provider_id, 'status': 'pending', 'rating': 1})
+    return provider_id
+
+def test_provider_ratings_are_averaged_per_provider(client, db):
+    rated = add_provider(db, (5, 4, 4))
+    unrated = add_provider(db)
+    
+    response = client.get('/api/providers')
+    
+    assert response.status_code == 200
+    ratings = {provider['_id']: provider['rating'] for provider in response.get_json()}
+    assert ratings == {str(rated): 4.33, str(unrated): 0}
+
+def test_provider_listing_query_count_does_not_grow_with_providers(client, db, query_counter):
+    for count in range(3):
+        add_provider(db, (count + 1,))
+    client.get('/api/providers')
+    few = sum(query_counter.values())
+    
+    for count in range(30):
+        add_provider(db, (5,))
+    query_counter.clear()
+    response = client.get('/api/providers')
+    
+    assert len(response.get_json()) == 33
+    assert sum(query_counter.values()) == few == 2
+    assert query_counter[('bookings', 'aggregate')] == 1
+
+MANILA = (14.5995, 120.9842)
+QUEZON_CITY = (14.6760, 121.0437)  # About 10.5 km from Manila
+BAGUIO = (16.4023, 120.5960)  # About 200 km from Manila
+
+def test_nearby_pipeline_bounds_the_index_scan_and_each_service_radius():
+    query = {'role': 'provider'}
+    projection = {'password': 0}
+
+    pipeline = nearby_providers_pipeline(query, *MANILA, 25, projection)
+
+    geo_near = pipeline[0]['$geoNear']
+    assert geo_near['near'] == {'type': 'Point', 'coordinates': [MANILA[1], MANILA[0]]}
+    assert geo_near['key'] == 'geo_location'
+    assert geo_near['maxDistance'] == 25000
+    assert geo_near['query'] is query
+    assert pipeline[1] == {'$match': {'$expr': {
+        '$lte': ['$distance_m', {'$multiply': [{'$ifNull': ['$service_radius', 50]}, 1000]}]
+    }}}
+    assert pipeline[2] == {'$project': projection}
+
+def test_haversine_distance():
+    assert haversine_km(*MANILA, *MANILA) == 0
+    assert 10 < haversine_km(*MANILA, *QUEZON_CITY) < 11
+    assert 190 < haversine_km(*MANILA, *BAGUIO) < 210
+
+def test_legacy_coordinates_get_the_radius_filter_in_python(db):
+    near = add_provider(db, latitude=QUEZON_CITY[0], longitude=QUEZON_CITY[1])
+    add_provider(db, latitude=QUEZON_CITY[0], longitude=QUEZON_CITY[1], service_radius=5)
+    add_provider(db, latitude=BAGUIO[0], longitude=BAGUIO[1], service_radius=500)
+    unknown = add_provider(db)
+    add_provider(db, geo_location=geo_point(*QUEZON_CITY))  # Left to $geoNear
+
+    providers = providers_without_geo_location(db, {'role': 'provider'}, *MANILA, 100, {})
+
+    assert {provider['_id']: provider['distance_km'] for provider in providers} == {
+        near: round(haversine_km(*MANILA, *QUEZON_CITY), 2), unknown: None
+    }
+
+def test_nearby_search_merges_indexed_and_legacy_providers_by_distance(client, db, monkeypatch):
+    indexed = add_provider(db, geo_location=geo_point(*QUEZON_CITY))
+    legacy = add_provider(db, latitude=MANILA[0] + 0.01, longitude=MANILA[1])
+    unknown = add_provider(db)
+    add_provider(db, latitude=BAGUIO[0], longitude=BAGUIO[1])
+    pipelines = []
+    real_aggregate = mongomock.collection.Collection.aggregate
+
+    # mongomock has no $geoNear: answer it the way the server would for this data
+    def aggregate(self, pipeline, *args, **kwargs):
+        if self.name != 'users':
+            return real_aggregate(self, pipeline, *args, **kwargs)
+        pipelines.append(pipeline)
+        provider = self.find_one({'_id': indexed}, pipeline[-1]['$project'])
+        provider['distance_m'] = haversine_km(*MANILA, *QUEZON_CITY) * 1000
+        return iter([provider])
+    monkeypatch.setattr(mongomock.collection.Collection, 'aggregate', aggregate)
+
+    response = client.get(f'/api/providers?latitude={MANILA[0]}&longitude={MANILA[1]}')
+
+    assert response.status_code == 200
+    assert [(provider['_id'], provider['distance_km']) for provider in response.get_json()] == [
+        (str(legacy), 1.11), (str(indexed), round(haversine_km(*MANILA, *QUEZON_CITY), 2)), (str(unknown), None)
+    ]
+    assert pipelines[0][0]['$geoNear']['maxDistance'] == 100000
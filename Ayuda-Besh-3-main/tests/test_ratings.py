@@ -0,0 +1,195 @@
+import threading
+from datetime import datetime
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+import lib.catalog
+import lib.ratings
+from lib.catalog import CATALOG_COUNTER_ID, bump_catalog_version, get_catalog_version
+from lib.ratings import apply_rating, get_rating_summary, reconcile_ratings
+from conftest import auth_header
+
+@pytest.fixture
+def provider_id(db):
+    return db.users.insert_one({'username': 'provider', 'fullName': 'Pat Provider', 'role': 'provider'}).inserted_id
+
+@pytest.fixture
+def customer_id(db):
+    return db.users.insert_one({'username': 'customer', 'fullName': 'Cora Customer', 'role': 'customer'}).inserted_id
+
+@pytest.fixture
+def atomic_updates(monkeypatch):
+    """Make each mongomock update one atomic step, as on a server"""
+    lock = threading.RLock()
+    real_update = mongomock.Collection._update
+
+    def update(self, *args, **kwargs):
+        with lock:
+            return real_update(self, *args, **kwargs)
+    monkeypatch.setattr(mongomock.Collection, '_update', update)
+
+def completed_booking(db, provider_id, customer_id, rating=None):
+    booking = {'provider_id': provider_id, 'customer_id': customer_id, 'status': 'completed',
+               'service_type': 'Plumbing', 'created_at': datetime.utcnow()}
+    if rating is not None:
+        booking['rating'] = rating
+    return db.bookings.insert_one(booking).inserted_id
+
+def rate(client, booking_id, customer_id, rating):
+    response = client.post(f'/api/{booking_id}/rate', json={'rating': rating}, headers=auth_header(str(customer_id)))
+    assert response.status_code == 200
+    return response.json['average_rating']
+
+def stats_of(db, provider_id):
+    return db.users.find_one({'_id': provider_id})['rating_stats']
+
+def test_first_rating_seeds_from_older_ratings_and_counts_itself_once(client, db, provider_id, customer_id):
+    # Rated before the provider had aggregates
+    completed_booking(db, provider_id, customer_id, rating=5)
+    completed_booking(db, provider_id, customer_id, rating=3)
+    booking_id = completed_booking(db, provider_id, customer_id)
+
+    assert rate(client, booking_id, customer_id, 1) == 3.0
+
+    stats = stats_of(db, provider_id)
+    assert stats['count'] == 3
+    assert stats['sum'] == 9
+    assert stats['stars'] == {'1': 1, '2': 0, '3': 1, '4': 0, '5': 1}
+    assert reconcile_ratings(db) == []
+
+def test_seeding_after_the_booking_write_counts_that_rating_once(db, provider_id, customer_id):
+    completed_booking(db, provider_id, customer_id, rating=5)
+    # The route writes the rating onto the booking, then folds it in
+    completed_booking(db, provider_id, customer_id, rating=2)
+
+    assert apply_rating(db, provider_id, 2) == 3.5
+
+    stats = stats_of(db, provider_id)
+    assert (stats['count'], stats['sum']) == (2, 7)
+    assert reconcile_ratings(db, fix=False) == []
+
+def test_new_ratings_and_re_ratings_are_folded_in(client, db, provider_id, customer_id):
+    first = completed_booking(db, provider_id, customer_id)
+    second = completed_booking(db, provider_id, customer_id)
+
+    assert rate(client, first, customer_id, 4) == 4.0
+    assert rate(client, second, customer_id, 2) == 3.0
+    assert rate(client, second, customer_id, 5) == 4.5
+    assert rate(client, second, customer_id, 5) == 4.5
+
+    stats = stats_of(db, provider_id)
+    assert (stats['count'], stats['sum']) == (2, 9)
+    assert stats['stars'] == {'1': 0, '2': 0, '3': 0, '4': 1, '5': 1}
+    assert db.users.find_one({'_id': provider_id})['rating'] == 4.5
+    assert db.reviews.count_documents({'provider_id': provider_id}) == 2
+    assert reconcile_ratings(db) == []
+
+def test_summary_seeds_a_provider_without_aggregates(db, provider_id, customer_id):
+    completed_booking(db, provider_id, customer_id, rating=4)
+    completed_booking(db, provider_id, customer_id, rating=5)
+
+    summary = get_rating_summary(db, db.users.find_one({'_id': provider_id}))
+
+    assert summary['total_reviews'] == 2
+    assert summary['average_rating'] == 4.5
+    assert summary['rating_distribution'] == {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}
+
+def test_summary_of_a_provider_deleted_meanwhile_is_empty(db, provider_id, customer_id):
+    provider = db.users.find_one({'_id': provider_id})
+    db.users.delete_one({'_id': provider_id})
+
+    summary = get_rating_summary(db, provider)
+
+    assert (summary['total_reviews'], summary['average_rating']) == (0, 0)
+
+def test_review_pages_total_the_review_documents(client, db, provider_id, customer_id):
+    # Rated before reviews were stored: counted in the summary, not listed
+    completed_booking(db, provider_id, customer_id, rating=5)
+    rate(client, completed_booking(db, provider_id, customer_id), customer_id, 3)
+
+    response = client.get(f'/api/reviews/provider/{provider_id}?page=1&limit=10')
+
+    assert response.status_code == 200
+    assert response.json['total_reviews'] == 2
+    assert response.json['pagination']['total'] == len(response.json['reviews']) == 1
+
+def test_missing_provider_is_not_an_error(db):
+    assert apply_rating(db, ObjectId(), 5) == 0
+    assert apply_rating(db, ObjectId(), 5, previous_rating=5) == 0
+    assert db.users.count_documents({}) == 0
+
+def test_reconcile_reports_and_fixes_drift(db, provider_id, customer_id):
+    completed_booking(db, provider_id, customer_id, rating=2)
+    db.users.update_one({'_id': provider_id}, {'$set': {
+        'rating_stats': {'sum': 10, 'count': 2, 'stars': {'1': 0, '2': 0, '3': 0, '4': 0, '5': 2}}, 'rating': 5
+    }})
+
+    assert reconcile_ratings(db, fix=False) == [str(provider_id)]
+    assert reconcile_ratings(db) == [str(provider_id)]
+    assert reconcile_ratings(db) == []
+    assert db.users.find_one({'_id': provider_id})['rating'] == 2
+
+@pytest.mark.parametrize('round', range(5))
+def test_racing_first_ratings_are_each_counted_once(client, db, provider_id, customer_id, atomic_updates, monkeypatch, round):
+    completed_booking(db, provider_id, customer_id, rating=4)
+    bookings = [completed_booking(db, provider_id, customer_id) for _ in range(2)]
+    # Both requests find no aggregates and compute a seed before either stores one
+    barrier = threading.Barrier(len(bookings))
+    real_compute = lib.ratings.compute_rating_stats
+
+    def compute(*args, **kwargs):
+        barrier.wait(5)
+        return real_compute(*args, **kwargs)
+    monkeypatch.setattr(lib.ratings, 'compute_rating_stats', compute)
+    statuses, errors = [], []
+
+    def attempt(booking_id):
+        try:
+            response = client.post(f'/api/{booking_id}/rate', json={'rating': 2}, headers=auth_header(str(customer_id)))
+            statuses.append(response.status_code)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=attempt, args=(booking_id,)) for booking_id in bookings]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert errors == []
+    assert statuses == [200, 200]
+    stats = stats_of(db, provider_id)
+    assert (stats['count'], stats['sum']) == (3, 8)
+    monkeypatch.setattr(lib.ratings, 'compute_rating_stats', real_compute)
+    assert reconcile_ratings(db, fix=False) == []
+
+def test_registered_providers_start_with_empty_aggregates(client, db):
+    response = client.post('/api/auth/signup', json={
+        'username': 'newprovider', 'fullName': 'Nina Provider', 'email': 'nina@example.com',
+        'phone': '09171234567', 'password': 'Secret123!', 'role': 'provider'
+    })
+    assert response.status_code in (200, 201), response.get_data(as_text=True)
+
+    provider = db.users.find_one({'username': 'newprovider'})
+    assert provider['rating_stats'] == {'sum': 0, 'count': 0, 'stars': {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0}}
+    assert provider['rating'] == 0
+
+def test_rating_catalog_bumps_are_coalesced(client, db, provider_id, customer_id, monkeypatch):
+    monkeypatch.setattr(lib.catalog, 'time', type('Clock', (), {'time': staticmethod(lambda: now[0])}))
+    now = [1000.0]
+    first, second, third = (completed_booking(db, provider_id, customer_id) for _ in range(3))
+
+    rate(client, first, customer_id, 5)
+    version = get_catalog_version(db)
+    assert version == 1
+    now[0] += 30
+    rate(client, second, customer_id, 4)
+    assert get_catalog_version(db) == version
+    now[0] += 31
+    rate(client, third, customer_id, 3)
+    assert get_catalog_version(db) == version + 1
+
+    # Other writes still bump at once, and restart the window
+    assert bump_catalog_version(db) is True
+    assert bump_catalog_version(db, coalesce_seconds=60) is False
+    assert db.counters.find_one({'_id': CATALOG_COUNTER_ID})['version'] == version + 2
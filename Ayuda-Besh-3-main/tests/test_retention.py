@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+import lib.mongodb
+from lib.mongodb import ensure_indexes
+from lib.retention import NOTIFICATION_READ_TTL_DAYS, PASSWORD_RESET_TTL_SECONDS, archive_notifications, backfill_read_at, storage_report
+
+def test_ttl_indexes_are_registered(db):
+    resets = db.password_resets.index_information()
+    notifications = db.notifications.index_information()
+
+    assert resets['expires_at_ttl']['key'] == [('expires_at', 1)]
+    assert resets['expires_at_ttl']['expireAfterSeconds'] == PASSWORD_RESET_TTL_SECONDS
+    assert notifications['read_at_ttl']['expireAfterSeconds'] == NOTIFICATION_READ_TTL_DAYS * 86400
+    # Only read notifications expire
+    assert notifications['read_at_ttl']['partialFilterExpression'] == {'read': True}
+    assert db.notifications_archive.index_information()['user_month_unique']['unique']
+
+def test_changed_ttl_is_updated_in_place(db, monkeypatch):
+    updates = []
+    monkeypatch.setattr(lib.mongodb, '_set_index_ttl', lambda *args: updates.append(args))
+    db.password_resets.drop_index('expires_at_ttl')
+    db.password_resets.create_index([('expires_at', 1)], name='expires_at_ttl', expireAfterSeconds=60)
+
+    assert ensure_indexes(db) == 0
+    assert updates == [(db, 'password_resets', 'expires_at_ttl', PASSWORD_RESET_TTL_SECONDS)]
+    # Nothing to change once the TTL matches
+    updates.clear()
+    db.password_resets.drop_index('expires_at_ttl')
+    ensure_indexes(db)
+    assert updates == []
+
+def test_forgot_password_supersedes_earlier_codes(client, db):
+    user_id = db.users.insert_one({'username': 'ana', 'email': 'ana@example.com', 'role': 'customer'}).inserted_id
+    for _ in range(2):
+        response = client.post('/api/auth/forgot-password', json={'identifier': 'ana@example.com', 'role': 'customer'})
+        assert response.status_code == 200
+
+    resets = list(db.password_resets.find({'user_id': user_id}).sort('created_at', 1))
+    assert len(resets) == 2
+    assert [reset['used'] for reset in resets] == [True, False]
+    assert resets[1]['verification_code'] == response.json['verification_code']
+    for reset in resets:
+        assert reset['expires_at'] - reset['created_at'] <= timedelta(minutes=15, seconds=1)
+
+def test_archiving_leaves_recent_notifications_alone(db):
+    db.notifications.insert_one({'user_id': 'u1', 'read': False, 'created_at': datetime.utcnow()})
+
+    assert archive_notifications(db, older_than_days=30) == 0
+    assert db.notifications.count_documents({}) == 1
+    assert db.notifications_archive.count_documents({}) == 0
+
+def test_storage_report_reads_collection_stats(db, monkeypatch):
+    stats = {
+        'notifications': {'count': 10, 'size': 1000, 'storageSize': 4096, 'totalIndexSize': 8192},
+        'notifications_archive': {'count': 1, 'size': 300, 'storageSize': 4096, 'totalIndexSize': 4096}
+    }
+    monkeypatch.setattr(db, 'command', lambda command, name: stats[name])
+
+    assert storage_report(db, ['notifications', 'notifications_archive']) == {
+        'notifications': {'count': 10, 'size': 1000, 'storage_size': 4096, 'index_size': 8192},
+        'notifications_archive': {'count': 1, 'size': 300, 'storage_size': 4096, 'index_size': 4096}
+    }
+
+def test_legacy_read_notifications_get_read_at_from_created_at(db):
+    recent = datetime.utcnow().replace(microsecond=0) - timedelta(days=1)
+    expired = datetime.utcnow() - timedelta(days=NOTIFICATION_READ_TTL_DAYS + 1)
+    legacy = db.notifications.insert_one({'user_id': 'u1', 'read': True, 'created_at': recent}).inserted_id
+    old = db.notifications.insert_one({'user_id': 'u1', 'read': True, 'created_at': expired}).inserted_id
+    undated = db.notifications.insert_one({'user_id': 'u1', 'read': True, 'created_at': '2025-01-05'}).inserted_id
+    current = db.notifications.insert_one({'user_id': 'u1', 'read': True, 'created_at': expired, 'read_at': recent}).inserted_id
+    unread = db.notifications.insert_one({'user_id': 'u1', 'read': False, 'created_at': expired}).inserted_id
+    started = datetime.utcnow().replace(microsecond=0)
+    assert db.notifications.count_documents({}) == 5
+
+    assert backfill_read_at(db, batch_size=1) == 3
+
+    assert db.notifications.find_one({'_id': legacy})['read_at'] == recent
+    assert db.notifications.find_one({'_id': undated})['read_at'] >= started
+    assert db.notifications.find_one({'_id': current})['read_at'] == recent
+    assert 'read_at' not in db.notifications.find_one({'_id': unread})
+    # mongomock applies the TTL index on read, as the server's TTL monitor would
+    assert db.notifications.find_one({'_id': old}) is None
+    assert backfill_read_at(db) == 0
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+import pytest
+from bson.objectid import ObjectId
+from lib.user_directory import (
+    get_role_counts, rebuild_user_directory, search_filter, search_keys, with_search_keys
+)
+from conftest import auth_header
+
+USERS = [
+    ('jdelacruz', 'Juan Dela Cruz', 'juan.delacruz@example.com', 'customer'),
+    ('maria_s', 'María Santos', 'maria@mail.ph', 'customer'),
+    ('jose.rizal', 'José Rizal', 'jrizal@example.com', 'provider'),
+    ('plumber_ana', 'Ana Reyes', 'ana.reyes@fixit.ph', 'provider'),
+    ('admin01', 'System Administrator', 'admin@ayudabesh.com', 'admin'),
+]
+
+@pytest.fixture
+def users(db):
+    now = datetime(2026, 1, 1)
+    db.users.insert_many([
+        with_search_keys({'username': username, 'fullName': full_name, 'email': email, 'role': role,
+                          'createdAt': now + timedelta(minutes=i)})
+        for i, (username, full_name, email, role) in enumerate(USERS)
+    ])
+    return db
+
+def legacy_search(db, text):
+    """The original in-memory search: substring of username, fullName or email"""
+    text = text.lower()
+    return {
+        user['username'] for user in db.users.find()
+        if text in user.get('username', '').lower()
+        or text in user.get('fullName', '').lower()
+        or text in user.get('email', '').lower()
+    }
+
+def indexed_search(db, text):
+    return {user['username'] for user in db.users.find(search_filter(text))}
+
+def test_search_keys_are_normalized_words():
+    keys = search_keys({'username': 'jose.rizal', 'fullName': 'José Rizal', 'email': 'JRizal@Example.com'})
+
+    assert keys == sorted({'jose', 'rizal', 'jose.rizal', 'jrizal', 'example', 'com', 'jrizal@example.com'})
+
+@pytest.mark.parametrize('text', [
+    'juan', 'dela', 'cruz', 'jdel', 'maria', 'santos', 'ana', 'reyes', 'fixit', 'admin',
+    'example.com', 'juan.delacruz@example.com', 'jose.rizal', 'plumber', 'jrizal@', 'j'
+])
+def test_word_prefix_search_matches_the_legacy_search(users, text):
+    assert indexed_search(users, text) == legacy_search(users, text)
+
+def test_search_ignores_case_and_accents(users):
+    assert indexed_search(users, 'MARIA') == {'maria_s'}
+    assert indexed_search(users, 'josé') == indexed_search(users, 'jose') == {'jose.rizal'}
+
+def test_every_word_must_match(users):
+    assert indexed_search(users, 'ana reyes') == {'plumber_ana'}
+    assert indexed_search(users, 'ana santos') == set()
+
+def test_mid_word_fragments_no_longer_match(users):
+    # Deliberate difference: the index serves prefixes of words only
+    assert legacy_search(users, 'elacr') == {'jdelacruz'}
+    assert indexed_search(users, 'edro') == set()
+
+def test_users_without_search_keys_fall_back_to_substring_search(users):
+    users.users.insert_one({'username': 'oldtimer', 'fullName': 'Pedro Dela Cruz', 'email': 'pedro@example.com',
+                            'role': 'customer', 'createdAt': datetime(2025, 1, 1)})
+
+    assert indexed_search(users, 'edro') == {'oldtimer'}
+    assert indexed_search(users, 'DELA CRUZ') == {'jdelacruz', 'oldtimer'}
+    assert indexed_search(users, 'a.*') == indexed_search(users, 'a') - {'oldtimer'}
+
+    rebuild_user_directory(users)
+    assert indexed_search(users, 'edro') == set()
+
+def test_users_endpoint_pages_through_legacy_users(client, users):
+    for i in range(3):
+        users.users.insert_one({'username': f'legacy{i}', 'fullName': 'Ana Legacy', 'role': 'customer',
+                                'createdAt': datetime(2025, 1, 1 + i)})
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/admin/users?search=ana&role=customer&limit=2' + (f'&cursor={cursor}' if cursor else ''),
+                              headers=auth_header(str(ObjectId()), 'admin'))
+        assert response.status_code == 200
+        seen += [user['username'] for user in response.json['users']]
+        assert response.json['summary']['total'] == 3
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == ['legacy2', 'legacy1', 'legacy0']
+
+def test_search_treats_regex_characters_literally(users):
+    assert search_filter('  ') == {}
+    assert indexed_search(users, 'a.*') == indexed_search(users, 'a')
+
+def test_role_counts_are_seeded_then_maintained(client, users):
+    assert get_role_counts(users) == {'customer': 2, 'provider': 2, 'admin': 1}
+
+    response = client.post('/api/admin/users/create', headers=auth_header(str(ObjectId()), 'admin'), json={
+        'username': 'newcustomer', 'email': 'new@example.com', 'phone': '+63 900 000 0000',
+        'password': 'Secret@123', 'fullName': 'New Customer', 'role': 'customer'
+    })
+    assert response.status_code == 201
+
+    assert get_role_counts(users) == {'customer': 3, 'provider': 2, 'admin': 1}
+    assert indexed_search(users, 'new cust') == {'newcustomer'}
+
+def test_users_endpoint_searches_and_counts(client, users):
+    response = client.get('/api/admin/users?search=ana&limit=10', headers=auth_header(str(ObjectId()), 'admin'))
+
+    assert response.status_code == 200
+    assert [user['username'] for user in response.json['users']] == ['plumber_ana']
+    assert response.json['summary']['total'] == 1
+    assert response.json['summary']['total_providers'] == 2
+
+def test_rebuild_backfills_keys_and_counts(db):
+    db.users.insert_many([{'username': 'old_user', 'fullName': 'Old User', 'role': 'customer'}])
+    db.counters.insert_one({'_id': 'user_roles', 'counts': {'customer': 7}, 'seeded': True})
+
+    assert rebuild_user_directory(db) == 1
+    assert indexed_search(db, 'old') == {'old_user'}
+    assert get_role_counts(db) == {'customer': 1, 'provider': 0, 'admin': 0}
+
+def test_admin_script_indexes_and_counts_the_account(db):
+    from create_admin_direct import create_admin_account
+    assert get_role_counts(db)['admin'] == 0
+
+    assert create_admin_account()
+
+    assert indexed_search(db, 'system admin') == {'admin01'}
+    assert get_role_counts(db)['admin'] == 1
+    assert not create_admin_account()
+    assert get_role_counts(db)['admin'] == 1